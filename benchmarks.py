@@ -0,0 +1,345 @@
+from common import DEFAULT_SHARD_NUM, SNAPSHOT_GRANULARITY, MetaType, BlobFile, Metadata
+from fpga_pipeline import FPGADynamicPipeline
+from mors_scheduler import MORSScheduler
+from shard_gc_scheduler import ShardGCScheduler
+from mdp_validation import MDPValidationModel
+from array import array
+from typing import Callable, List, Optional, Tuple
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# 子系统基准测试套件：每个基准按参数扫描，输出JSON（ops/s、p50/p99延迟、峰值内存），
+# --compare与保存的基线比对并标记性能回退。纯离线运行，仅依赖标准库与NumPy。
+VALUE_SIZES = (80, 1024, 4096, 16384)  # 80B（论文5.7节Twitter cluster39）→16KB
+NODE_COUNTS = (3, 5, 7, 10)
+SHARD_NUMS = (10, 50, 200)
+BLOBS_PER_SHARD = (1, 10, 50)
+DEFAULT_NODE_NUM = 5
+DEFAULT_BLOBS_PER_SHARD = 10
+
+
+def _node_ids(node_num: int) -> List[str]:
+    return [f"Node-{i + 1}" for i in range(node_num)]
+
+
+def _records(value_size: int, count: int) -> Tuple[bytes, array]:
+    """构造count条长度前缀记录（与Blob数据区格式一致），返回(缓冲区, 记录边界)"""
+    record = struct.pack(">I", value_size) + bytes(random.Random(value_size).getrandbits(8) for _ in range(value_size))
+    offsets = array("Q", range(0, (count + 1) * len(record), len(record)))
+    return record * count, offsets
+
+
+def _blobs(shard_num: int, blobs_per_shard: int, seed: int = 0) -> List[BlobFile]:
+    rng = random.Random(seed)
+    return [BlobFile(blob_id=f"Blob-{shard_id}-{i}", shard_id=shard_id, value_count=4000,
+                     garbage_ratio=rng.uniform(0.3, 0.8))
+            for shard_id in range(shard_num) for i in range(blobs_per_shard)]
+
+
+def _timed(op: Callable[[], object], count: int) -> List[float]:
+    latencies = []
+    clock = time.perf_counter
+    for _ in range(count):
+        start = clock()
+        op()
+        latencies.append(clock() - start)
+    return latencies
+
+
+# ---------------- 基准：每个函数返回 (逐操作延迟列表, 处理的条目数[, 墙钟耗时]) ----------------
+
+def bench_pipeline_value(value_size: int, quick: bool) -> Tuple[List[float], int]:
+    """FPGADynamicPipeline.process_value：逐条处理"""
+    pipeline = FPGADynamicPipeline()
+    count = 200 if quick else 2000
+    buffer, offsets = _records(value_size, 1)
+    record = memoryview(buffer)
+    return _timed(lambda: pipeline.process_value(record, "Blob-0-0"), count), count
+
+
+def bench_pipeline_batch(value_size: int, quick: bool) -> Tuple[List[float], int]:
+    """FPGADynamicPipeline.process_batch：每次处理一个1MB窗口"""
+    pipeline = FPGADynamicPipeline()
+    count = max(1, SNAPSHOT_GRANULARITY // (value_size + 4))
+    buffer, offsets = _records(value_size, count)
+    out = bytearray(2 * len(buffer) + count * 1100)
+    batches = 5 if quick else 30
+    return _timed(lambda: pipeline.process_batch(buffer, offsets, "Blob-0-0", out=out), batches), batches * count
+
+
+def bench_mors_queue(node_num: int, shard_num: int, blobs_per_shard: int, quick: bool) -> Tuple[List[float], int]:
+    """MORSScheduler：任务入队 + 收益变化重排 + 出队（每个操作为一次完整的入队/更新/出队）"""
+    scheduler = MORSScheduler(_node_ids(node_num))
+    shard_scheduler = ShardGCScheduler(_node_ids(node_num), shard_num=shard_num)
+    tasks = [shard_scheduler._build_task(f"GC-{i}", blob) for i, blob in enumerate(_blobs(shard_num, blobs_per_shard))]
+    shard_scheduler.close()
+    rng = random.Random(0)
+    latencies = []
+    clock = time.perf_counter
+    rounds = 1 if quick else 3
+    for _ in range(rounds):
+        for task in tasks:
+            start = clock()
+            scheduler.submit_task(task)
+            latencies.append(clock() - start)
+        for task in tasks:
+            start = clock()
+            scheduler.update_task_garbage_ratio(task, rng.uniform(0.3, 0.8))
+            latencies.append(clock() - start)
+        while True:
+            start = clock()
+            task = scheduler.next_task()
+            latencies.append(clock() - start)
+            if task is None:
+                break
+    return latencies, len(latencies)
+
+
+def bench_mors_dispatch(node_num: int, quick: bool) -> Tuple[List[float], int]:
+    """MORSScheduler资源模型：select_best_node（惰性堆选点+预留）→ 遥测上报 → 释放，节点负载维持在半满"""
+    node_ids = _node_ids(node_num)
+    scheduler = MORSScheduler(node_ids)
+    shard_scheduler = ShardGCScheduler(node_ids[:2], shard_num=1)
+    blob = _blobs(1, 1)[0]
+    tasks = [shard_scheduler._build_task(f"GC-{i}", blob) for i in range(3 * node_num)]
+    shard_scheduler.close()
+    for task in tasks:
+        scheduler.select_best_node(task)
+    rng = random.Random(0)
+    latencies = []
+    clock = time.perf_counter
+    for i in range(2000 if quick else 20000):
+        task = tasks[i % len(tasks)]
+        start = clock()
+        scheduler.release(task)
+        scheduler.observe(rng.choice(node_ids), rng.uniform(40, 60), rng.uniform(30, 50), now=float(i))
+        scheduler.select_best_node(task)
+        latencies.append(clock() - start)
+    return latencies, len(latencies)
+
+
+def bench_shard_task_lifecycle(node_num: int, shard_num: int, blobs_per_shard: int, quick: bool) -> Tuple[List[float], int]:
+    """ShardGCScheduler：create_gc_task（候选索引选取最差Blob）→ 检查点 → 完成"""
+    shard_scheduler = ShardGCScheduler(_node_ids(node_num), shard_num=shard_num)
+    for blob in _blobs(shard_num, blobs_per_shard):
+        shard_scheduler.garbage_tracker.register_blob(blob)
+
+    def lifecycle(shard_id: int):
+        task = shard_scheduler.create_gc_task(shard_id=shard_id)
+        shard_scheduler.checkpoint_task(task, SNAPSHOT_GRANULARITY, 0)
+        shard_scheduler.complete_task(task, 2 * SNAPSHOT_GRANULARITY, 0)
+
+    latencies = []
+    clock = time.perf_counter
+    for _ in range(blobs_per_shard if not quick else min(blobs_per_shard, 2)):
+        for shard_id in range(shard_num):
+            start = clock()
+            lifecycle(shard_id)
+            latencies.append(clock() - start)
+    shard_scheduler.close()
+    return latencies, len(latencies)
+
+
+def bench_shard_interrupt_resume(node_num: int, shard_num: int, quick: bool) -> Tuple[List[float], int]:
+    """ShardGCScheduler：中断（保存快照+主备切换）并从快照续跑"""
+    shard_scheduler = ShardGCScheduler(_node_ids(node_num), shard_num=shard_num)
+    tasks = [shard_scheduler.create_gc_task(blob) for blob in _blobs(shard_num, 1)]
+    count = 2000 if quick else 20000
+
+    def interrupt_resume(i: int):
+        task = tasks[i % len(tasks)]
+        shard_scheduler.interrupt_task(task, i * 1024, f"{i:08x}", metadata_updated=False)
+        shard_scheduler.resume_task(task)
+
+    counter = iter(range(count))
+    latencies = _timed(lambda: interrupt_resume(next(counter)), count)
+    shard_scheduler.close()
+    return latencies, count
+
+
+def bench_raft_batching(node_num: int, batch_threshold: int, quick: bool) -> Tuple[List[float], int, float]:
+    """ShardGCScheduler Raft增量同步：add_raft_sync_metadata后按批次组提交
+
+    延迟为逐条记录入队到fsync完成的耗时（相互重叠），吞吐按墙钟时间计算。
+    """
+    shard_scheduler = ShardGCScheduler(_node_ids(node_num))
+    shard_scheduler.raft_batch_threshold = batch_threshold
+    count = 2000 if quick else 10000
+    start = time.perf_counter()
+    for i in range(count):
+        shard_scheduler.add_raft_sync_metadata(Metadata(key=f"key-{i:010d}", blob_id=f"Blob-{i % 50}-{i // 4096}",
+                                                        offset=i * 84, is_validated=True, meta_type=MetaType.GC,
+                                                        delay_range=0.4))
+    shard_scheduler.close()
+    return shard_scheduler.raft_pipeline.commit_latencies, count, time.perf_counter() - start
+
+
+def bench_mdp_solve(partition_num: int, quick: bool) -> Tuple[List[float], int]:
+    """MDPValidationModel：价值迭代求解（每个操作为一次完整求解）"""
+    latencies = []
+    for _ in range(2 if quick else 5):
+        model = MDPValidationModel(partition_num=partition_num)
+        start = time.perf_counter()
+        model.value_iteration(max_iter=200)
+        latencies.append(time.perf_counter() - start)
+    return latencies, len(latencies) * model.state_num
+
+
+def bench_mdp_lookup(batch_size: int, quick: bool) -> Tuple[List[float], int]:
+    """MDPValidationModel：批量策略查询（每个操作为一批）"""
+    model = MDPValidationModel()
+    model.value_iteration()
+    rng = np.random.default_rng(0)
+    meta_types = rng.choice([mt.value for mt in MetaType], batch_size)
+    is_validated = rng.integers(0, 2, batch_size)
+    delay_ranges = rng.uniform(0, 150, batch_size)
+    batches = 20 if quick else 100
+    latencies = _timed(lambda: model.get_optimal_actions(meta_types, is_validated, delay_ranges), batches)
+    return latencies, batches * batch_size
+
+
+def benchmark_cases(quick: bool = False) -> List[Tuple[str, Callable, dict]]:
+    """全部(名称, 基准函数, 参数)组合：节点数/分片数/每分片Blob数以默认值为中心逐维扫描"""
+    cases = []
+    for value_size in VALUE_SIZES:
+        cases.append(("pipeline.process_value", bench_pipeline_value, {"value_size": value_size}))
+        cases.append(("pipeline.process_batch", bench_pipeline_batch, {"value_size": value_size}))
+    topology = [{"node_num": n, "shard_num": DEFAULT_SHARD_NUM, "blobs_per_shard": DEFAULT_BLOBS_PER_SHARD}
+                for n in NODE_COUNTS]
+    topology += [{"node_num": DEFAULT_NODE_NUM, "shard_num": s, "blobs_per_shard": DEFAULT_BLOBS_PER_SHARD}
+                 for s in SHARD_NUMS if s != DEFAULT_SHARD_NUM]
+    topology += [{"node_num": DEFAULT_NODE_NUM, "shard_num": DEFAULT_SHARD_NUM, "blobs_per_shard": b}
+                 for b in BLOBS_PER_SHARD if b != DEFAULT_BLOBS_PER_SHARD]
+    for params in topology:
+        cases.append(("mors.task_queue", bench_mors_queue, params))
+        cases.append(("shard_gc.task_lifecycle", bench_shard_task_lifecycle, params))
+    for node_num in NODE_COUNTS + (100, 1000):
+        cases.append(("mors.dispatch", bench_mors_dispatch, {"node_num": node_num}))
+    for node_num in NODE_COUNTS:
+        for shard_num in SHARD_NUMS:
+            cases.append(("shard_gc.interrupt_resume", bench_shard_interrupt_resume,
+                          {"node_num": node_num, "shard_num": shard_num}))
+    for batch_threshold in (1, 8, 32):
+        cases.append(("shard_gc.raft_batching", bench_raft_batching,
+                      {"node_num": DEFAULT_NODE_NUM, "batch_threshold": batch_threshold}))
+    for partition_num in (1, 100, 1000):
+        cases.append(("mdp.solve", bench_mdp_solve, {"partition_num": partition_num}))
+    for batch_size in (1000, 100000, 1000000):
+        cases.append(("mdp.lookup", bench_mdp_lookup, {"batch_size": batch_size}))
+    return cases
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_case(name: str, bench: Callable, params: dict, quick: bool, measure_memory: bool = True) -> dict:
+    """执行单个基准：计时轮不开启内存追踪，另跑一轮tracemalloc统计峰值内存"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies, items, *elapsed = bench(**params, quick=quick)
+        peak = 0
+        if measure_memory:
+            tracemalloc.start()
+            bench(**params, quick=True)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    latencies = sorted(latencies)
+    total = (elapsed[0] if elapsed else sum(latencies)) or 1e-12
+    return {
+        "name": name,
+        "params": params,
+        "ops": len(latencies),
+        "ops_per_s": len(latencies) / total,
+        "items_per_s": items / total,
+        "p50_us": _percentile(latencies, 0.50) * 1e6,
+        "p99_us": _percentile(latencies, 0.99) * 1e6,
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+
+
+def run_suite(quick: bool = False, only: Optional[str] = None, measure_memory: bool = True) -> dict:
+    results = []
+    for name, bench, params in benchmark_cases(quick):
+        if only and not name.startswith(only):
+            continue
+        result = run_case(name, bench, params, quick, measure_memory)
+        results.append(result)
+        print(f"[Benchmark] {name} {params}: {result['ops_per_s']:.0f} ops/s, {result['items_per_s']:.0f} items/s, "
+              f"p50={result['p50_us']:.1f}us p99={result['p99_us']:.1f}us, peak {result['peak_mem_mb']:.1f}MB",
+              file=sys.stderr)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": quick,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def _case_key(result: dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> List[dict]:
+    """与基线比对：吞吐下降或p99上升超过tolerance（相对值）即判为回退"""
+    baseline_results = {_case_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        base = baseline_results.get(_case_key(result))
+        if base is None:
+            continue
+        throughput_change = result["ops_per_s"] / base["ops_per_s"] - 1 if base["ops_per_s"] else 0.0
+        p99_change = result["p99_us"] / base["p99_us"] - 1 if base["p99_us"] else 0.0
+        if throughput_change < -tolerance or p99_change > tolerance:
+            regressions.append({"case": _case_key(result), "ops_per_s_change": throughput_change,
+                                "p99_change": p99_change})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="GCSmartKV subsystem benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="reduced iteration counts for smoke runs")
+    parser.add_argument("--only", help="run only benchmarks whose name starts with this prefix")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a saved baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative regression tolerance (default 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.quick, args.only, not args.no_memory)
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        for regression in report["regressions"]:
+            print(f"[Benchmark Regression] {regression['case']}: ops/s {regression['ops_per_s_change']:+.1%}, "
+                  f"p99 {regression['p99_change']:+.1%}", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,238 @@
+from common import BLOB_DEFAULT_SIZE, SNAPSHOT_GRANULARITY, BlobFile
+import errno
+import mmap
+import os
+import struct
+from array import array
+
+# Blob文件格式（论文2.1节价值区）：
+#   文件头(32B)：魔数(4B) + 版本(2B) + 保留(2B) + Value数量(4B) + 数据区结束偏移(8B) + 填充
+#   数据区：连续的长度前缀记录，每条记录 = 4B大端长度 + Value数据（与FPGA输入解码格式一致）
+#   文件按BLOB_DEFAULT_SIZE预分配（稀疏文件），数据区结束偏移之后为空闲空间
+BLOB_MAGIC = b"GCKV"
+BLOB_VERSION = 1
+BLOB_HEADER = struct.Struct(">4sHHIQ")
+BLOB_HEADER_SIZE = 32
+RECORD_HEADER = struct.Struct(">I")
+RECORD_HEADER_SIZE = RECORD_HEADER.size
+COPY_FALLBACK_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+COPY_FALLBACK_CHUNK = 1024 * 1024  # copy_file_range不可用时的用户态复制分块
+
+
+class BlobWriter:
+    """Blob文件追加写入器：顺序追加长度前缀记录，关闭时回写文件头"""
+
+    def __init__(self, path: str, capacity: int = BLOB_DEFAULT_SIZE):
+        self.path = path
+        self.capacity = capacity
+        self.value_count = 0
+        self.data_end = BLOB_HEADER_SIZE
+        self._file = open(path, "wb")
+        self._file.truncate(capacity)  # 预分配32MB（稀疏，不占实际磁盘块）
+        self._file.seek(BLOB_HEADER_SIZE)
+
+    def can_append(self, value_size: int) -> bool:
+        return self.data_end + RECORD_HEADER_SIZE + value_size <= self.capacity
+
+    def append(self, value) -> int:
+        """追加一条Value记录，返回记录在Blob中的偏移量"""
+        value_size = len(value)
+        if not self.can_append(value_size):
+            raise ValueError(f"Blob {self.path} full: cannot append {value_size}B value")
+        offset = self.data_end
+        self._file.write(RECORD_HEADER.pack(value_size))
+        self._file.write(value)
+        self.data_end += RECORD_HEADER_SIZE + value_size
+        self.value_count += 1
+        return offset
+
+    def append_records(self, records, record_count: int) -> int:
+        """批量追加一段已带长度前缀的连续记录（如GC搬迁的存活记录），返回其起始偏移量"""
+        if self.data_end + len(records) > self.capacity:
+            raise ValueError(f"Blob {self.path} full: cannot append {len(records)}B records")
+        offset = self.data_end
+        self._file.write(records)
+        self.data_end += len(records)
+        self.value_count += record_count
+        return offset
+
+    def copy_records(self, src_fd: int, src_offset: int, length: int, record_count: int) -> int:
+        """用os.copy_file_range在内核内复制另一Blob中一段连续记录（不经用户态缓冲），返回其起始偏移量
+
+        copy_file_range不可用或返回EXDEV/ENOSYS/EINVAL/EOPNOTSUPP时退回pread/pwrite分块复制。
+        """
+        if self.data_end + length > self.capacity:
+            raise ValueError(f"Blob {self.path} full: cannot copy {length}B records")
+        offset = self.data_end
+        self._file.flush()
+        dst_fd = self._file.fileno()
+        copied = 0
+        use_copy_range = hasattr(os, "copy_file_range")
+        while copied < length:
+            if use_copy_range:
+                try:
+                    n = os.copy_file_range(src_fd, dst_fd, length - copied, src_offset + copied, offset + copied)
+                except OSError as e:
+                    if e.errno not in COPY_FALLBACK_ERRNOS:
+                        raise
+                    use_copy_range = False  # 跨文件系统或内核/文件系统不支持：剩余部分退回用户态读写
+                    continue
+            else:
+                data = os.pread(src_fd, min(COPY_FALLBACK_CHUNK, length - copied), src_offset + copied)
+                n = os.pwrite(dst_fd, data, offset + copied) if data else 0
+            if n == 0:
+                raise IOError(f"Unexpected EOF copying records into {self.path}")
+            copied += n
+        self.data_end += length
+        self.value_count += record_count
+        self._file.seek(self.data_end)
+        return offset
+
+    def flush(self):
+        """刷出用户态缓冲，使已追加的记录可被其他文件描述符读到（读未封存的活跃Blob）"""
+        self._file.flush()
+
+    def close(self, fsync: bool = False):
+        """回写文件头并关闭；fsync=True时落盘后返回（GC搬迁后删除旧Blob前须保证新Blob持久化）"""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(BLOB_HEADER.pack(BLOB_MAGIC, BLOB_VERSION, 0, self.value_count, self.data_end))
+        if fsync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_value(fd: int, offset: int) -> bytes:
+    """按记录偏移随机读取一条Value（前台点查，pread不移动文件位置，可多线程共用描述符）"""
+    value_size = RECORD_HEADER.unpack(os.pread(fd, RECORD_HEADER_SIZE, offset))[0]
+    return os.pread(fd, value_size, offset + RECORD_HEADER_SIZE)
+
+
+class BlobWindow:
+    """Blob扫描窗口：一段完整记录的零拷贝视图（按快照粒度切分，论文4.3节）"""
+
+    __slots__ = ("offset", "end", "view", "record_offsets")
+
+    def __init__(self, offset: int, end: int, view: memoryview, record_offsets: array):
+        self.offset = offset  # 窗口起始偏移（Blob内绝对偏移）
+        self.end = end  # 窗口结束偏移（即下一个断点偏移）
+        self.view = view  # 窗口数据视图（mmap切片，无拷贝）
+        self.record_offsets = record_offsets  # 记录边界（相对窗口起点，长度=记录数+1）
+
+    def __len__(self) -> int:
+        return len(self.record_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.end - self.offset
+
+    def iter_values(self):
+        """逐条返回记录视图（4B长度头+数据），可直接送入FPGA流水线"""
+        view, offsets = self.view, self.record_offsets
+        for i in range(len(offsets) - 1):
+            yield view[offsets[i]:offsets[i + 1]]
+
+
+class MappedBlob:
+    """只读mmap打开的Blob文件，GC直接扫描页缓存中的真实字节"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.value_count, self.data_end = BLOB_HEADER.unpack_from(self._mm, 0)
+        if magic != BLOB_MAGIC or version != BLOB_VERSION:
+            self.close()
+            raise ValueError(f"Invalid Blob file: {path}")
+        self._view = memoryview(self._mm)
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+
+    def iter_windows(self, start_offset: int = 0, granularity: int = SNAPSHOT_GRANULARITY):
+        """按快照粒度遍历记录窗口；窗口只在记录边界切分，断点偏移可直接用于续跑"""
+        offset = max(start_offset, BLOB_HEADER_SIZE)
+        mm, data_end = self._mm, self.data_end
+        unpack_from = RECORD_HEADER.unpack_from
+        released = offset - offset % mmap.PAGESIZE
+        while offset < data_end:
+            limit = offset + granularity
+            pos = offset
+            record_offsets = array("Q", [0])
+            while pos < data_end:
+                next_pos = pos + RECORD_HEADER_SIZE + unpack_from(mm, pos)[0]
+                if next_pos > data_end:
+                    raise ValueError(f"Corrupt record at offset {pos} in {self.path}: "
+                                     f"ends at {next_pos}, beyond data end {data_end}")
+                # 至少包含一条记录，超过粒度的大Value单独成窗
+                if next_pos > limit and pos > offset:
+                    break
+                record_offsets.append(next_pos - offset)
+                pos = next_pos
+            yield BlobWindow(offset, pos, self._view[offset:pos], record_offsets)
+            offset = pos
+            # 释放已扫描窗口的页，保证峰值RSS与Blob数量、大小无关
+            page_end = offset - offset % mmap.PAGESIZE
+            if page_end > released and hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_DONTNEED, released, page_end - released)
+                released = page_end
+
+    def close(self):
+        self._view = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # 调用方仍持有窗口视图，映射随最后一个视图释放而解除
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BlobStore:
+    """磁盘Blob存储：每个分片一个目录，Blob文件按分片隔离（论文4.2节双射模型）"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def shard_dir(self, shard_id: int) -> str:
+        path = os.path.join(self.root_dir, f"shard-{shard_id}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def blob_path(self, shard_id: int, blob_id: str) -> str:
+        return os.path.join(self.shard_dir(shard_id), f"{blob_id}.blob")
+
+    def create_blob(self, shard_id: int, blob_id: str, capacity: int = BLOB_DEFAULT_SIZE) -> BlobWriter:
+        return BlobWriter(self.blob_path(shard_id, blob_id), capacity)
+
+    def write_blob(self, shard_id: int, blob_id: str, values, garbage_ratio: float = 0.0) -> BlobFile:
+        """将一组Value写入新Blob文件，返回其元数据"""
+        with self.create_blob(shard_id, blob_id) as writer:
+            for value in values:
+                writer.append(value)
+        return BlobFile(
+            blob_id=blob_id,
+            shard_id=shard_id,
+            value_count=writer.value_count,
+            garbage_ratio=garbage_ratio,
+            path=writer.path
+        )
+
+    def open_blob(self, blob: BlobFile) -> MappedBlob:
+        return MappedBlob(blob.path or self.blob_path(blob.shard_id, blob.blob_id))
+
+    def delete_blob(self, blob: BlobFile):
+        os.remove(blob.path or self.blob_path(blob.shard_id, blob.blob_id))
+        blob.is_valid = False
\ No newline at end of file
@@ -0,0 +1,149 @@
+from common import BLOB_DEFAULT_SIZE, SNAPSHOT_GRANULARITY
+from typing import Iterable, List, Optional, Tuple
+import math
+import threading
+
+# 自适应检查点间隔（论文4.3节断点续跑）：固定1MB粒度在低中断率下检查点过密，在高抢占率下又重做过多。
+# 按Young/Daly一阶最优 τ = sqrt(2·C·M) 选取间隔（C为一次检查点的代价，M为平均中断间隔，均折算为字节），
+# 并限制在[MIN_CHECKPOINT_INTERVAL, MAX_CHECKPOINT_INTERVAL]内；检查点仍落在窗口（记录）边界，续跑精确
+MIN_CHECKPOINT_INTERVAL = SNAPSHOT_GRANULARITY  # 下限：一个处理窗口（1MB）
+MAX_CHECKPOINT_INTERVAL = BLOB_DEFAULT_SIZE  # 上限：一个Blob（32MB）
+PRIOR_BYTES_BETWEEN_INTERRUPTS = 1024 * 1024 * 1024  # 尚未观测到中断时，平均中断间隔按已处理字节+1GB估计
+EWMA_ALPHA = 0.2
+
+
+class CheckpointPolicy:
+    """每节点一个检查点策略：观测中断/抢占率、检查点代价与处理速率，给出当前检查点间隔（字节）
+
+    fixed_interval非空时退化为固定间隔（用于与原1MB粒度对比），统计口径不变。
+    """
+
+    def __init__(self, min_interval: int = MIN_CHECKPOINT_INTERVAL, max_interval: int = MAX_CHECKPOINT_INTERVAL,
+                 fixed_interval: Optional[int] = None, prior_bytes: float = PRIOR_BYTES_BETWEEN_INTERRUPTS):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fixed_interval = fixed_interval
+        self.prior_bytes = prior_bytes
+        self.lock = threading.Lock()
+        self.bytes_processed = 0
+        self.interrupts = 0
+        self.checkpoint_cost_s: Optional[float] = None  # EWMA：单次检查点耗时
+        self.rate_bps: Optional[float] = None  # EWMA：处理速率（字节/秒）
+        self.stats = {"checkpoints": 0, "checkpoint_s": 0.0, "process_s": 0.0, "lost_bytes": 0,
+                      "expected_lost_bytes": 0.0}
+
+    @staticmethod
+    def _ewma(current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + EWMA_ALPHA * (sample - current)
+
+    def mean_bytes_between_interrupts(self) -> float:
+        if not self.interrupts:
+            return self.bytes_processed + self.prior_bytes
+        return self.bytes_processed / self.interrupts
+
+    def interval(self) -> int:
+        """当前检查点间隔：sqrt(2 × 检查点代价(字节) × 平均中断间隔(字节))，限制在上下限内"""
+        if self.fixed_interval is not None:
+            return self.fixed_interval
+        if self.checkpoint_cost_s is None or not self.rate_bps:
+            return self.min_interval  # 尚未测得检查点代价：先按下限检查点一次
+        cost_bytes = self.checkpoint_cost_s * self.rate_bps
+        optimum = math.sqrt(2 * cost_bytes * self.mean_bytes_between_interrupts())
+        return int(min(self.max_interval, max(self.min_interval, optimum)))
+
+    def interval_windows(self) -> int:
+        """检查点间隔折算为窗口数（窗口在记录边界切分，每个不超过SNAPSHOT_GRANULARITY）"""
+        return max(1, round(self.interval() / SNAPSHOT_GRANULARITY))
+
+    def record_progress(self, nbytes: int, seconds: float):
+        with self.lock:
+            self.bytes_processed += nbytes
+            self.stats["process_s"] += seconds
+            if seconds > 0:
+                self.rate_bps = self._ewma(self.rate_bps, nbytes / seconds)
+
+    def record_checkpoint(self, seconds: float):
+        with self.lock:
+            self.stats["checkpoints"] += 1
+            self.stats["checkpoint_s"] += seconds
+            self.checkpoint_cost_s = self._ewma(self.checkpoint_cost_s, seconds)
+
+    def record_interrupt(self, lost_bytes: int):
+        """中断或抢占：lost_bytes为自上次检查点以来需要重做的字节数
+
+        中断发生在窗口处理之后，间隔为n个窗口时重做量在1..n个窗口间均匀分布，期望为(n+1)/2个窗口。
+        """
+        with self.lock:
+            self.stats["expected_lost_bytes"] += (self.interval_windows() + 1) / 2 * SNAPSHOT_GRANULARITY
+            self.interrupts += 1
+            self.stats["lost_bytes"] += lost_bytes
+
+    def report(self) -> dict:
+        busy = self.stats["process_s"] + self.stats["checkpoint_s"]
+        return {
+            "interval_mb": self.interval_windows() * SNAPSHOT_GRANULARITY / 2 ** 20,
+            "interrupts": self.interrupts,
+            "checkpoints": self.stats["checkpoints"],
+            "checkpoint_overhead": self.stats["checkpoint_s"] / busy if busy else 0.0,
+            "lost_mb": self.stats["lost_bytes"] / 2 ** 20,
+            "expected_lost_mb": self.stats["expected_lost_bytes"] / 2 ** 20,
+        }
+
+
+def merge_reports(policies: Iterable[CheckpointPolicy]) -> dict:
+    """汇总多个节点策略的统计（开销为总检查点耗时占比）"""
+    policies = list(policies)
+    checkpoint_s = sum(p.stats["checkpoint_s"] for p in policies)
+    busy = checkpoint_s + sum(p.stats["process_s"] for p in policies)
+    return {
+        "interrupts": sum(p.interrupts for p in policies),
+        "checkpoints": sum(p.stats["checkpoints"] for p in policies),
+        "checkpoint_overhead": checkpoint_s / busy if busy else 0.0,
+        "lost_mb": sum(p.stats["lost_bytes"] for p in policies) / 2 ** 20,
+        "expected_lost_mb": sum(p.stats["expected_lost_bytes"] for p in policies) / 2 ** 20,
+        "mean_interval_mb": (sum(p.interval_windows() for p in policies) / len(policies) * SNAPSHOT_GRANULARITY / 2 ** 20
+                             if policies else 0.0),
+    }
+
+
+def measure_checkpoint_policies(interrupt_probs: Tuple[float, ...] = (0.002, 0.02, 0.1), shard_num: int = 8,
+                                blob_num_per_shard: int = 4, value_count: int = 100000, value_size: int = 80) -> List[dict]:
+    """对比实验：相同Blob与中断序列下，固定1MB检查点与自适应检查点的开销、实际/期望重做量与吞吐"""
+    import contextlib
+    import io
+    import os
+    import random
+    import tempfile
+    from blob_store import BlobStore
+    from gc_executor import GCExecutor
+    from mors_scheduler import MORSScheduler
+    from shard_gc_scheduler import ShardGCScheduler
+    node_ids = ["Node-1", "Node-2", "Node-3", "Node-4", "Node-5"]
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gcsmartkv-ckpt-") as root:
+        blob_store = BlobStore(root)
+        value = b"v" * value_size
+        blobs = [blob_store.write_blob(shard_id, f"Blob-{shard_id}-{i}", (value for _ in range(value_count)),
+                                       garbage_ratio=rng.uniform(0.3, 0.8))
+                 for shard_id in range(shard_num) for i in range(blob_num_per_shard)]
+        for interrupt_prob in interrupt_probs:
+            for name, fixed_interval in (("fixed-1MB", SNAPSHOT_GRANULARITY), ("adaptive", None)):
+                journal = os.path.join(root, f"ckpt-{interrupt_prob}-{name}.journal")
+                shard_scheduler = ShardGCScheduler(node_ids, shard_num=shard_num, snapshot_journal_path=journal)
+                executor = GCExecutor(shard_scheduler, MORSScheduler(node_ids), blob_store, max_workers=2,
+                                      interrupt_prob=interrupt_prob, checkpoint_interval=fixed_interval)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    report = executor.run(blobs)
+                shard_scheduler.close()
+                result = {"policy": name, "interrupt_prob": interrupt_prob, **report}
+                results.append(result)
+                print(f"[Checkpoint] p_interrupt={interrupt_prob} {name}: {result['checkpoints']} checkpoints "
+                      f"(overhead {result['checkpoint_overhead'] * 100:.2f}%), lost {result['lost_mb']:.1f}MB "
+                      f"(expected {result['expected_lost_mb']:.1f}MB), interval {result['mean_interval_mb']:.1f}MB, "
+                      f"{result['blobs_per_s']:.1f} blobs/s")
+    return results
+
+
+if __name__ == "__main__":
+    measure_checkpoint_policies()
\ No newline at end of file
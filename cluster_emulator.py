@@ -0,0 +1,287 @@
+from common import DEFAULT_SHARD_NUM, SNAPSHOT_GRANULARITY, MetaType, TaskStatus, BlobFile, GCTask, Metadata
+from blob_store import BlobStore, BLOB_HEADER_SIZE
+from checksum import get_engine
+from fpga_pipeline import FPGADynamicPipeline
+from mors_scheduler import GCTaskQueue
+from placement import ShardPlacement
+from shard_gc_scheduler import ShardGCScheduler
+from collections import defaultdict
+from multiprocessing import connection
+from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import pickle
+import random
+import time
+
+# 多进程集群仿真（论文5.9节节点扩展实验）：每个节点一个OS进程，独占其分片的GC任务、FPGA流水线、
+# Raft日志与快照日志；节点经multiprocessing管道与协调进程通信（星形拓扑，本地RPC替身），
+# 消息攒批后按帧发送。中断任务的快照经协调进程移交给备份节点进程续跑（跨进程主备切换）。
+RPC_BATCH_SIZE = 32  # 每帧最多打包的消息数
+
+
+class RpcChannel:
+    """批量RPC通道：消息为(kind, payload)，先进入发送缓冲，攒满batch_size条或显式flush时
+    打包为一帧pickle经管道发送，减少跨进程系统调用与序列化次数"""
+
+    def __init__(self, conn: connection.Connection, batch_size: int = RPC_BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self._outbox: List[Tuple[str, object]] = []
+        self.stats = defaultdict(int)
+
+    def send(self, kind: str, payload: object = None, flush: bool = False):
+        self._outbox.append((kind, payload))
+        if flush or len(self._outbox) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._outbox:
+            return
+        frame = pickle.dumps(self._outbox, protocol=pickle.HIGHEST_PROTOCOL)
+        self.conn.send_bytes(frame)
+        self.stats["messages_sent"] += len(self._outbox)
+        self.stats["frames_sent"] += 1
+        self.stats["bytes_sent"] += len(frame)
+        self._outbox = []
+
+    def receive(self, timeout: Optional[float] = 0.0) -> List[Tuple[str, object]]:
+        """接收已到达的全部帧（timeout非0时阻塞等待），等待前先发出缓冲中的消息"""
+        if timeout != 0:
+            self.flush()
+        messages = []
+        if not self.conn.poll(timeout):
+            return messages
+        while True:
+            try:
+                batch = pickle.loads(self.conn.recv_bytes())
+            except EOFError:  # 对端已关闭（节点进程退出）
+                return messages
+            messages.extend(batch)
+            self.stats["messages_received"] += len(batch)
+            self.stats["frames_received"] += 1
+            if not self.conn.poll(0):
+                return messages
+
+
+class NodeProcess:
+    """节点进程主体：按MORS收益顺序执行本节点的GC任务，处理协调进程转发的移交/释放消息
+
+    消息（协调进程 → 节点）：
+      blobs     本节点为主节点的分片的候选Blob列表
+      handoff   (目标节点, 任务ID, Blob, 快照)：接管其他节点中断的任务
+      released  (分片ID, 任务ID, 结束偏移, 累计CRC32)：本节点分片的任务已在其他节点完成
+      stop      回复统计后退出
+    消息（节点 → 协调进程）：handoff、done (分片ID, 任务ID, 结束偏移, 累计CRC32, 回收字节数)、stats
+    """
+
+    def __init__(self, node_id: str, node_ids: List[str], shard_num: int, root: str, run_dir: str,
+                 rpc: RpcChannel, interrupt_prob: float, seed: int):
+        self.node_id = node_id
+        self.rpc = rpc
+        self.interrupt_prob = interrupt_prob
+        self.seed = seed
+        node_dir = os.path.join(run_dir, node_id)
+        os.makedirs(node_dir, exist_ok=True)
+        self.scheduler = ShardGCScheduler(node_ids, shard_num=shard_num,
+                                          raft_log_path=os.path.join(node_dir, "raft.log"),
+                                          snapshot_journal_path=os.path.join(node_dir, "snapshots.journal"))
+        self.blob_store = BlobStore(root)
+        self.checksum_engine = get_engine()  # 各节点进程须使用同一引擎，移交的快照校验和才能接续
+        self.pipeline = FPGADynamicPipeline(self.checksum_engine)
+        self.ready = GCTaskQueue()
+        self.out = bytearray(16 * SNAPSHOT_GRANULARITY)
+        self.stats = defaultdict(float)
+
+    def _owns(self, shard_id: int) -> bool:
+        return self.scheduler.placement.nodes_of(shard_id)[0] == self.node_id
+
+    def _create_next_task(self, shard_id: int):
+        task = self.scheduler.create_gc_task(shard_id=shard_id)
+        if task is not None:
+            self.ready.push(task)
+
+    def _handle(self, kind: str, payload) -> bool:
+        """处理一条消息，收到stop时返回False"""
+        if kind == "blobs":
+            for blob in payload:
+                self.scheduler.garbage_tracker.register_blob(blob)
+            for shard_id in sorted({blob.shard_id for blob in payload}):
+                if shard_id not in self.scheduler.shard_gc_map:
+                    self._create_next_task(shard_id)
+        elif kind == "handoff":
+            _, task_id, blob, snapshot = payload
+            self.ready.push(self.scheduler.adopt_task(task_id, blob, snapshot, self.node_id))
+            self.stats["handoffs_in"] += 1
+        elif kind == "released":
+            shard_id, task_id, processed_offset, running_checksum = payload
+            task = self.scheduler.shard_gc_map.get(shard_id)
+            if task is not None and task.task_id == task_id:
+                self.scheduler.complete_task(task, processed_offset, running_checksum)
+                self._create_next_task(shard_id)
+        elif kind == "stop":
+            self.rpc.send("stats", {"node_id": self.node_id, **self.stats, **self.rpc.stats}, flush=True)
+            return False
+        return True
+
+    def run_task(self, task: GCTask):
+        """逐窗口执行任务；模拟中断时保存快照并把任务移交给备份节点进程，本进程不再继续"""
+        blob = task.target_blob
+        processed_offset = self.scheduler.resume_task(task)
+        running_checksum = int(task.current_snapshot.valid_checksum, 16) if task.current_snapshot else 0
+        rng = random.Random(f"{self.seed}:{task.task_id}:{processed_offset}")
+        task.status = TaskStatus.RUNNING
+        start = time.perf_counter()
+        with self.blob_store.open_blob(blob) as mapped_blob:
+            for window in mapped_blob.iter_windows(processed_offset, SNAPSHOT_GRANULARITY):
+                self.pipeline.process_batch(window.view, window.record_offsets, blob.blob_id, out=self.out)
+                processed_offset = window.end
+                running_checksum = self.checksum_engine.update(window.view, running_checksum)
+                self.stats["scanned_bytes"] += window.nbytes
+                if rng.random() < self.interrupt_prob:
+                    # interrupt_task保存快照并交换主备，task.primary_node_id即为接管节点
+                    self.scheduler.interrupt_task(task, processed_offset, f"{running_checksum:08x}", False)
+                    self.rpc.send("handoff", (task.primary_node_id, task.task_id, blob, task.current_snapshot),
+                                  flush=True)
+                    self.stats["handoffs_out"] += 1
+                    self.stats["busy_s"] += time.perf_counter() - start
+                    return
+                self.scheduler.checkpoint_task(task, processed_offset, running_checksum)
+        self.scheduler.complete_task(task, processed_offset, running_checksum)
+        self.scheduler.add_raft_sync_metadata(Metadata(key=f"key-{blob.blob_id}", blob_id=blob.blob_id,
+                                                       offset=processed_offset, is_validated=False,
+                                                       meta_type=MetaType.GC))
+        reclaimed = max(processed_offset - BLOB_HEADER_SIZE, 0) * task.garbage_ratio
+        owned = self._owns(task.shard_id)
+        # 接管任务的完成需立即通知分片主节点（其后续任务等待释放），本节点分片的完成消息攒批发送
+        self.rpc.send("done", (task.shard_id, task.task_id, processed_offset, running_checksum, reclaimed),
+                      flush=not owned)
+        self.stats["tasks"] += 1
+        self.stats["busy_s"] += time.perf_counter() - start
+        if owned:
+            self._create_next_task(task.shard_id)
+
+    def serve(self):
+        try:
+            while True:
+                # 无就绪任务时阻塞等待消息，否则只取已到达的消息
+                messages = self.rpc.receive(timeout=None if not len(self.ready) else 0.0)
+                if not all(self._handle(kind, payload) for kind, payload in messages):
+                    return
+                task = self.ready.pop()
+                if task is not None:
+                    self.run_task(task)
+        finally:
+            self.scheduler.close()
+
+
+def _node_main(node_id: str, node_ids: List[str], shard_num: int, root: str, run_dir: str,
+               conn: connection.Connection, interrupt_prob: float, seed: int):
+    NodeProcess(node_id, node_ids, shard_num, root, run_dir, RpcChannel(conn), interrupt_prob, seed).serve()
+
+
+class ClusterEmulator:
+    """协调进程：按一致性哈希放置把候选Blob分发给主节点进程，转发移交/释放消息，汇总吞吐"""
+
+    def __init__(self, node_num: int, root: str, shard_num: int = DEFAULT_SHARD_NUM, interrupt_prob: float = 0.02,
+                 seed: int = 0):
+        self.node_ids = [f"Node-{i + 1}" for i in range(node_num)]
+        self.root = root
+        self.shard_num = shard_num
+        self.interrupt_prob = interrupt_prob
+        self.seed = seed
+        self.placement = ShardPlacement(self.node_ids, shard_num)
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+
+    def run(self, blobs: List[BlobFile], run_dir: str) -> dict:
+        channels: Dict[str, RpcChannel] = {}
+        processes = []
+        for node_id in self.node_ids:
+            parent_conn, child_conn = self.context.Pipe()
+            process = self.context.Process(target=_node_main, name=node_id, daemon=True,
+                                           args=(node_id, self.node_ids, self.shard_num, self.root, run_dir,
+                                                 child_conn, self.interrupt_prob, self.seed))
+            process.start()
+            child_conn.close()
+            channels[node_id] = RpcChannel(parent_conn)
+            processes.append(process)
+        node_of_conn = {channel.conn: node_id for node_id, channel in channels.items()}
+
+        start = time.perf_counter()
+        by_node = defaultdict(list)
+        for blob in blobs:
+            by_node[self.placement.nodes_of(blob.shard_id)[0]].append(blob)
+        for node_id, node_blobs in by_node.items():
+            channels[node_id].send("blobs", node_blobs, flush=True)
+
+        pending = len(blobs)
+        handoffs = 0
+        reclaimed = 0.0
+        while pending:
+            for conn in connection.wait(list(node_of_conn)):
+                sender = node_of_conn[conn]
+                for kind, payload in channels[sender].receive():
+                    if kind == "handoff":
+                        channels[payload[0]].send("handoff", payload, flush=True)
+                        handoffs += 1
+                    elif kind == "done":
+                        shard_id, task_id, processed_offset, running_checksum, blob_reclaimed = payload
+                        owner = self.placement.nodes_of(shard_id)[0]
+                        if owner != sender:
+                            channels[owner].send("released", payload[:4], flush=True)
+                        reclaimed += blob_reclaimed
+                        pending -= 1
+        elapsed = time.perf_counter() - start
+
+        node_stats = []
+        for node_id, channel in channels.items():
+            channel.send("stop", flush=True)
+        for node_id, channel in channels.items():
+            for kind, payload in channel.receive(timeout=None):
+                if kind == "stats":
+                    node_stats.append(payload)
+        for process in processes:
+            process.join()
+        scanned = sum(stats.get("scanned_bytes", 0) for stats in node_stats)
+        messages = sum(stats.get("messages_sent", 0) for stats in node_stats)
+        frames = sum(stats.get("frames_sent", 0) for stats in node_stats)
+        return {
+            "nodes": len(self.node_ids),
+            "blobs": len(blobs),
+            "elapsed_s": elapsed,
+            "blobs_per_s": len(blobs) / elapsed,
+            "scanned_mb_per_s": scanned / elapsed / 2 ** 20,
+            "reclaimed_mb_per_s": reclaimed / elapsed / 2 ** 20,
+            "handoffs": handoffs,
+            "rpc_messages_per_frame": messages / frames if frames else 0.0,
+            "max_node_busy_s": max(stats.get("busy_s", 0.0) for stats in node_stats),
+        }
+
+
+def measure_cluster_scaling(node_counts: Tuple[int, ...] = (3, 5, 8, 10, 16), shard_num: int = 64,
+                            blob_num_per_shard: int = 2, value_count: int = 30000, value_size: int = 80,
+                            interrupt_prob: float = 0.02) -> List[dict]:
+    """扩展性实验：同一批Blob由3→16个节点进程执行GC时的集群吞吐（受本机CPU核数限制）"""
+    import tempfile
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gcsmartkv-cluster-") as root:
+        blob_store = BlobStore(root)
+        value = b"v" * value_size
+        blobs = [blob_store.write_blob(shard_id, f"Blob-{shard_id}-{i}", (value for _ in range(value_count)),
+                                       garbage_ratio=rng.uniform(0.3, 0.8))
+                 for shard_id in range(shard_num) for i in range(blob_num_per_shard)]
+        for node_num in node_counts:
+            emulator = ClusterEmulator(node_num, root, shard_num=shard_num, interrupt_prob=interrupt_prob)
+            report = emulator.run(blobs, os.path.join(root, "runs", str(node_num)))
+            results.append(report)
+            print(f"[Cluster Emulation] {node_num} node processes ({os.cpu_count()} CPUs): "
+                  f"{report['blobs_per_s']:.1f} blobs/s, scan {report['scanned_mb_per_s']:.1f} MB/s, "
+                  f"reclaimed {report['reclaimed_mb_per_s']:.1f} MB/s, {report['handoffs']} snapshot handoffs, "
+                  f"{report['rpc_messages_per_frame']:.1f} msgs/frame")
+    return results
+
+
+if __name__ == "__main__":
+    measure_cluster_scaling()
\ No newline at end of file
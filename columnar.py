@@ -0,0 +1,245 @@
+from common import BLOB_DEFAULT_SIZE, MetaType, BlobFile, Metadata
+from typing import Dict, List, Optional
+import numpy as np
+import time
+
+# 列式元数据/Blob描述表：NumPy结构化数组按行紧凑存储，Blob ID驻留为整数
+# 每条元数据定长42B（dataclass逐对象存储约240B/Key），dataclass仅作为单行视图按需物化
+KEY_WIDTH = 24  # 定长Key宽度（字节），YCSB Key形如"user"+19位数字
+METADATA_DTYPE = np.dtype([
+    ("key", f"S{KEY_WIDTH}"),
+    ("blob", "<u4"),  # 驻留后的Blob ID
+    ("offset", "<u8"),
+    ("meta_type", "u1"),  # MetaType枚举值
+    ("is_validated", "?"),
+    ("delay_range", "<f4"),
+])
+BLOB_DTYPE = np.dtype([
+    ("blob", "<u4"),
+    ("shard_id", "<u4"),
+    ("size", "<u8"),
+    ("is_valid", "?"),
+    ("value_count", "<u4"),
+    ("garbage_ratio", "<f4"),
+    ("create_time", "<f8"),
+])
+
+
+class BlobIdInterner:
+    """Blob ID字符串 ↔ 整数ID双向映射（每个Blob一条，远少于Key数）"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, blob_id: str) -> int:
+        interned = self._ids.get(blob_id)
+        if interned is None:
+            interned = self._ids[blob_id] = len(self._names)
+            self._names.append(blob_id)
+        return interned
+
+    def intern_many(self, blob_ids) -> np.ndarray:
+        """批量驻留：已是整数数组时原样返回，否则逐个（按唯一值）驻留"""
+        blob_ids = np.asarray(blob_ids)
+        if blob_ids.dtype.kind in "iu":
+            return blob_ids.astype(np.uint32, copy=False)
+        unique, inverse = np.unique(blob_ids, return_inverse=True)
+        codes = np.fromiter((self.intern(str(blob_id)) for blob_id in unique), dtype=np.uint32, count=len(unique))
+        return codes[inverse]
+
+    def lookup(self, interned: int) -> str:
+        return self._names[interned]
+
+    def get(self, blob_id: str) -> Optional[int]:
+        return self._ids.get(blob_id)
+
+
+def encode_keys(keys) -> np.ndarray:
+    """Key列编码为定长字节串：str按UTF-8编码，超出KEY_WIDTH字节时报ValueError（不静默截断）"""
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return np.empty(0, dtype=f"S{KEY_WIDTH}")
+    if keys.dtype.kind == "U":
+        keys = np.char.encode(keys, "utf-8")
+    elif keys.dtype.kind != "S":  # str与bytes混合
+        keys = np.array([key.encode("utf-8") if isinstance(key, str) else bytes(key) for key in keys.tolist()])
+    if keys.dtype.itemsize > KEY_WIDTH:
+        too_long = np.flatnonzero(np.char.str_len(keys) > KEY_WIDTH)
+        if len(too_long):
+            key = keys[too_long[0]]
+            raise ValueError(f"Key {key!r} is {len(key)}B, longer than the {KEY_WIDTH}B key column")
+    return keys.astype(f"S{KEY_WIDTH}", copy=False)
+
+
+class ColumnarTable:
+    """可增长的结构化数组表：容量按2倍扩展，列与切片均为零拷贝视图"""
+
+    def __init__(self, dtype: np.dtype, capacity: int = 1024):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._size * self._data.dtype.itemsize
+
+    def _reserve(self, count: int):
+        needed = self._size + count
+        if needed > len(self._data):
+            grown = np.zeros(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def _append_columns(self, count: int, columns: Dict[str, object]) -> slice:
+        """追加count行，columns为 列名 → 标量或长度为count的数组；返回新行的切片"""
+        self._reserve(count)
+        rows = slice(self._size, self._size + count)
+        block = self._data[rows]
+        for name, values in columns.items():
+            block[name] = values
+        self._size += count
+        return rows
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """行区间的零拷贝视图（扩容后旧视图不再反映新写入）"""
+        stop = self._size if stop is None else min(stop, self._size)
+        return self._data[start:stop]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[name][:self._size]
+
+    def update(self, rows, **columns):
+        """批量更新：rows为下标数组/布尔掩码/切片，columns为 列名 → 标量或等长数组"""
+        data = self._data[:self._size]
+        for name, values in columns.items():
+            data[name][rows] = values
+
+
+class MetadataTable(ColumnarTable):
+    """列式元数据表（论文2.1节元数据区），Metadata作为单行视图按需物化"""
+
+    def __init__(self, interner: Optional[BlobIdInterner] = None, capacity: int = 1024):
+        super().__init__(METADATA_DTYPE, capacity)
+        self.interner = interner or BlobIdInterner()
+
+    def append(self, keys, blob_ids, offsets, meta_types=MetaType.NORMAL.value, is_validated=False,
+               delay_ranges=0.0) -> slice:
+        """批量追加：keys为str/bytes序列（UTF-8编码后不得超过KEY_WIDTH字节），blob_ids为字符串或已驻留整数"""
+        keys = encode_keys(keys)
+        return self._append_columns(len(keys), {
+            "key": keys,
+            "blob": self.interner.intern_many(blob_ids) if not np.isscalar(blob_ids) else self.interner.intern(blob_ids),
+            "offset": offsets,
+            "meta_type": meta_types,
+            "is_validated": is_validated,
+            "delay_range": delay_ranges,
+        })
+
+    def append_metadata(self, metas: List[Metadata]) -> slice:
+        return self.append([meta.key for meta in metas], [meta.blob_id for meta in metas],
+                           [meta.offset for meta in metas], [meta.meta_type.value for meta in metas],
+                           [meta.is_validated for meta in metas], [meta.delay_range for meta in metas])
+
+    def row(self, i: int) -> Metadata:
+        key, blob, offset, meta_type, is_validated, delay_range = self._data[i].tolist()
+        return Metadata(key=key.decode("utf-8"), blob_id=self.interner.lookup(blob), offset=offset,
+                        is_validated=is_validated, meta_type=MetaType(meta_type), delay_range=delay_range)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None):
+        for i in range(start, self._size if stop is None else min(stop, self._size)):
+            yield self.row(i)
+
+    def rows_of_blob(self, blob_id: str) -> np.ndarray:
+        """指向指定Blob的全部行下标"""
+        interned = self.interner.get(blob_id)
+        if interned is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.column("blob") == interned)
+
+
+class BlobTable(ColumnarTable):
+    """列式Blob描述表（论文2.1节价值区），BlobFile作为单行视图按需物化"""
+
+    def __init__(self, interner: Optional[BlobIdInterner] = None, capacity: int = 1024):
+        super().__init__(BLOB_DTYPE, capacity)
+        self.interner = interner or BlobIdInterner()
+        self._row_of_blob: Dict[int, int] = {}
+
+    def append(self, blob_ids, shard_ids, value_counts=0, garbage_ratios=0.0, sizes=BLOB_DEFAULT_SIZE,
+               create_times=None) -> slice:
+        interned = self.interner.intern_many(blob_ids)
+        rows = self._append_columns(len(interned), {
+            "blob": interned,
+            "shard_id": shard_ids,
+            "size": sizes,
+            "is_valid": True,
+            "value_count": value_counts,
+            "garbage_ratio": garbage_ratios,
+            "create_time": time.time() if create_times is None else create_times,
+        })
+        self._row_of_blob.update(zip(interned.tolist(), range(rows.start, rows.stop)))
+        return rows
+
+    def append_blobs(self, blobs: List[BlobFile]) -> slice:
+        return self.append([blob.blob_id for blob in blobs], [blob.shard_id for blob in blobs],
+                           [blob.value_count for blob in blobs], [blob.garbage_ratio for blob in blobs],
+                           [blob.size for blob in blobs], [blob.create_time for blob in blobs])
+
+    def row_index(self, blob_id: str) -> Optional[int]:
+        interned = self.interner.get(blob_id)
+        return None if interned is None else self._row_of_blob.get(interned)
+
+    def row(self, i: int) -> BlobFile:
+        blob, shard_id, size, is_valid, value_count, garbage_ratio, create_time = self._data[i].tolist()
+        return BlobFile(blob_id=self.interner.lookup(blob), shard_id=shard_id, size=size, is_valid=is_valid,
+                        value_count=value_count, garbage_ratio=garbage_ratio, create_time=create_time)
+
+    def rows(self):
+        for i in range(self._size):
+            yield self.row(i)
+
+
+def measure_memory_per_key(key_num: int = 1000000, blob_num: int = 5000) -> dict:
+    """内存实验：同一批元数据以dataclass对象列表与列式表存储时的每Key内存（tracemalloc统计）"""
+    import tracemalloc
+    blob_names = [f"Blob-{i % 50}-{i}" for i in range(blob_num)]  # Blob ID字符串在两种存储中均共享
+
+    # dataclass存储：每Key一个对象及其Key字符串
+    tracemalloc.start()
+    metas = [Metadata(key=f"user{i:019d}", blob_id=blob_names[i % blob_num], offset=(i // blob_num) * 84,
+                      is_validated=False, meta_type=MetaType.GC) for i in range(key_num)]
+    dataclass_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del metas
+
+    # 列式存储：分块批量追加（输入的临时列表在每块追加后释放）
+    tracemalloc.start()
+    table = MetadataTable(capacity=key_num)
+    chunk = 65536
+    for start in range(0, key_num, chunk):
+        rows = range(start, min(start + chunk, key_num))
+        table.append([f"user{i:019d}" for i in rows], np.asarray([table.interner.intern(blob_names[i % blob_num])
+                                                                  for i in rows], dtype=np.uint32),
+                     [(i // blob_num) * 84 for i in rows], meta_types=MetaType.GC.value)
+    columnar_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    result = {
+        "keys": key_num,
+        "dataclass_bytes_per_key": dataclass_bytes / key_num,
+        "columnar_bytes_per_key": columnar_bytes / key_num,
+        "row_bytes": METADATA_DTYPE.itemsize,
+    }
+    print(f"[Columnar Metadata] {key_num} keys: dataclass {result['dataclass_bytes_per_key']:.1f}B/key, "
+          f"columnar {result['columnar_bytes_per_key']:.1f}B/key (row {result['row_bytes']}B)")
+    return result
+
+
+if __name__ == "__main__":
+    measure_memory_per_key()
\ No newline at end of file
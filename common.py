@@ -1,8 +1,7 @@
 import enum
 import time
-import hashlib
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import Optional
 
 # 论文2.1节：Blob文件默认大小32MB
 BLOB_DEFAULT_SIZE = 32 * 1024 * 1024  # 32MB
@@ -12,6 +11,20 @@ DEFAULT_SHARD_NUM = 50
 SNAPSHOT_GRANULARITY = 1 * 1024 * 1024  # 1MB
 
 
+class MetaType(enum.Enum):
+    """元数据类型（论文4.8节MDP状态）"""
+    NORMAL = 1
+    GC = 2
+
+
+class TaskStatus(enum.Enum):
+    """GC任务状态（论文4.3节）"""
+    PENDING = 1
+    RUNNING = 2
+    INTERRUPTED = 3
+    COMPLETED = 4
+
+
 @dataclass
 class BlobFile:
     """模拟Blob文件（Value存储），对应论文2.1节价值区"""
@@ -22,6 +35,7 @@ class BlobFile:
     value_count: int = 0  # 存储的Value数量
     garbage_ratio: float = 0.0  # 垃圾比率（无效Value占比）
     create_time: float = time.time()
+    path: Optional[str] = None  # 磁盘Blob文件路径（由BlobStore写入后填充）
 
     def calculate_garbage_ratio(self, valid_value_count: int):
         """计算垃圾比率，对应论文5.2节分片验证逻辑"""
@@ -52,7 +66,7 @@ class GCTask:
     primary_node_id: str  # 主节点（主备机制）
     backup_node_id: str  # 备份节点
     target_blob: BlobFile
-    status: enum.Enum = enum.Enum("TaskStatus", ["PENDING", "RUNNING", "INTERRUPTED", "COMPLETED"])
+    status: TaskStatus = TaskStatus.PENDING
     current_snapshot: Optional[GCTaskSnapshot] = None  # 断点快照
     priority_weight: float = 0.0  # MORS算法：任务优先级权重（论文4.5节）
     garbage_ratio: float = 0.0  # 目标Blob垃圾比率
@@ -61,8 +75,8 @@ class GCTask:
         """MORS算法：计算任务收益值=优先级权重×垃圾比率（论文4.5节）"""
         return self.priority_weight * self.garbage_ratio
 
-    def save_snapshot(self, processed_offset: int, valid_checksum: str, metadata_updated: bool):
-        """保存断点快照，对应论文4.3节"""
+    def save_snapshot(self, processed_offset: int, valid_checksum: str, metadata_updated: bool, interrupted: bool = True):
+        """保存断点快照，对应论文4.3节（interrupted=False为运行中的周期性检查点）"""
         self.current_snapshot = GCTaskSnapshot(
             task_id=self.task_id,
             shard_id=self.shard_id,
@@ -71,13 +85,14 @@ class GCTask:
             valid_checksum=valid_checksum,
             metadata_updated=metadata_updated
         )
-        self.status = GCTask.status.INTERRUPTED
+        if interrupted:
+            self.status = TaskStatus.INTERRUPTED
 
     def resume_from_snapshot(self) -> Optional[int]:
         """从断点恢复，返回已处理偏移量"""
         if not self.current_snapshot:
             return 0  # 无快照，从头开始
-        self.status = GCTask.status.RUNNING
+        self.status = TaskStatus.RUNNING
         return self.current_snapshot.processed_offset
 
 
@@ -102,5 +117,5 @@ class Metadata:
     blob_id: str  # 指向Value所在的Blob文件
     offset: int  # Value在Blob中的偏移量
     is_validated: bool  # 是否已验证（MDP延迟验证，论文4.8节）
-    meta_type: enum.Enum = enum.Enum("MetaType", ["NORMAL", "GC"])  # 元数据类型
+    meta_type: MetaType = MetaType.NORMAL  # 元数据类型
     delay_range: float = 0.0  # 延迟范围（ms，论文4.8节MDP状态）
\ No newline at end of file
@@ -0,0 +1,195 @@
+from common import BlobFile
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+import random
+import time
+
+# 垃圾比率分桶宽度5%（共21个桶，比率1.0单独成桶），桶数为常数，选取最差Blob为O(1)
+GARBAGE_BUCKET_WIDTH = 0.05
+GARBAGE_BUCKET_NUM = int(round(1 / GARBAGE_BUCKET_WIDTH)) + 1
+
+
+def garbage_bucket(garbage_ratio: float) -> int:
+    return min(int(garbage_ratio / GARBAGE_BUCKET_WIDTH + 1e-9), GARBAGE_BUCKET_NUM - 1)
+
+
+class GarbageTracker:
+    """增量垃圾统计（论文5.2节）：按Blob与分片维护存活/失效Value计数，覆盖写或删除时O(1)更新
+
+    候选Blob按垃圾比率分桶索引（分片内，桶内按登记顺序排列）；全局选取经“分片最高桶”索引：
+    每个空闲分片只登记在其最高非空桶中，已有活跃任务的分片（busy_shards，增量维护）不在其中，选取为O(桶数)。
+    GC任务领取候选后将其移出索引，避免同一Blob被重复调度。
+    """
+
+    def __init__(self):
+        self.blobs: Dict[str, BlobFile] = {}
+        self.live: Dict[str, int] = {}
+        self.dead: Dict[str, int] = {}
+        self.shard_live: Dict[int, int] = defaultdict(int)
+        self.shard_dead: Dict[int, int] = defaultdict(int)
+        # 候选索引：桶号 → {blob_id: BlobFile}（dict保持插入顺序，删除为O(1)）
+        self._shard_buckets: Dict[int, List[Dict[str, BlobFile]]] = defaultdict(
+            lambda: [{} for _ in range(GARBAGE_BUCKET_NUM)])
+        self._bucket_of: Dict[str, int] = {}  # 仍在候选索引中的Blob → 当前桶号
+        # 分片最高桶索引：shard_id → 最高非空桶号；桶号 → 以其为最高桶的空闲分片（dict作有序集合）
+        self._shard_top: Dict[int, int] = {}
+        self._top_shards: List[Dict[int, None]] = [{} for _ in range(GARBAGE_BUCKET_NUM)]
+        self.busy_shards: Set[int] = set()  # 已有活跃GC任务的分片，全局选取时跳过
+
+    def __len__(self) -> int:
+        return len(self._bucket_of)
+
+    def __contains__(self, blob_id: str) -> bool:
+        return blob_id in self._bucket_of
+
+    def register_blob(self, blob: BlobFile, live_count: Optional[int] = None):
+        """登记Blob并加入候选索引；未给出存活数时按blob.garbage_ratio折算"""
+        if blob.blob_id in self.blobs:
+            raise ValueError(f"Blob {blob.blob_id} already registered")
+        if live_count is None:
+            live_count = int(round(blob.value_count * (1.0 - blob.garbage_ratio)))
+        self.blobs[blob.blob_id] = blob
+        self.live[blob.blob_id] = live_count
+        self.dead[blob.blob_id] = blob.value_count - live_count
+        self.shard_live[blob.shard_id] += live_count
+        self.shard_dead[blob.shard_id] += blob.value_count - live_count
+        blob.calculate_garbage_ratio(live_count)
+        self._insert(blob, garbage_bucket(blob.garbage_ratio))
+
+    def invalidate(self, blob_id: str, count: int = 1):
+        """Blob中count个Value因覆盖写或删除失效：更新Blob/分片计数、垃圾比率与所在桶"""
+        blob = self.blobs[blob_id]
+        count = min(count, self.live[blob_id])
+        self.live[blob_id] -= count
+        self.dead[blob_id] += count
+        self.shard_live[blob.shard_id] -= count
+        self.shard_dead[blob.shard_id] += count
+        self._update_bucket(blob)
+
+    def add_live(self, blob_id: str, count: int = 1):
+        """向已登记的Blob追加count个存活Value（如前台写入活跃Blob）"""
+        blob = self.blobs[blob_id]
+        blob.value_count += count
+        self.live[blob_id] += count
+        self.shard_live[blob.shard_id] += count
+        self._update_bucket(blob)
+
+    def claim(self, blob_id: str):
+        """Blob已被GC任务领取：移出候选索引（计数保留，直到unregister_blob）"""
+        bucket = self._bucket_of.get(blob_id)
+        if bucket is not None:
+            self._remove(self.blobs[blob_id], bucket)
+
+    def release(self, blob_id: str):
+        """领取的Blob重新成为候选（如活跃Blob封存、搬迁完成或放弃GC）"""
+        if blob_id in self.blobs and blob_id not in self._bucket_of:
+            blob = self.blobs[blob_id]
+            self._insert(blob, garbage_bucket(blob.calculate_garbage_ratio(self.live[blob_id])))
+
+    def unregister_blob(self, blob_id: str):
+        """Blob被回收或删除：清除计数与索引"""
+        self.claim(blob_id)
+        blob = self.blobs.pop(blob_id)
+        self.shard_live[blob.shard_id] -= self.live.pop(blob_id)
+        self.shard_dead[blob.shard_id] -= self.dead.pop(blob_id)
+
+    def mark_busy(self, shard_id: int):
+        """分片创建了GC任务：移出全局选取索引"""
+        self.busy_shards.add(shard_id)
+        top = self._shard_top.get(shard_id)
+        if top is not None:
+            self._top_shards[top].pop(shard_id, None)
+
+    def mark_idle(self, shard_id: int):
+        """分片的GC任务已完成：重新参与全局选取"""
+        self.busy_shards.discard(shard_id)
+        top = self._shard_top.get(shard_id)
+        if top is not None:
+            self._top_shards[top][shard_id] = None
+
+    def worst_blob(self, shard_id: Optional[int] = None) -> Optional[BlobFile]:
+        """垃圾比率最高的候选Blob：指定分片时取该分片最高桶中最早登记者；
+        全局时跳过已有活跃任务的分片，取最高桶中最早进入该桶的空闲分片"""
+        if shard_id is None:
+            for shards in reversed(self._top_shards):
+                if shards:
+                    shard_id = next(iter(shards))
+                    break
+            else:
+                return None
+        top = self._shard_top.get(shard_id)
+        if top is None:
+            return None
+        return next(iter(self._shard_buckets[shard_id][top].values()))
+
+    def shard_garbage_ratio(self, shard_id: int) -> float:
+        total = self.shard_live[shard_id] + self.shard_dead[shard_id]
+        return self.shard_dead[shard_id] / total if total else 0.0
+
+    def _update_bucket(self, blob: BlobFile):
+        """计数变化后重算垃圾比率；仍在候选索引中时移动到新桶"""
+        blob.calculate_garbage_ratio(self.live[blob.blob_id])
+        bucket = self._bucket_of.get(blob.blob_id)
+        new_bucket = garbage_bucket(blob.garbage_ratio)
+        if bucket is not None and bucket != new_bucket:
+            self._remove(blob, bucket)
+            self._insert(blob, new_bucket)
+
+    def _insert(self, blob: BlobFile, bucket: int):
+        self._shard_buckets[blob.shard_id][bucket][blob.blob_id] = blob
+        self._bucket_of[blob.blob_id] = bucket
+        if bucket > self._shard_top.get(blob.shard_id, -1):
+            self._set_top(blob.shard_id, bucket)
+
+    def _remove(self, blob: BlobFile, bucket: int):
+        buckets = self._shard_buckets[blob.shard_id]
+        del buckets[bucket][blob.blob_id]
+        del self._bucket_of[blob.blob_id]
+        if not buckets[bucket] and self._shard_top.get(blob.shard_id) == bucket:
+            # 最高桶变空：向下查找下一个非空桶（至多GARBAGE_BUCKET_NUM步）
+            self._set_top(blob.shard_id, next((b for b in range(bucket - 1, -1, -1) if buckets[b]), None))
+
+    def _set_top(self, shard_id: int, top: Optional[int]):
+        old = self._shard_top.pop(shard_id, None)
+        if old is not None:
+            self._top_shards[old].pop(shard_id, None)
+        if top is not None:
+            self._shard_top[shard_id] = top
+            if shard_id not in self.busy_shards:
+                self._top_shards[top][shard_id] = None
+
+
+def measure_candidate_selection(blob_num: int = 50000, shard_num: int = 50, overwrite_num: int = 200000,
+                                seed: int = 0) -> dict:
+    """候选选取实验：覆盖写增量更新 + 分桶索引选取最差Blob，对比逐Blob全量扫描"""
+    rng = random.Random(seed)
+    tracker = GarbageTracker()
+    blobs = [BlobFile(blob_id=f"Blob-{i % shard_num}-{i}", shard_id=i % shard_num, value_count=4000,
+                      garbage_ratio=rng.uniform(0.0, 0.5)) for i in range(blob_num)]
+    for blob in blobs:
+        tracker.register_blob(blob)
+    start = time.perf_counter()
+    for _ in range(overwrite_num):
+        tracker.invalidate(blobs[rng.randrange(blob_num)].blob_id)
+    update_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for shard_id in range(shard_num):
+        tracker.worst_blob(shard_id)
+    index_elapsed = (time.perf_counter() - start) / shard_num
+    start = time.perf_counter()
+    for shard_id in range(shard_num):
+        max((blob for blob in blobs if blob.shard_id == shard_id), key=lambda b: b.garbage_ratio)
+    scan_elapsed = (time.perf_counter() - start) / shard_num
+    result = {
+        "blobs": blob_num,
+        "update_ns": update_elapsed / overwrite_num * 1e9,
+        "index_pick_us": index_elapsed * 1e6,
+        "scan_pick_us": scan_elapsed * 1e6,
+    }
+    print(f"[Garbage Index] {blob_num} blobs: invalidate {result['update_ns']:.0f}ns, "
+          f"pick worst {result['index_pick_us']:.1f}us (index) vs {result['scan_pick_us']:.0f}us (scan)")
+    return result
+
+
+if __name__ == "__main__":
+    measure_candidate_selection()
\ No newline at end of file
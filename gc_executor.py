@@ -0,0 +1,322 @@
+from common import SNAPSHOT_GRANULARITY, TaskStatus, BlobFile, GCTask
+from blob_store import BlobStore, BLOB_HEADER_SIZE
+from checkpoint import CheckpointPolicy, merge_reports
+from checksum import DEFAULT_VERIFY_WORKERS, ChecksumEngine, get_engine, verify_blob
+from compaction import Compactor, CompactionResult
+from fpga_pipeline import FPGADynamicPipeline
+from metrics import registry as metrics
+from mors_scheduler import MORSScheduler, HIGH_TIER, LOW_TIER
+from shard_gc_scheduler import ShardGCScheduler
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import random
+import threading
+import time
+
+MAX_CONSECUTIVE_ROLLBACKS = 3  # 连续回退到同一检查点的次数上限，达到后中断前强制在当前窗口记录检查点
+# 全部任务暂存且无运行任务时，按指数退避等待遥测/配额刷新后重试准入；超过时限仍无法派发则报错
+PARK_BACKOFF_S = 0.01
+PARK_BACKOFF_MAX_S = 1.0
+PARK_TIMEOUT_S = 30.0
+
+
+class GCExecutor:
+    """并发GC执行引擎：分片-GC双射保证不同分片的任务互不依赖，可在线程池上并行执行（论文4.2节）
+
+    调度约束：
+    1. 同一分片同一时刻只有一个活跃任务（双射模型）；
+    2. 节点准入由MORSScheduler资源模型决定：派发时预留资源，完成、中断切换或被抢占让出时释放，
+       运行任务数同时受高/低优先级配额限制（论文4.6节）；高优先级任务无法准入时抢占该节点的低优先级任务。
+    """
+
+    def __init__(self, shard_scheduler: ShardGCScheduler, mors_scheduler: MORSScheduler, blob_store: BlobStore,
+                 pipeline: Optional[FPGADynamicPipeline] = None, max_workers: int = 4,
+                 interrupt_prob: float = 0.0, seed: int = 0, checkpoint_interval: Optional[int] = None,
+                 compactor: Optional[Compactor] = None, checksum_engine: Optional[ChecksumEngine] = None,
+                 verify: bool = False, park_timeout_s: float = PARK_TIMEOUT_S):
+        self.shard_scheduler = shard_scheduler
+        self.mors_scheduler = mors_scheduler
+        self.blob_store = blob_store
+        self.max_workers = max_workers
+        self.interrupt_prob = interrupt_prob  # 每个1MB窗口后的模拟中断概率
+        # 每节点检查点策略：checkpoint_interval为None时按Young/Daly自适应，否则为固定间隔（字节）
+        self.checkpoint_policies: Dict[str, CheckpointPolicy] = defaultdict(
+            lambda: CheckpointPolicy(fixed_interval=checkpoint_interval))
+        self.seed = seed
+        # 累计校验和引擎（默认zlib CRC32）；verify为True时任务完成后对整个数据区分块并行重算，核对断点续跑的累计结果
+        self.checksum_engine = checksum_engine or get_engine()
+        self.pipeline = pipeline or FPGADynamicPipeline(self.checksum_engine)
+        self.verify = verify
+        # 校验线程池：所有任务共用（线程在首次校验时才创建）
+        self.verify_pool = ThreadPoolExecutor(max_workers=DEFAULT_VERIFY_WORKERS) if verify else None
+        # 存活数据搬迁：设置时扫描完成后在工作线程上将存活记录搬迁到新Blob，随即重定位并删除旧Blob
+        self.compactor = compactor
+        self.compactions: Dict[str, CompactionResult] = {}
+        self.lock = threading.Lock()  # 保护调度器共享状态（节点任务列表、快照）
+        self.active_shards: Dict[int, GCTask] = {}  # shard_id → 运行中任务
+        # 资源或配额不足的任务按(节点, 优先级层)暂存，槽位释放后重新入队，避免反复扫描队列
+        self.parked: Dict[Tuple[str, int], List[GCTask]] = defaultdict(list)
+        self.park_timeout_s = park_timeout_s
+        self._retry_state: Dict[str, Tuple[random.Random, int]] = {}  # task_id → 让出时的(随机序列, 连续回退数)
+        self._local = threading.local()
+        self.stats = defaultdict(float)
+
+    def _admit(self, task: GCTask) -> bool:
+        """准入检查：分片无活跃任务，且主节点资源与对应优先级层配额允许派发"""
+        if task.shard_id in self.active_shards:
+            return False
+        with self.lock:
+            return self.mors_scheduler.admit(task)
+
+    def _acquire(self, task: GCTask) -> Tuple[str, int]:
+        self.active_shards[task.shard_id] = task
+        with self.lock:
+            reservation = self.mors_scheduler.reserve(task)
+        return reservation.node_id, reservation.tier
+
+    def _release(self, task: GCTask):
+        """释放任务预留（中断切换后预留位于新主节点），该节点两层暂存的任务重新入队"""
+        del self.active_shards[task.shard_id]
+        with self.lock:
+            reservation = self.mors_scheduler.release(task)
+        for tier in (HIGH_TIER, LOW_TIER):
+            for parked_task in self.parked.pop((reservation.node_id, tier), []):
+                self.mors_scheduler.submit_task(parked_task)
+
+    def _unpark_all(self):
+        """全部暂存任务重新入队（遥测或配额可能已刷新）"""
+        for tasks in self.parked.values():
+            for parked_task in tasks:
+                self.mors_scheduler.submit_task(parked_task)
+        self.parked.clear()
+
+    def _encode_buffer(self) -> bytearray:
+        """每个工作线程复用一块流水线输出缓冲区"""
+        buffer = getattr(self._local, "encode_buffer", None)
+        if buffer is None:
+            buffer = self._local.encode_buffer = bytearray(16 * SNAPSHOT_GRANULARITY)
+        return buffer
+
+    def run_task(self, task: GCTask) -> Tuple[int, int, int]:
+        """执行单个GC任务：mmap扫描Blob并批量送入流水线，支持断点续跑
+
+        按所在节点的检查点策略（自适应间隔，窗口边界对齐）记录检查点（偏移+累计CRC32）；
+        中断视为非优雅中断：快照退回最近检查点并切换到备份节点后让出，由run()释放原节点预留、重新入队，
+        在新主节点准入后从检查点续跑（其后已处理的字节重做）；
+        被MORS抢占时在当前窗口边界保存快照后让出（不丢失进度）。两种情况任务状态均为INTERRUPTED。
+        配置了搬迁器时，扫描完成后在本线程搬迁存活记录（结果在run()中汇总）。
+        返回(结束偏移, 扫描字节数, 累计CRC32)。
+        """
+        blob = task.target_blob
+        # 中断让出后续跑时沿用该任务的随机序列与连续回退计数
+        rng, rollbacks = self._retry_state.pop(task.task_id, None) or (random.Random(f"{self.seed}:{blob.blob_id}"), 0)
+        out = self._encode_buffer()
+        clock = time.perf_counter
+        with self.lock:
+            processed_offset = self.shard_scheduler.resume_task(task)
+        if processed_offset:
+            print(f"[Task Resume] Task {task.task_id} resumed on node {task.primary_node_id} from offset {processed_offset}")
+        # 累计校验和覆盖全部已处理字节，从快照续跑时接续计算
+        running_checksum = int(task.current_snapshot.valid_checksum, 16) if task.current_snapshot else 0
+        checkpoint_offset, checkpoint_checksum = processed_offset, running_checksum
+        windows_since_checkpoint = 0
+        task.status = TaskStatus.RUNNING
+        metrics.trace(task.task_id, "run", offset=processed_offset)
+        scanned = 0
+        update_checksum = self.checksum_engine.update
+        policy = self.checkpoint_policies[task.primary_node_id]
+        with self.blob_store.open_blob(blob) as mapped_blob:
+            for window in mapped_blob.iter_windows(processed_offset, SNAPSHOT_GRANULARITY):
+                start = clock()
+                self.pipeline.process_batch(window.view, window.record_offsets, blob.blob_id, out=out)
+                running_checksum = update_checksum(window.view, running_checksum)
+                policy.record_progress(window.nbytes, clock() - start)
+                processed_offset = window.end
+                scanned += window.nbytes
+                windows_since_checkpoint += 1
+                interrupted = rng.random() < self.interrupt_prob
+                # 先按策略记录检查点再处理中断（间隔为1个窗口时中断不丢进度）；连续回退达到上限时强制记录，
+                # 保证中断频繁时每次续跑仍至少前进一个窗口
+                if windows_since_checkpoint >= policy.interval_windows() or (
+                        interrupted and rollbacks >= MAX_CONSECUTIVE_ROLLBACKS):
+                    start = clock()
+                    with self.lock:
+                        self.shard_scheduler.checkpoint_task(task, processed_offset, running_checksum)
+                    policy.record_checkpoint(clock() - start)
+                    checkpoint_offset, checkpoint_checksum = processed_offset, running_checksum
+                    windows_since_checkpoint = 0
+                    rollbacks = 0
+
+                # 模拟随机中断：快照退回最近检查点，切换备份节点（论文4.3节）；预留仍在原节点，由run()经_release释放
+                if interrupted:
+                    lost = processed_offset - max(checkpoint_offset, BLOB_HEADER_SIZE)
+                    policy.record_interrupt(lost)
+                    rollbacks += lost > 0
+                    with self.lock:
+                        self.shard_scheduler.interrupt_task(task, checkpoint_offset, f"{checkpoint_checksum:08x}",
+                                                           metadata_updated=False)
+                        self.stats["interrupts"] += 1
+                    print(f"[Task Interrupt] Task {task.task_id} interrupted at offset {processed_offset}, "
+                          f"{lost} bytes since checkpoint, failover to node {task.primary_node_id}")
+                    self._retry_state[task.task_id] = (rng, rollbacks)
+                    return checkpoint_offset, scanned, checkpoint_checksum
+                if self.mors_scheduler.is_preempted(task):
+                    with self.lock:
+                        self.shard_scheduler.interrupt_task(task, processed_offset, f"{running_checksum:08x}",
+                                                           metadata_updated=False)
+                        self.stats["preemptions"] += 1
+                    print(f"[Task Preempt] Task {task.task_id} yields at offset {processed_offset}")
+                    self._retry_state[task.task_id] = (rng, rollbacks)
+                    return processed_offset, scanned, running_checksum
+        if self.verify and not verify_blob(blob.path or self.blob_store.blob_path(blob.shard_id, blob.blob_id),
+                                           running_checksum, BLOB_HEADER_SIZE, processed_offset, self.checksum_engine,
+                                           pool=self.verify_pool):
+            print(f"[Checksum Mismatch] Task {task.task_id}: Blob {blob.blob_id} checksum {running_checksum:08x} "
+                  f"does not match its data")
+            with self.lock:
+                self.stats["verify_failures"] += 1
+        if self.compactor is not None:
+            result = self.compactor.compact(blob)
+            with self.lock:
+                self.compactions[task.task_id] = result
+        return processed_offset, scanned, running_checksum
+
+    def _create_next_task(self, shard_id: int):
+        """分片空闲后从候选索引领取该分片垃圾比率最高的Blob"""
+        task = self.shard_scheduler.create_gc_task(shard_id=shard_id)
+        if task is not None:
+            self.mors_scheduler.submit_task(task)
+
+    def run(self, blobs: Iterable[BlobFile], on_complete: Optional[Callable[[GCTask, int], None]] = None,
+            recovered_tasks: Iterable[GCTask] = ()) -> dict:
+        """执行一批Blob的GC：每个分片按垃圾比率从高到低逐个处理，不同分片并发；返回吞吐统计
+
+        blobs登记到调度器的候选索引（已登记的跳过）；recovered_tasks为启动时从快照日志恢复的中断任务，
+        优先从断点续跑，其分片的新任务在其完成后创建。
+        全部任务因资源或配额暂存且无运行任务时，退避等待节点遥测（observe）或配额刷新后重试，
+        持续park_timeout_s秒仍无法派发时抛出RuntimeError。
+        """
+        recovered_tasks = list(recovered_tasks)
+        tracker = self.shard_scheduler.garbage_tracker
+        shard_ids = set()
+        for blob in blobs:
+            if blob.blob_id not in tracker.blobs:
+                tracker.register_blob(blob)
+            shard_ids.add(blob.shard_id)
+        for task in recovered_tasks:
+            tracker.claim(task.target_blob.blob_id)
+            self.mors_scheduler.submit_task(task)
+        recovered_shards = {task.shard_id for task in recovered_tasks}
+        for shard_id in sorted(shard_ids - recovered_shards):
+            self._create_next_task(shard_id)
+
+        inflight = {}
+        park_deadline, backoff = None, PARK_BACKOFF_S
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                while len(inflight) < self.max_workers:
+                    task = self.mors_scheduler.next_task()
+                    if task is None:
+                        break
+                    if not self._admit(task):
+                        tier = self.mors_scheduler.tier(task)
+                        self.parked[(task.primary_node_id, tier)].append(task)
+                        if tier == HIGH_TIER and task.shard_id not in self.active_shards:
+                            with self.lock:
+                                self.mors_scheduler.preempt(task, task.primary_node_id)
+                        continue
+                    slot = self._acquire(task)
+                    print(f"[Task Scheduling] Assign task {task.task_id} (shard {task.shard_id}) to node {slot[0]}")
+                    metrics.trace(task.task_id, "schedule", node=slot[0], tier=slot[1])
+                    inflight[pool.submit(self.run_task, task)] = task
+                if not inflight:
+                    if not self.parked:
+                        break
+                    now = time.monotonic()
+                    if park_deadline is None:
+                        park_deadline = now + self.park_timeout_s
+                    elif now >= park_deadline:
+                        raise RuntimeError(f"GC tasks parked for {self.park_timeout_s}s but no node has "
+                                           f"free resources or quota")
+                    time.sleep(min(backoff, max(park_deadline - now, 0.0)))
+                    backoff = min(2 * backoff, PARK_BACKOFF_MAX_S)
+                    self.stats["park_waits"] += 1
+                    self._unpark_all()
+                    continue
+                park_deadline, backoff = None, PARK_BACKOFF_S
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = inflight.pop(future)
+                    processed_offset, scanned, running_checksum = future.result()
+                    self._release(task)
+                    self.stats["scanned_bytes"] += scanned
+                    if task.status == TaskStatus.INTERRUPTED:  # 中断或被抢占让出：已保存快照，重新排队准入后续跑
+                        self.mors_scheduler.submit_task(task)
+                        continue
+                    with self.lock:
+                        self.shard_scheduler.complete_task(task, processed_offset, running_checksum)
+                    data_bytes = max(processed_offset - BLOB_HEADER_SIZE, 0)
+                    self.stats["blobs"] += 1
+                    compaction = self.compactions.pop(task.task_id, None)
+                    if compaction is not None:  # 实际回收量：受害Blob数据区减去搬迁重写的存活字节
+                        self.stats["reclaimed_bytes"] += compaction.victim_bytes - compaction.rewritten_bytes
+                        self.stats["victim_bytes"] += compaction.victim_bytes
+                        self.stats["rewritten_bytes"] += compaction.rewritten_bytes
+                    else:
+                        self.stats["reclaimed_bytes"] += data_bytes * task.garbage_ratio
+                    if on_complete:
+                        on_complete(task, processed_offset)
+                    self._create_next_task(task.shard_id)
+        self.stats["elapsed"] += time.perf_counter() - start
+        return self.report()
+
+    def report(self) -> dict:
+        elapsed = self.stats["elapsed"] or 1e-9
+        return {
+            "workers": self.max_workers,
+            "blobs": int(self.stats["blobs"]),
+            "interrupts": int(self.stats["interrupts"]),
+            "preemptions": int(self.stats["preemptions"]),
+            "park_waits": int(self.stats["park_waits"]),
+            "verify_failures": int(self.stats["verify_failures"]),
+            "elapsed_s": elapsed,
+            "blobs_per_s": self.stats["blobs"] / elapsed,
+            "scanned_mb_per_s": self.stats["scanned_bytes"] / elapsed / 2 ** 20,
+            "reclaimed_mb_per_s": self.stats["reclaimed_bytes"] / elapsed / 2 ** 20,
+            "write_amplification": ((self.stats["victim_bytes"] + self.stats["rewritten_bytes"]) / self.stats["victim_bytes"]
+                                    if self.stats["victim_bytes"] else 1.0),
+            **merge_reports(self.checkpoint_policies.values()),
+        }
+
+
+def measure_scaling(worker_counts=(1, 2, 4, 8), shard_num: int = 16, blob_num_per_shard: int = 4,
+                    value_count: int = 100000, value_size: int = 80) -> List[dict]:
+    """并发扩展性实验：同一批Blob在不同工作线程数下的GC吞吐（blobs/s、回收MB/s）"""
+    import contextlib
+    import io
+    import tempfile
+    node_ids = ["Node-1", "Node-2", "Node-3", "Node-4", "Node-5"]
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gcsmartkv-exec-") as root:
+        blob_store = BlobStore(root)
+        value = b"v" * value_size
+        blobs = [blob_store.write_blob(shard_id, f"Blob-{shard_id}-{i}", (value for _ in range(value_count)),
+                                       garbage_ratio=rng.uniform(0.3, 0.8))
+                 for shard_id in range(shard_num) for i in range(blob_num_per_shard)]
+        for workers in worker_counts:
+            executor = GCExecutor(ShardGCScheduler(node_ids, shard_num=shard_num), MORSScheduler(node_ids),
+                                  blob_store, max_workers=workers)
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = executor.run(blobs)
+            results.append(report)
+            print(f"[GC Scaling] workers={workers}: {report['blobs_per_s']:.1f} blobs/s, "
+                  f"scan {report['scanned_mb_per_s']:.1f} MB/s, reclaimed {report['reclaimed_mb_per_s']:.1f} MB/s")
+    return results
+
+
+if __name__ == "__main__":
+    measure_scaling()
\ No newline at end of file
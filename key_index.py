@@ -0,0 +1,279 @@
+from common import MetaType, Metadata
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import itertools
+import random
+import time
+import zlib
+
+# LSM风格Key索引（论文4.9节元数据验证）：内存表 + 多层不可变有序段（SSTable替身）
+# 每个有序段带Bloom过滤器与稀疏索引（fence pointer），验证时按Key顺序访问数据块
+TOMBSTONE = -1  # 删除标记（offset为-1）
+VALIDATION_BUFFER_SIZE = 1 * 1024 * 1024  # 1MB缓冲队列（论文4.9节）
+META_ENTRY_OVERHEAD = 32  # 缓冲队列中每条元数据的固定开销估计（offset、标志、延迟等）
+
+
+def _key_hashes(key_bytes: bytes) -> Tuple[int, int]:
+    """双重哈希的两个基哈希（Kirsch-Mitzenmacher），第二个强制为奇数"""
+    return zlib.crc32(key_bytes), zlib.adler32(key_bytes) | 1
+
+
+class BloomFilter:
+    """定长位数组Bloom过滤器，构建时批量置位（NumPy），查询逐Key计算k个位置"""
+
+    def __init__(self, keys: List[str], bits_per_key: int = 10):
+        self.bit_num = max(64, len(keys) * bits_per_key)
+        self.hash_num = max(1, min(30, int(round(bits_per_key * 0.69))))  # k = ln2 · m/n
+        import numpy as np  # 延迟导入：仅构建有序段时需要，不拖慢只用调度/放置模块的CLI冷启动
+        self.bits = np.zeros((self.bit_num + 7) // 8, dtype=np.uint8)
+        if keys:
+            hashes = np.array([_key_hashes(key.encode("utf-8")) for key in keys], dtype=np.uint64)
+            rounds = np.arange(self.hash_num, dtype=np.uint64)
+            positions = (hashes[:, :1] + rounds * hashes[:, 1:]) % np.uint64(self.bit_num)
+            positions = positions.ravel()
+            np.bitwise_or.at(self.bits, (positions >> np.uint64(3)).astype(np.intp),
+                             (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self._bytes = self.bits.tobytes()
+
+    def may_contain(self, key: str) -> bool:
+        h1, h2 = _key_hashes(key.encode("utf-8"))
+        bits, bit_num = self._bytes, self.bit_num
+        for i in range(self.hash_num):
+            pos = (h1 + i * h2) % bit_num
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SortedRun:
+    """不可变有序段：Key有序存储，fence_keys为每个数据块的首Key（稀疏索引）"""
+
+    def __init__(self, run_id: int, keys: List[str], blob_ids: List[str], offsets: List[int],
+                 block_size: int = 64, bits_per_key: int = 10):
+        self.run_id = run_id
+        self.keys = keys
+        self.blob_ids = blob_ids
+        self.offsets = offsets
+        self.block_size = block_size
+        self.fence_keys = keys[::block_size]
+        self.bloom = BloomFilter(keys, bits_per_key)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, key: str) -> Tuple[int, int]:
+        """返回(数据块号, 条目下标)；不在本段时条目下标为-1，数据块号为-1表示未访问数据块"""
+        block = bisect_right(self.fence_keys, key) - 1
+        if block < 0:
+            return -1, -1
+        lo = block * self.block_size
+        hi = min(lo + self.block_size, len(self.keys))
+        i = bisect_left(self.keys, key, lo, hi)
+        return block, (i if i < hi and self.keys[i] == key else -1)
+
+
+class KeyIndex:
+    """内存LSM Key索引：记录每个Key当前存活版本的(blob_id, offset)
+
+    写入先进入内存表，达到memtable_limit后冻结为有序段；有序段超过max_runs时全部合并
+    （较新的版本覆盖较旧版本，合并时丢弃删除标记）。查询按内存表→新段→旧段顺序，
+    先查Bloom过滤器再经fence pointer定位数据块。
+    """
+
+    def __init__(self, memtable_limit: int = 4096, max_runs: int = 4, block_size: int = 64, bits_per_key: int = 10):
+        self.memtable_limit = memtable_limit
+        self.max_runs = max_runs
+        self.block_size = block_size
+        self.bits_per_key = bits_per_key
+        self.memtable: Dict[str, Tuple[str, int]] = {}
+        self.runs: List[SortedRun] = []  # 新段在前
+        self._next_run_id = 0
+        # 顺序访问统计：每个段上一次访问的数据块，访问相同或相邻块记为顺序访问
+        self._last_block: Dict[int, int] = {}
+        self.stats = {"lookups": 0, "bloom_negatives": 0, "block_reads": 0, "sequential_block_reads": 0,
+                      "flushes": 0, "compactions": 0}
+
+    def __len__(self) -> int:
+        return len(self.memtable) + sum(len(run) for run in self.runs)
+
+    def put(self, key: str, blob_id: str, offset: int):
+        self.memtable[key] = (blob_id, offset)
+        if len(self.memtable) >= self.memtable_limit:
+            self.flush()
+
+    def delete(self, key: str):
+        self.put(key, "", TOMBSTONE)
+
+    def bulk_load(self, keys: Iterable[str], blob_ids: Iterable[str], offsets: Iterable[int]):
+        """批量导入（如启动时加载SSTable）：直接构建一个有序段，同一Key以最后一次为准"""
+        latest = dict(zip(keys, zip(blob_ids, offsets)))
+        self._add_run(sorted(latest.items()))
+
+    def remap(self, keys: List[str], blob_ids: List[str], offsets: List[int]):
+        """批量重定位（GC搬迁提交）：新位置写入内存表，达到memtable_limit时按常规冻结
+
+        不为每次提交单独生成有序段，避免频繁GC轮次反复触发全量合并。
+        """
+        self.memtable.update(zip(keys, zip(blob_ids, offsets)))
+        if len(self.memtable) >= self.memtable_limit:
+            self.flush()
+
+    def flush(self):
+        """冻结内存表为新的有序段"""
+        if not self.memtable:
+            return
+        entries, self.memtable = sorted(self.memtable.items()), {}
+        self._add_run(entries)
+        self.stats["flushes"] += 1
+
+    def _add_run(self, entries: List[Tuple[str, Tuple[str, int]]]):
+        keys = [key for key, _ in entries]
+        blob_ids = [blob_id for _, (blob_id, _) in entries]
+        offsets = [offset for _, (_, offset) in entries]
+        self.runs.insert(0, SortedRun(self._next_run_id, keys, blob_ids, offsets, self.block_size, self.bits_per_key))
+        self._next_run_id += 1
+        if len(self.runs) > self.max_runs:
+            self.compact()
+
+    def compact(self):
+        """多路归并全部有序段：同一Key保留最新段中的版本，删除标记在最底层丢弃"""
+        streams = [zip(run.keys, itertools.repeat(age), itertools.count()) for age, run in enumerate(self.runs)]
+        keys, blob_ids, offsets = [], [], []
+        last_key = None
+        for key, age, i in heapq.merge(*streams):
+            if key == last_key:
+                continue  # 同一Key按段新旧排序，首个即最新版本
+            last_key = key
+            run = self.runs[age]
+            if run.offsets[i] != TOMBSTONE:
+                keys.append(key)
+                blob_ids.append(run.blob_ids[i])
+                offsets.append(run.offsets[i])
+        self.runs = [SortedRun(self._next_run_id, keys, blob_ids, offsets, self.block_size, self.bits_per_key)]
+        self._next_run_id += 1
+        self._last_block.clear()
+        self.stats["compactions"] += 1
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """返回Key当前存活版本的(blob_id, offset)，不存在或已删除返回None"""
+        self.stats["lookups"] += 1
+        location = self.memtable.get(key)
+        if location is None:
+            for run in self.runs:
+                if not run.bloom.may_contain(key):
+                    self.stats["bloom_negatives"] += 1
+                    continue
+                block, i = run.find(key)
+                if block >= 0:
+                    self._record_block_read(run.run_id, block)
+                if i >= 0:
+                    location = (run.blob_ids[i], run.offsets[i])
+                    break
+        if location is None or location[1] == TOMBSTONE:
+            return None
+        return location
+
+    def _record_block_read(self, run_id: int, block: int):
+        last = self._last_block.get(run_id)
+        self.stats["block_reads"] += 1
+        if last is not None and 0 <= block - last <= 1:
+            self.stats["sequential_block_reads"] += 1
+        self._last_block[run_id] = block
+
+    def is_live(self, meta: Metadata) -> bool:
+        """元数据指向的(blob_id, offset)是否仍为该Key的存活版本"""
+        return self.get(meta.key) == (meta.blob_id, meta.offset)
+
+    @property
+    def sequential_ratio(self) -> float:
+        reads = self.stats["block_reads"]
+        return self.stats["sequential_block_reads"] / reads if reads else 0.0
+
+
+class ValidationBuffer:
+    """有界元数据验证缓冲队列（论文4.9节，默认1MB）：缓冲满后按Key排序批量验证
+
+    按Key排序后，对各有序段的数据块访问基本为顺序访问。
+    """
+
+    def __init__(self, key_index: KeyIndex, capacity: int = VALIDATION_BUFFER_SIZE):
+        self.key_index = key_index
+        self.capacity = capacity
+        self.pending: List[Metadata] = []
+        self.pending_bytes = 0
+        self.stats = {"validated": 0, "stale": 0, "batches": 0, "elapsed": 0.0}
+
+    @staticmethod
+    def entry_size(meta: Metadata) -> int:
+        return len(meta.key) + len(meta.blob_id) + META_ENTRY_OVERHEAD
+
+    def offer(self, meta: Metadata) -> List[Metadata]:
+        """入队一条元数据；缓冲将超出容量时先验证已缓冲的批次并返回，否则返回空列表"""
+        size = self.entry_size(meta)
+        drained = self.drain() if self.pending and self.pending_bytes + size > self.capacity else []
+        self.pending.append(meta)
+        self.pending_bytes += size
+        return drained
+
+    def drain(self) -> List[Metadata]:
+        """按Key排序验证当前缓冲的全部元数据：is_validated表示是否为存活版本，delay_range记录单条验证耗时（ms）"""
+        batch, self.pending, self.pending_bytes = sorted(self.pending, key=lambda x: x.key), [], 0
+        if not batch:
+            return batch
+        start = time.perf_counter()
+        for meta in batch:
+            meta.is_validated = self.key_index.is_live(meta)
+        elapsed = time.perf_counter() - start
+        per_entry_ms = elapsed / len(batch) * 1e3
+        stale = 0
+        for meta in batch:
+            meta.delay_range = per_entry_ms
+            stale += not meta.is_validated
+        self.stats["validated"] += len(batch)
+        self.stats["stale"] += stale
+        self.stats["batches"] += 1
+        self.stats["elapsed"] += elapsed
+        return batch
+
+
+def measure_validation(index_sizes=(10000, 100000, 1000000), batch_num: int = 4, stale_ratio: float = 0.1,
+                       seed: int = 0) -> List[dict]:
+    """验证实验：不同索引规模下，1MB缓冲批量验证的顺序访问占比与单条验证延迟"""
+    rng = random.Random(seed)
+    results = []
+    for size in index_sizes:
+        index = KeyIndex()
+        keys = [f"key-{i:012d}" for i in range(size)]
+        index.bulk_load(keys, (f"Blob-{i % 50}-{i // 4096}" for i in range(size)), (i * 84 for i in range(size)))
+        # 一部分Key被更新到新Blob，验证旧位置时应判为过期
+        for i in rng.sample(range(size), min(size // 10, 20000)):
+            index.put(keys[i], f"Blob-{i % 50}-new", i * 84)
+        index.flush()
+        index.stats.update(dict.fromkeys(index.stats, 0))
+        buffer = ValidationBuffer(index)
+        sample_num = 0
+        while buffer.stats["batches"] < batch_num:
+            i = rng.randrange(size)
+            blob_id = f"Blob-{i % 50}-{i // 4096}" if rng.random() >= stale_ratio else f"Blob-{i % 50}-old"
+            buffer.offer(Metadata(key=keys[i], blob_id=blob_id, offset=i * 84, is_validated=False,
+                                  meta_type=MetaType.GC))
+            sample_num += 1
+        result = {
+            "index_size": size,
+            "runs": len(index.runs),
+            "entries_validated": buffer.stats["validated"],
+            "stale": buffer.stats["stale"],
+            "sequential_ratio": index.sequential_ratio,
+            "bloom_negatives": index.stats["bloom_negatives"],
+            "latency_us": buffer.stats["elapsed"] / buffer.stats["validated"] * 1e6,
+        }
+        results.append(result)
+        print(f"[Key Index] size={size}: {result['entries_validated']} entries in {batch_num} 1MB batches, "
+              f"sequential {result['sequential_ratio'] * 100:.1f}%, {result['latency_us']:.2f}us/entry, "
+              f"stale {result['stale']}")
+    return results
+
+
+if __name__ == "__main__":
+    measure_validation()
\ No newline at end of file
@@ -0,0 +1,453 @@
+from common import BLOB_DEFAULT_SIZE, DEFAULT_SHARD_NUM, MetaType, BlobFile, Metadata
+from blob_store import BlobStore, BlobWriter, read_value
+from compaction import Compactor, CompactionResult
+from garbage_index import GarbageTracker
+from key_index import KeyIndex
+from mdp_validation import MDPValidationModel
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import itertools
+import os
+import threading
+import time
+import zlib
+
+# 前台KV读写（论文2.1节KV分离）：put按Key所属分片追加到该分片的活跃Blob，get经Key索引解析为Metadata再定位到
+# Blob偏移；MDP最优策略为“读时验证”时在读路径上内联核对元数据是否为存活版本（论文4.8/4.9节）。
+# Blob读取前为按字节数限制容量的分段LRU（SLRU）Value缓存；GC搬迁与前台读写共用引擎锁
+VALUE_CACHE_SIZE = 64 * 1024 * 1024  # Value缓存容量（字节）
+PROTECTED_FRACTION = 0.8  # SLRU受保护段占比，0时退化为普通LRU
+CACHE_ENTRY_OVERHEAD = 64  # 每个缓存条目的固定开销估计（Key、位置、链表节点）
+READ_TIME = "Read-Time"
+MAX_READ_RETRIES = 3  # 读时验证发现元数据过期后重新解析的次数上限
+READ_DELAY_ALPHA = 0.1  # 读延迟EWMA系数（作为MDP状态的延迟分量）
+
+
+class ValueCache:
+    """分段LRU Value缓存：新条目进入试用段，在试用段再次命中时晋升到受保护段，受保护段超出份额时
+    其最久未用条目降级回试用段；淘汰优先发生在试用段，一次性扫描不会冲掉热点。
+
+    条目为 Key → (blob_id, offset, value)，容量按字节计。protected_fraction=0时为普通LRU。
+    """
+
+    def __init__(self, capacity: int = VALUE_CACHE_SIZE, protected_fraction: float = PROTECTED_FRACTION):
+        self.capacity = capacity
+        self.protected_capacity = int(capacity * protected_fraction)
+        self.probation: "OrderedDict[str, Tuple[str, int, bytes]]" = OrderedDict()
+        self.protected: "OrderedDict[str, Tuple[str, int, bytes]]" = OrderedDict()
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "promotions": 0}
+
+    @staticmethod
+    def entry_size(key: str, entry: Tuple[str, int, bytes]) -> int:
+        return len(key) + len(entry[2]) + CACHE_ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return len(self.probation) + len(self.protected)
+
+    @property
+    def nbytes(self) -> int:
+        return self.probation_bytes + self.protected_bytes
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def get(self, key: str) -> Optional[Tuple[str, int, bytes]]:
+        entry = self.protected.get(key)
+        if entry is not None:
+            self.protected.move_to_end(key)
+        else:
+            entry = self.probation.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if self.protected_capacity:
+                self._promote(key, entry)
+            else:
+                self.probation.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def _promote(self, key: str, entry: Tuple[str, int, bytes]):
+        size = self.entry_size(key, entry)
+        del self.probation[key]
+        self.probation_bytes -= size
+        self.protected[key] = entry
+        self.protected_bytes += size
+        self.stats["promotions"] += 1
+        while self.protected_bytes > self.protected_capacity and len(self.protected) > 1:
+            old_key, old_entry = self.protected.popitem(last=False)
+            old_size = self.entry_size(old_key, old_entry)
+            self.protected_bytes -= old_size
+            self.probation[old_key] = old_entry
+            self.probation_bytes += old_size
+
+    def put(self, key: str, entry: Tuple[str, int, bytes]):
+        self.invalidate(key)
+        size = self.entry_size(key, entry)
+        if size > self.capacity:
+            return
+        self.probation[key] = entry
+        self.probation_bytes += size
+        while self.nbytes > self.capacity:
+            if self.probation:
+                old_key, old_entry = self.probation.popitem(last=False)
+                self.probation_bytes -= self.entry_size(old_key, old_entry)
+            else:
+                old_key, old_entry = self.protected.popitem(last=False)
+                self.protected_bytes -= self.entry_size(old_key, old_entry)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        entry = self.probation.pop(key, None)
+        if entry is not None:
+            self.probation_bytes -= self.entry_size(key, entry)
+        entry = self.protected.pop(key, None)
+        if entry is not None:
+            self.protected_bytes -= self.entry_size(key, entry)
+
+
+class KVEngine:
+    """前台KV引擎：Key按CRC32取模路由到分片（论文4.2节双射模型），每个分片一个活跃Blob，写满后封存
+
+    key_index记录每个Key存活版本的(blob_id, offset)；directory为每个Blob的(Key, 偏移)目录，供GC搬迁核对存活记录；
+    garbage_tracker维护每个Blob的存活/失效计数与垃圾比率分桶，覆盖写/删除经invalidate使旧版本所在Blob的垃圾比率上升，
+    GC按worst_blob选取受害Blob；活跃Blob与搬迁中的新Blob处于领取状态，封存或搬迁完成后才成为候选。mdp_model给出时按其最优策略
+    决定读路径是否内联验证，未给出时每次读都验证。GC搬迁不失效缓存（Value不变），缓存中的旧位置由读时验证发现并刷新。
+    """
+
+    def __init__(self, blob_store: BlobStore, key_index: Optional[KeyIndex] = None,
+                 mdp_model: Optional[MDPValidationModel] = None, shard_num: int = DEFAULT_SHARD_NUM,
+                 blob_capacity: int = BLOB_DEFAULT_SIZE, cache: Optional[ValueCache] = None,
+                 garbage_tracker: Optional[GarbageTracker] = None):
+        self.blob_store = blob_store
+        self.key_index = key_index if key_index is not None else KeyIndex()
+        self.mdp_model = mdp_model
+        self.shard_num = shard_num
+        self.blob_capacity = blob_capacity
+        self.cache = cache if cache is not None else ValueCache()
+        self.lock = threading.RLock()
+        self.blobs: Dict[str, BlobFile] = {}  # 全部Blob（含活跃Blob与GC搬迁产生的新Blob）
+        self.active: Dict[int, BlobFile] = {}  # 分片 → 活跃Blob
+        self.writers: Dict[str, BlobWriter] = {}  # 活跃Blob ID → 写入器
+        self.directory: Dict[str, List[Tuple[str, int]]] = {}
+        self.garbage_tracker = garbage_tracker if garbage_tracker is not None else GarbageTracker()
+        self._gc_blob_ids = set()  # GC搬迁产生的Blob（其记录的元数据类型为GC）
+        self._readers: Dict[str, int] = {}  # Blob ID → 只读文件描述符
+        # 锁外pread的读描述符引用计数；GC删除仍在被读取的Blob时，其描述符延迟到最后一个读取结束再关闭
+        self._reader_refs: Dict[str, int] = {}
+        self._retired_readers: Dict[str, int] = {}
+        self._generation = 0  # 写入/删除计数：锁外读取期间Key可能被覆盖写，版本变化时不缓存读到的旧Value
+        self._blob_seq = itertools.count()
+        self._read_delay_ms = 0.0
+        self.stats = {"puts": 0, "gets": 0, "deletes": 0, "not_found": 0, "validations": 0, "stale_reads": 0,
+                      "gc_blobs": 0}
+
+    def shard_of(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shard_num
+
+    def _roll(self, shard_id: int) -> BlobWriter:
+        """封存分片当前的活跃Blob（回写文件头，成为GC候选），新建下一个活跃Blob（登记后即领取，不参与GC选取）"""
+        blob = self.active.get(shard_id)
+        if blob is not None:
+            self.writers.pop(blob.blob_id).close()
+            self.garbage_tracker.release(blob.blob_id)
+        blob_id = f"Blob-{shard_id}-kv{next(self._blob_seq)}"
+        writer = self.writers[blob_id] = self.blob_store.create_blob(shard_id, blob_id, self.blob_capacity)
+        self.active[shard_id] = self.blobs[blob_id] = BlobFile(blob_id=blob_id, shard_id=shard_id,
+                                                               size=self.blob_capacity, path=writer.path)
+        self.directory[blob_id] = []
+        self.garbage_tracker.register_blob(self.active[shard_id], live_count=0)
+        self.garbage_tracker.claim(blob_id)
+        return writer
+
+    def _supersede(self, key: str) -> bool:
+        """Key的旧版本成为垃圾：其所在Blob的存活数减一（垃圾比率随之更新分桶），返回旧版本是否存在"""
+        location = self.key_index.get(key)
+        if location is None:
+            return False
+        if location[0] in self.garbage_tracker.blobs:
+            self.garbage_tracker.invalidate(location[0])
+        return True
+
+    def put(self, key: str, value: bytes) -> Metadata:
+        """追加写入分片活跃Blob并更新Key索引，返回新版本的元数据"""
+        shard_id = self.shard_of(key)
+        with self.lock:
+            blob = self.active.get(shard_id)
+            writer = self.writers[blob.blob_id] if blob is not None else None
+            if writer is None or not writer.can_append(len(value)):
+                writer = self._roll(shard_id)
+                blob = self.active[shard_id]
+            offset = writer.append(value)
+            self._supersede(key)
+            self.garbage_tracker.add_live(blob.blob_id)
+            self.key_index.put(key, blob.blob_id, offset)
+            self.directory[blob.blob_id].append((key, offset))
+            self.cache.invalidate(key)
+            self._generation += 1
+            self.stats["puts"] += 1
+        return Metadata(key=key, blob_id=blob.blob_id, offset=offset, is_validated=True)
+
+    def delete(self, key: str) -> bool:
+        """删除Key：仅在Key索引中写入墓碑（Blob中不追加记录），旧版本计为垃圾，返回Key删除前是否存在"""
+        with self.lock:
+            existed = self._supersede(key)
+            if existed:
+                self.key_index.delete(key)
+            self.cache.invalidate(key)
+            self._generation += 1
+            self.stats["deletes"] += 1
+        return existed
+
+    def resolve(self, key: str) -> Optional[Metadata]:
+        """Key → 当前存活版本的元数据（不读Value）"""
+        with self.lock:
+            location = self.key_index.get(key)
+        return self._metadata(key, *location) if location is not None else None
+
+    def _metadata(self, key: str, blob_id: str, offset: int) -> Metadata:
+        meta_type = MetaType.GC if blob_id in self._gc_blob_ids else MetaType.NORMAL
+        return Metadata(key=key, blob_id=blob_id, offset=offset, is_validated=False, meta_type=meta_type,
+                        delay_range=self._read_delay_ms)
+
+    def _pin_reader(self, blob_id: str) -> int:
+        """（持锁）返回Blob的只读描述符并增加引用，锁外读取结束后调用_unpin_reader"""
+        writer = self.writers.get(blob_id)
+        if writer is not None:
+            writer.flush()  # 活跃Blob：刷出用户态缓冲后再经只读描述符读取
+        fd = self._readers.get(blob_id)
+        if fd is None:
+            fd = self._readers[blob_id] = os.open(self.blobs[blob_id].path, os.O_RDONLY)
+        self._reader_refs[blob_id] = self._reader_refs.get(blob_id, 0) + 1
+        return fd
+
+    def _unpin_reader(self, blob_id: str):
+        """（持锁）释放读描述符引用，Blob已被GC删除且无其他读取时关闭描述符"""
+        refs = self._reader_refs.pop(blob_id) - 1
+        if refs:
+            self._reader_refs[blob_id] = refs
+            return
+        fd = self._retired_readers.pop(blob_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取Key的存活Value：先查Value缓存，未命中时经Key索引解析为元数据再pread读取Blob；
+        策略为读时验证时核对元数据仍为存活版本，过期（如已被GC搬迁）则失效缓存并重新解析
+
+        引擎锁只保护缓存与索引的查找、更新，Blob读取与MDP策略查询在锁外进行；
+        连续MAX_READ_RETRIES次读到过期版本时，改为持锁解析并读取（期间无写入与GC重定位），不返回已被覆盖的旧Value。
+        """
+        start = time.perf_counter()
+        value = None
+        for _ in range(MAX_READ_RETRIES):
+            with self.lock:
+                entry = self.cache.get(key)
+                if entry is None:
+                    location = self.key_index.get(key)
+                    if location is None:
+                        self.stats["gets"] += 1
+                        self.stats["not_found"] += 1
+                        return None
+                    fd = self._pin_reader(location[0])
+                    generation = self._generation
+            if entry is None:
+                try:
+                    entry = (*location, read_value(fd, location[1]))
+                finally:
+                    with self.lock:
+                        self._unpin_reader(location[0])
+                        if entry is not None and self._generation == generation:
+                            self.cache.put(key, entry)
+            blob_id, offset, value = entry
+            meta = self._metadata(key, blob_id, offset)
+            action = self.mdp_model.get_optimal_action(meta) if self.mdp_model is not None else READ_TIME
+            if action != READ_TIME:
+                break
+            with self.lock:
+                self.stats["validations"] += 1
+                meta.is_validated = self.key_index.is_live(meta)
+                if meta.is_validated:
+                    break
+                self.stats["stale_reads"] += 1
+                self.cache.invalidate(key)
+        else:
+            value = self._read_locked(key)
+        with self.lock:
+            self.stats["gets"] += 1
+            self._read_delay_ms += READ_DELAY_ALPHA * ((time.perf_counter() - start) * 1e3 - self._read_delay_ms)
+        return value
+
+    def _read_locked(self, key: str) -> Optional[bytes]:
+        """持引擎锁解析并读取Key的存活版本：读取期间索引不变，结果必为最新值"""
+        with self.lock:
+            location = self.key_index.get(key)
+            if location is None:
+                self.stats["not_found"] += 1
+                return None
+            fd = self._pin_reader(location[0])
+            try:
+                value = read_value(fd, location[1])
+            finally:
+                self._unpin_reader(location[0])
+            self.cache.put(key, (*location, value))
+            return value
+
+    def compactor(self, **kwargs) -> Compactor:
+        """与前台读写共用引擎锁的搬迁器，重定位时登记新Blob的目录与垃圾统计"""
+        return Compactor(self.blob_store, self.key_index, lambda blob: self.directory[blob.blob_id],
+                         lock=self.lock, on_remap=self._on_remap, **kwargs)
+
+    def _register_gc_blob(self, new_blob: BlobFile, live_count: int):
+        """登记GC搬迁产生的新Blob（搬迁完成前保持领取状态）"""
+        self.blobs[new_blob.blob_id] = new_blob
+        self.directory[new_blob.blob_id] = []
+        self._gc_blob_ids.add(new_blob.blob_id)
+        self.garbage_tracker.register_blob(new_blob, live_count=live_count)
+        self.garbage_tracker.claim(new_blob.blob_id)
+
+    def _on_remap(self, victim: BlobFile, new_blob: BlobFile, keys: List[str], offsets: List[int]):
+        """（持锁）一批Key已重定位到GC搬迁产生的新Blob：首批时登记新Blob（记录均按存活计），追加目录"""
+        if new_blob.blob_id not in self.blobs:
+            self._register_gc_blob(new_blob, live_count=new_blob.value_count)
+        self.directory[new_blob.blob_id].extend(zip(keys, offsets))
+
+    def collect_garbage(self, min_garbage_ratio: float = 0.5, max_blobs: Optional[int] = None,
+                        compactor: Optional[Compactor] = None) -> List[CompactionResult]:
+        """一轮GC：按垃圾比率从高到低领取已封存的Blob（worst_blob），逐个搬迁存活记录，重定位后即删除并关闭其读描述符"""
+        compactor = compactor or self.compactor()
+        tracker = self.garbage_tracker
+        results = []
+        while max_blobs is None or len(results) < max_blobs:
+            with self.lock:
+                blob = tracker.worst_blob()
+                if blob is None or blob.garbage_ratio < min_garbage_ratio:
+                    break
+                tracker.claim(blob.blob_id)
+            try:
+                result = compactor.compact(blob)
+            except BaseException:
+                with self.lock:
+                    tracker.release(blob.blob_id)
+                raise
+            with self.lock:
+                new_blob = result.new_blob
+                if new_blob is not None:
+                    if new_blob.blob_id not in self.blobs:
+                        self._register_gc_blob(new_blob, live_count=0)  # 存活记录在搬迁期间全部被覆盖：新Blob仅含垃圾
+                    else:
+                        # 搬迁后、重定位前被覆盖写的记录未重定位，在新Blob中为垃圾
+                        tracker.invalidate(new_blob.blob_id, new_blob.value_count - result.remapped)
+                    tracker.release(new_blob.blob_id)
+                self._drop_blob(result.victim_id)
+                self.stats["gc_blobs"] += 1
+            results.append(result)
+        return results
+
+    def _drop_blob(self, blob_id: str):
+        self.blobs.pop(blob_id, None)
+        self.directory.pop(blob_id, None)
+        if blob_id in self.garbage_tracker.blobs:
+            self.garbage_tracker.unregister_blob(blob_id)
+        self._gc_blob_ids.discard(blob_id)
+        fd = self._readers.pop(blob_id, None)
+        if fd is not None:
+            if blob_id in self._reader_refs:
+                self._retired_readers[blob_id] = fd
+            else:
+                os.close(fd)
+
+    def close(self):
+        """封存全部活跃Blob并关闭读描述符"""
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers.clear()
+            self.active.clear()
+            for fd in itertools.chain(self._readers.values(), self._retired_readers.values()):
+                os.close(fd)
+            self._readers.clear()
+            self._retired_readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def measure_foreground_latency(record_count: int = 50000, operation_count: int = 100000, value_size: int = 1024,
+                               shard_num: int = 8, blob_capacity: int = 1024 * 1024, cache_fraction: float = 0.1,
+                               min_garbage_ratio: float = 0.3, seed: int = 0) -> List[dict]:
+    """前台延迟实验：YCSB-A（50%读/50%更新，Zipfian）在无GC与后台GC并发两种情况下的get/put p50/p99，
+    对比LRU与SLRU缓存（容量为数据集的cache_fraction）的命中率，并逐条校验读到的Value属于该Key"""
+    import tempfile
+    from metrics import MetricsRegistry
+    from workload import YCSBWorkload, ValueSizeMix, READ, format_key
+    mdp_model = MDPValidationModel()
+    mdp_model.load_or_solve()
+    cache_bytes = int(record_count * (value_size + CACHE_ENTRY_OVERHEAD) * cache_fraction)
+    results = []
+    for cache_name, protected_fraction in (("lru", 0.0), ("slru", PROTECTED_FRACTION)):
+        for gc_enabled in (False, True):
+            with tempfile.TemporaryDirectory(prefix="gcsmartkv-kv-") as root:
+                engine = KVEngine(BlobStore(root), mdp_model=mdp_model, shard_num=shard_num, blob_capacity=blob_capacity,
+                                  cache=ValueCache(cache_bytes, protected_fraction))
+                workload = YCSBWorkload("A", record_count=record_count, operation_count=operation_count,
+                                        value_sizes=ValueSizeMix.fixed(value_size), seed=seed)
+                for op in workload.load_phase():
+                    engine.put(op.key, op.key.encode("utf-8").ljust(op.value_size, b"v"))
+                stop = threading.Event()
+                gc_rounds = []
+
+                def gc_loop():
+                    while not stop.is_set():
+                        gc_rounds.append(len(engine.collect_garbage(min_garbage_ratio)))
+                        stop.wait(0.01)
+
+                gc_thread = threading.Thread(target=gc_loop, daemon=True) if gc_enabled else None
+                registry = MetricsRegistry(enabled=True)
+                get_hist, put_hist = registry.histogram("kv_op_seconds", op="get"), registry.histogram("kv_op_seconds", op="put")
+                hits_before, misses_before = engine.cache.stats["hits"], engine.cache.stats["misses"]
+                if gc_thread is not None:
+                    gc_thread.start()
+                start = time.perf_counter()
+                for ops, key_ids, _ in workload.iter_chunks():
+                    for op, key_id in zip(ops.tolist(), key_ids.tolist()):
+                        key = format_key(key_id)
+                        op_start = time.perf_counter()
+                        if op == READ:
+                            value = engine.get(key)
+                            get_hist.record(time.perf_counter() - op_start)
+                            assert value is not None and value.startswith(key.encode("utf-8")), key
+                        else:
+                            engine.put(key, key.encode("utf-8").ljust(value_size, b"u"))
+                            put_hist.record(time.perf_counter() - op_start)
+                elapsed = time.perf_counter() - start
+                stop.set()
+                if gc_thread is not None:
+                    gc_thread.join()
+                hits = engine.cache.stats["hits"] - hits_before
+                lookups = hits + engine.cache.stats["misses"] - misses_before
+                result = {"cache": cache_name, "gc": gc_enabled, "ops_per_s": operation_count / elapsed,
+                          "get_p50_us": get_hist.percentile(0.50) * 1e6, "get_p99_us": get_hist.percentile(0.99) * 1e6,
+                          "put_p50_us": put_hist.percentile(0.50) * 1e6, "put_p99_us": put_hist.percentile(0.99) * 1e6,
+                          "hit_ratio": hits / lookups if lookups else 0.0, "gc_blobs": engine.stats["gc_blobs"],
+                          "gc_rounds": len(gc_rounds), "validations": engine.stats["validations"],
+                          "stale_reads": engine.stats["stale_reads"]}
+                engine.close()
+            results.append(result)
+            print(f"[KV Engine] {cache_name.upper()} cache, GC {'on ' if gc_enabled else 'off'}: "
+                  f"{result['ops_per_s']:.0f} ops/s, get p50/p99 {result['get_p50_us']:.1f}/{result['get_p99_us']:.1f}us, "
+                  f"put p50/p99 {result['put_p50_us']:.1f}/{result['put_p99_us']:.1f}us, hit ratio "
+                  f"{result['hit_ratio'] * 100:.1f}%, {result['gc_blobs']} Blobs collected, "
+                  f"{result['stale_reads']}/{result['validations']} read-time validations stale")
+    return results
+
+
+if __name__ == "__main__":
+    measure_foreground_latency()
\ No newline at end of file
@@ -1,116 +1,157 @@
 from shard_gc_scheduler import ShardGCScheduler
 from mors_scheduler import MORSScheduler
 from mdp_validation import MDPValidationModel
+from key_index import KeyIndex
+import metrics
 from fpga_pipeline import FPGADynamicPipeline
-from common import *
+from blob_store import BlobStore, BlobWriter
+from gc_executor import GCExecutor
+from workload import YCSBWorkload, ValueSizeMix, READ, format_key
+from common import MetaType, TaskStatus, BlobFile, GCTask, Metadata
+from typing import Dict, List, Tuple
+import os
 import random
+import tempfile
 
+# 论文5.7节：Twitter cluster39 小Value为80B
+VALUE_SIZE = 80
 
-def generate_ycsb_write_load(shard_num: int, blob_num_per_shard: int) -> List[BlobFile]:
-    """生成YCSB写密集负载（94%写，对应论文5.7节Twitter cluster39）"""
-    blobs = []
-    for shard_id in range(shard_num):
-        for _ in range(blob_num_per_shard):
-            blob_id = f"Blob-{shard_id}-{int(time.time() * 1000)}-{random.randint(0, 1000)}"
-            # 模拟写密集场景下的垃圾比率（30%-80%）
-            garbage_ratio = random.uniform(0.3, 0.8)
-            value_count = random.randint(1000, 5000)  # 每个Blob含1000-5000个Value
-            valid_count = int(value_count * (1 - garbage_ratio))
-            
-            blob = BlobFile(
-                blob_id=blob_id,
-                shard_id=shard_id,
-                value_count=value_count,
-                garbage_ratio=garbage_ratio
-            )
-            blobs.append(blob)
-    print(f"[Load Generation] Generated {len(blobs)} Blobs (YCSB Write-Intensive Load)")
+
+def generate_ycsb_write_load(shard_num: int, blob_num_per_shard: int, blob_store: BlobStore, seed: int = 0,
+                             record_count: int = 20000000) -> List[BlobFile]:
+    """生成YCSB写密集负载（94%写，对应论文5.7节Twitter cluster39）：流式重放操作，Value真实写入磁盘Blob
+
+    写操作按Key路由到分片的当前Blob，写满目标条数（1000-5000）后封存；覆盖写使旧版本所在Blob多一条垃圾，
+    垃圾比率由实际覆盖写统计得出。同一种子生成完全相同的Blob。
+    """
+    rng = random.Random(seed)
+    workload = YCSBWorkload("W", record_count=record_count, operation_count=1 << 62,
+                            value_sizes=ValueSizeMix.fixed(VALUE_SIZE), seed=seed)
+    writers: Dict[int, BlobWriter] = {}
+    targets: Dict[int, int] = {}  # 分片当前Blob的目标Value数
+    sealed = [0] * shard_num  # 分片已封存的Blob数
+    blob_meta: List[Tuple[int, str, str, int]] = []  # (分片, Blob ID, 路径, Value数)
+    live: List[int] = []  # 每个Blob的存活Value数
+    location: Dict[int, int] = {}  # key_id → 最新版本所在Blob下标
+    current: Dict[int, int] = {}  # 分片 → 当前Blob下标
+    remaining = shard_num
+    for op, keys, _ in workload.iter_chunks():
+        for o, key_id in zip(op.tolist(), keys.tolist()):
+            if o == READ:
+                continue
+            shard_id = key_id % shard_num
+            if sealed[shard_id] == blob_num_per_shard:
+                continue
+            writer = writers.get(shard_id)
+            if writer is None:
+                blob_id = f"Blob-{shard_id}-{sealed[shard_id]}"
+                writer = writers[shard_id] = blob_store.create_blob(shard_id, blob_id)
+                targets[shard_id] = rng.randint(1000, 5000)  # 每个Blob含1000-5000个Value
+                current[shard_id] = len(blob_meta)
+                blob_meta.append((shard_id, blob_id, writer.path, 0))
+                live.append(0)
+            writer.append(format_key(key_id).encode("utf-8").ljust(VALUE_SIZE, b"v")[:VALUE_SIZE])
+            previous = location.get(key_id)
+            if previous is not None:
+                live[previous] -= 1  # 覆盖写：旧版本成为垃圾
+            location[key_id] = current[shard_id]
+            live[current[shard_id]] += 1
+            if writer.value_count == targets[shard_id]:
+                writer.close()
+                blob_meta[current[shard_id]] = blob_meta[current[shard_id]][:3] + (writer.value_count,)
+                del writers[shard_id]
+                sealed[shard_id] += 1
+                remaining -= sealed[shard_id] == blob_num_per_shard
+        if not remaining:
+            break
+    blobs = [BlobFile(blob_id=blob_id, shard_id=shard_id, value_count=value_count,
+                      garbage_ratio=1.0 - live[i] / value_count, path=path)
+             for i, (shard_id, blob_id, path, value_count) in enumerate(blob_meta)]
+    print(f"[Load Generation] Generated {len(blobs)} Blobs (YCSB Write-Intensive Load, seed={seed}), "
+          f"mean garbage ratio {sum(b.garbage_ratio for b in blobs) / len(blobs):.2f}")
     return blobs
 
 
 def main():
+    # 0. 开启指标与任务追踪（热路径不再逐条打印）
+    metrics.enable()
+
     # 1. 初始化系统组件
     node_ids = ["Node-1", "Node-2", "Node-3", "Node-4", "Node-5"]  # 5节点集群（论文5.1节）
-    shard_gc_scheduler = ShardGCScheduler(node_ids, shard_num=50)
+    blob_dir = tempfile.TemporaryDirectory(prefix="gcsmartkv-")
+    shard_gc_scheduler = ShardGCScheduler(node_ids, shard_num=50, raft_log_path=os.path.join(blob_dir.name, "raft.log"),
+                                          snapshot_journal_path=os.path.join(blob_dir.name, "snapshot.journal"))
     mors_scheduler = MORSScheduler(node_ids)
-    mdp_model = MDPValidationModel()
+    key_index = KeyIndex()  # Key → 存活版本(blob_id, offset)，GC重写后更新
+    mdp_model = MDPValidationModel(key_index=key_index)
     fpga_pipeline = FPGADynamicPipeline()
+    blob_store = BlobStore(blob_dir.name)
 
-    # 2. MDP模型训练（价值迭代求解最优策略）
-    mdp_model.value_iteration()
+    # 2. MDP模型训练（价值迭代求解最优策略，命中策略缓存时直接mmap加载）
+    mdp_model.load_or_solve()
 
     # 3. 生成实验负载（YCSB写密集负载，论文5.7节）
-    blobs = generate_ycsb_write_load(shard_num=50, blob_num_per_shard=10)  # 500个Blob
-
-    # 4. 创建并调度GC任务
-    for blob in blobs:
-        # 4.1 创建GC任务（双射模型绑定分片）
-        try:
-            gc_task = shard_gc_scheduler.create_gc_task(blob)
-        except ValueError:
-            continue  # 分片已存在活跃任务，跳过
-        
-        # 4.2 MORS任务排序与资源筛选
-        sorted_tasks = mors_scheduler.sort_tasks_by_profit([gc_task])
-        target_node = mors_scheduler.select_best_node(sorted_tasks[0])
-        if not target_node:
-            print(f"[Task Scheduling] No available node for task {gc_task.task_id}, skip")
-            continue
-        print(f"[Task Scheduling] Assign task {gc_task.task_id} (shard {gc_task.shard_id}) to node {target_node}")
+    blobs = generate_ycsb_write_load(shard_num=50, blob_num_per_shard=10, blob_store=blob_store)  # 500个Blob
 
-        # 4.3 模拟任务执行（FPGA处理+断点续跑）
-        gc_task.status = GCTask.status.RUNNING
-        # 模拟处理Blob：按1MB快照粒度（论文4.3节）
-        total_size = blob.size
-        processed_offset = 0
-        while processed_offset < total_size:
-            # 处理1MB数据
-            chunk_size = min(SNAPSHOT_GRANULARITY, total_size - processed_offset)
-            # 模拟生成Value数据（80B小Value，论文5.7节）
-            value = struct.pack(">I", 80) + b"test_value_" * 10  # 4B长度+80B数据
-            encoded_value, _ = fpga_pipeline.process_value(value, blob.blob_id)
-            
-            # 模拟随机中断（10%概率）
-            if random.random() < 0.1:
-                # 计算已处理数据校验和
-                checksum = hashlib.md5(encoded_value).hexdigest()
-                # 中断任务并保存快照
-                shard_gc_scheduler.interrupt_task(gc_task, processed_offset, checksum, metadata_updated=False)
-                print(f"[Task Interrupt] Task {gc_task.task_id} interrupted at offset {processed_offset}")
-                # 恢复任务
-                processed_offset = shard_gc_scheduler.resume_task(gc_task)
-                print(f"[Task Resume] Task {gc_task.task_id} resumed from offset {processed_offset}")
-            
-            processed_offset += chunk_size
-
-        # 4.4 元数据一致性验证（MDP最优策略）
+    # 4. 创建并调度GC任务：各分片任务并发执行，受节点配额约束（双射模型+MORS，论文4.2/4.6节）
+    def validate_and_sync(gc_task: GCTask, processed_offset: int):
+        """任务完成回调：元数据一致性验证（MDP最优策略）+增量Raft同步"""
+        blob = gc_task.target_blob
         meta = Metadata(
             key=f"key-{blob.blob_id}",
             blob_id=blob.blob_id,
             offset=processed_offset,
             is_validated=False,
-            meta_type=Metadata.meta_type.GC,
+            meta_type=MetaType.GC,
             delay_range=random.uniform(50, 100)  # 延迟50-100ms
         )
+        # GC重写后Value的新位置写入Key索引
+        key_index.put(meta.key, meta.blob_id, meta.offset)
         # 获取MDP最优验证策略
         optimal_action = mdp_model.get_optimal_action(meta)
         print(f"[MDP Validation] Optimal action for meta {meta.key}: {optimal_action}")
         # 批量验证元数据（论文4.9节优化）
         validated_metas = mdp_model.batch_validate_metadata([meta])
+        metrics.registry.trace(gc_task.task_id, "validate", action=optimal_action,
+                               live=all(vm.is_validated for vm in validated_metas))
         # 增量Raft同步元数据
         for vm in validated_metas:
             shard_gc_scheduler.add_raft_sync_metadata(vm)
-
-        # 4.5 任务完成
-        gc_task.status = GCTask.status.COMPLETED
         print(f"[Task Complete] Task {gc_task.task_id} completed, Blob {blob.blob_id} GC finished\n")
 
+    # 模拟随机中断（每个1MB窗口10%概率），断点落在窗口（记录）边界；完成后分块并行重算校验和，核对续跑结果
+    gc_executor = GCExecutor(shard_gc_scheduler, mors_scheduler, blob_store, fpga_pipeline,
+                             max_workers=8, interrupt_prob=0.1, verify=True)
+    # 启动恢复：从快照日志重建上次运行中断的任务断点（论文4.3节）
+    recovered_tasks = shard_gc_scheduler.recover_tasks({blob.blob_id: blob for blob in blobs})
+    report = gc_executor.run(blobs, on_complete=validate_and_sync, recovered_tasks=recovered_tasks)
+
     # 5. 输出实验统计
-    total_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks])
-    completed_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks if t.status == GCTask.status.COMPLETED])
-    interrupted_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks if t.status == GCTask.status.INTERRUPTED])
+    total_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks.values()])
+    completed_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks.values() if t.status == TaskStatus.COMPLETED])
+    interrupted_tasks = len([t for tasks in shard_gc_scheduler.node_tasks.values() for t in tasks.values() if t.status == TaskStatus.INTERRUPTED])
     print(f"[Experiment Summary] Total Tasks: {total_tasks}, Completed: {completed_tasks}, Interrupted: {interrupted_tasks}")
     print(f"[Experiment Summary] Interrupt Rate: {interrupted_tasks/total_tasks*100:.2f}% (target ≤2.3%, 论文4.3节)")
+    print(f"[Experiment Summary] GC Throughput: {report['blobs_per_s']:.1f} blobs/s, "
+          f"reclaimed {report['reclaimed_mb_per_s']:.1f} MB/s ({report['workers']} workers)")
+    print(f"[Experiment Summary] Checksum Verify: {report['blobs'] - report['verify_failures']}/{report['blobs']} "
+          f"Blobs match their resumed running checksum")
+    shard_gc_scheduler.close()  # 关闭时刷出不足批量阈值的Raft增量
+    raft_report = shard_gc_scheduler.raft_pipeline.report()
+    print(f"[Experiment Summary] Raft Sync: {raft_report['entries']} entries in {raft_report['batches']} batches, "
+          f"{raft_report['raw_bytes']}B→{raft_report['compressed_bytes']}B, p99 commit {raft_report['p99_ms']:.2f}ms")
+    fpga_batch = metrics.registry.histogram("fpga_stage_seconds", stage="data_compute", mode="batch")
+    raft_flush = metrics.registry.histogram("raft_flush_seconds")
+    print(f"[Experiment Summary] Metrics: data_compute p99 {fpga_batch.percentile(0.99) * 1e3:.2f}ms/window, "
+          f"Raft flush p99 {raft_flush.percentile(0.99) * 1e3:.2f}ms")
+    # 设置GCSMARTKV_METRICS_DIR时导出JSON与Prometheus文本快照
+    metrics_dir = os.environ.get("GCSMARTKV_METRICS_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        metrics.registry.export(os.path.join(metrics_dir, "metrics.json"))
+        metrics.registry.export(os.path.join(metrics_dir, "metrics.prom"))
+        print(f"[Experiment Summary] Metrics exported to {metrics_dir}")
+    blob_dir.cleanup()
 
 
 if __name__ == "__main__":
@@ -1,21 +1,42 @@
-from common import *
+from common import MetaType, Metadata
+from key_index import KeyIndex, ValidationBuffer
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import numpy as np
+import os
+import time
+
+# 策略缓存：已求解的价值函数与策略按(转移概率, 奖励, 折扣因子, 求解参数)的哈希持久化为.npy，
+# 后续运行与fork出的工作进程以mmap只读加载，无需重新求解（各进程共享同一份页缓存）
+MDP_CACHE_ENV = "GCSMARTKV_CACHE_DIR"  # 环境变量指定缓存目录，默认~/.cache/gcsmartkv
+_SOLUTION_DTYPE = np.dtype([("value", "<f8"), ("policy", "<i8")])
+
+
+def default_cache_dir() -> str:
+    return os.environ.get(MDP_CACHE_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "gcsmartkv")
 
 
 class MDPValidationModel:
-    def __init__(self):
+    def __init__(self, delay_edges: Tuple[float, ...] = (50, 100), partition_num: int = 1, discount_factor: float = 0.9,
+                 key_index: Optional[KeyIndex] = None):
         # MDP四要素（论文4.8节）
-        # 1. 状态空间：(meta_type: 0=NORMAL/1=GC, is_validated:0/1, delay_range:0=0-50ms/1=50-100ms/2=100-150ms)
-        self.states = [(mt.value, iv, dr) for mt in Metadata.meta_type for iv in [0, 1] for dr in [0, 1, 2]]
-        self.state_idx = {s: i for i, s in enumerate(self.states)}
-        self.state_num = len(self.states)
+        # 1. 状态空间：(meta_type: NORMAL/GC, is_validated:0/1, delay_range:0=0-50ms/1=50-100ms/2=100-150ms[, partition])
+        #    delay_edges为延迟分桶边界（默认3个桶），partition_num>1时按分片/Key区间细分状态
+        self.meta_types = list(MetaType)
+        self.delay_edges = np.asarray(delay_edges, dtype=float)
+        self.delay_bucket_num = len(delay_edges) + 1
+        self.partition_num = partition_num
+        self.state_num = len(self.meta_types) * 2 * self.delay_bucket_num * partition_num
+        self._states: Optional[List[tuple]] = None
+        self._state_idx: Optional[Dict[tuple, int]] = None
         
         # 2. 动作空间：0=写前验证，1=读时验证，2=合并时验证（论文4.8节）
         self.actions = [0, 1, 2]
         self.action_names = ["Write-Before", "Read-Time", "Merge-Time"]
         
-        # 3. 转移概率P(s'|s,a)：基于1e6次实验统计（论文4.8节，模拟值）
-        self.transition_prob = self._init_transition_prob()
+        # 3. 转移概率P(s'|s,a)：稀疏表示，每个(s,a)最多K个后继状态（论文4.8节，模拟值）
+        #    next_states[s, a, k]为第k个后继状态，next_probs[s, a, k]为其概率（填充项概率为0）
+        self.next_states, self.next_probs = self._init_transition_prob()
         
         # 4. 奖励函数R(s,a)：延迟权重0.6，破坏概率权重0.4（论文4.8节）
         self.rewards = self._init_rewards()
@@ -23,86 +44,361 @@ class MDPValidationModel:
         # 价值函数与策略
         self.value = np.zeros(self.state_num)
         self.policy = np.zeros(self.state_num, dtype=int)
-        self.discount_factor = 0.9  # 折扣因子
+        self.discount_factor = discount_factor  # 折扣因子
+        self.convergence: dict = {}  # 最近一次求解的收敛信息
+        self._policy_cache: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # 元数据验证引擎：LSM Key索引 + 1MB缓冲队列（论文4.9节）
+        self.key_index = key_index if key_index is not None else KeyIndex()
+        self.validation_buffer = ValidationBuffer(self.key_index)
+        # 元数据类型枚举值 → 状态下标中的类型下标（批量查询用查表代替逐个index）
+        self._meta_type_lookup = np.full(max(mt.value for mt in self.meta_types) + 1, -1, dtype=np.intp)
+        for i, mt in enumerate(self.meta_types):
+            self._meta_type_lookup[mt.value] = i
+
+    def state_index(self, mt_idx, iv, dr, partition=0):
+        """状态元组 → 状态下标（支持NumPy数组批量计算）"""
+        return ((mt_idx * 2 + iv) * self.delay_bucket_num + dr) * self.partition_num + partition
+
+    def _state_components(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """全部状态下标 → (meta_type下标, is_validated, delay_range, partition)"""
+        idx = np.arange(self.state_num)
+        partition = idx % self.partition_num
+        idx //= self.partition_num
+        dr = idx % self.delay_bucket_num
+        idx //= self.delay_bucket_num
+        return idx // 2, idx % 2, dr, partition
+
+    @property
+    def states(self) -> List[tuple]:
+        """状态元组列表（按需构建，大状态空间下避免常驻）"""
+        if self._states is None:
+            mt_idx, iv, dr, partition = self._state_components()
+            mt_values = [mt.value for mt in self.meta_types]
+            if self.partition_num == 1:
+                self._states = [(mt_values[m], i, d) for m, i, d in zip(mt_idx.tolist(), iv.tolist(), dr.tolist())]
+            else:
+                self._states = [(mt_values[m], i, d, p) for m, i, d, p in
+                                zip(mt_idx.tolist(), iv.tolist(), dr.tolist(), partition.tolist())]
+        return self._states
+
+    @property
+    def state_idx(self) -> Dict[tuple, int]:
+        if self._state_idx is None:
+            self._state_idx = {s: i for i, s in enumerate(self.states)}
+        return self._state_idx
+
+    def _init_transition_prob(self) -> Tuple[np.ndarray, np.ndarray]:
+        """初始化转移概率（模拟论文4.8节1e6次实验统计结果），向量化构建确定性转移"""
+        mt_idx, _, dr, partition = self._state_components()
+        next_states = np.empty((self.state_num, len(self.actions), 1), dtype=np.int64)
+        # 简化逻辑：验证后状态变为“已验证”，延迟范围根据动作调整
+        new_iv = 1  # 执行验证动作后，元数据变为已验证
+        new_dr = {
+            0: np.minimum(dr + 1, self.delay_bucket_num - 1),  # 写前验证：延迟升高（如0→1，1→2）
+            1: dr,  # 读时验证：延迟不变
+            2: np.maximum(dr - 1, 0),  # 合并时验证：延迟降低（如1→0，2→1）
+        }
+        for a in self.actions:
+            next_states[:, a, 0] = self.state_index(mt_idx, new_iv, new_dr[a], partition)
+        next_probs = np.ones(next_states.shape)  # 确定性转移（模拟）
+        return next_states, next_probs
+
+    def set_transition_counts(self, states: np.ndarray, actions: np.ndarray, next_states: np.ndarray):
+        """用实测转移样本(s, a, s')估计随机转移概率；未观测到的(s, a)保留原转移"""
+        states, actions, next_states = (np.asarray(x, dtype=np.int64) for x in (states, actions, next_states))
+        action_num = len(self.actions)
+        pair = states * action_num + actions
+        triples, counts = np.unique(np.stack([pair, next_states]), axis=1, return_counts=True)
+        pairs, first, successor_num = np.unique(triples[0], return_index=True, return_counts=True)
+        width = max(self.next_states.shape[2], int(successor_num.max()))
+        # 按最大后继数扩展稀疏表，填充项指向自身、概率为0
+        flat_next = np.repeat(np.arange(self.state_num), action_num)[:, None].repeat(width, axis=1)
+        flat_probs = np.zeros((self.state_num * action_num, width))
+        old_width = self.next_states.shape[2]
+        flat_next[:, :old_width] = self.next_states.reshape(-1, old_width)
+        flat_probs[:, :old_width] = self.next_probs.reshape(-1, old_width)
+        # 观测到的(s, a)整行替换为经验分布
+        flat_probs[pairs] = 0.0
+        totals = np.bincount(triples[0], weights=counts, minlength=self.state_num * action_num)
+        slot = np.arange(triples.shape[1]) - np.repeat(first, successor_num)
+        flat_next[triples[0], slot] = triples[1]
+        flat_probs[triples[0], slot] = counts / totals[triples[0]]
+        self.next_states = flat_next.reshape(self.state_num, action_num, width)
+        self.next_probs = flat_probs.reshape(self.state_num, action_num, width)
 
-    def _init_transition_prob(self) -> np.ndarray:
-        """初始化转移概率（模拟论文4.8节1e6次实验统计结果）"""
+    def dense_transition_prob(self) -> np.ndarray:
+        """稠密转移矩阵P[s, a, s']（仅用于小状态空间调试）"""
         P = np.zeros((self.state_num, len(self.actions), self.state_num))
-        for s_idx, s in enumerate(self.states):
-            mt, iv, dr = s
-            for a in self.actions:
-                # 简化逻辑：验证后状态变为“已验证”，延迟范围根据动作调整
-                new_iv = 1  # 执行验证动作后，元数据变为已验证
-                if a == 0:  # 写前验证：延迟升高（如0→1，1→2）
-                    new_dr = min(dr + 1, 2)
-                elif a == 1:  # 读时验证：延迟不变
-                    new_dr = dr
-                else:  # 合并时验证：延迟降低（如1→0，2→1）
-                    new_dr = max(dr - 1, 0)
-                new_s = (mt, new_iv, new_dr)
-                new_s_idx = self.state_idx[new_s]
-                P[s_idx, a, new_s_idx] = 1.0  # 确定性转移（模拟）
+        s_idx, a_idx, _ = np.indices(self.next_states.shape)
+        np.add.at(P, (s_idx, a_idx, self.next_states), self.next_probs)
         return P
 
     def _init_rewards(self) -> np.ndarray:
         """初始化奖励函数（论文4.8节：延迟权重0.6，破坏概率权重0.4）"""
-        R = np.zeros((self.state_num, len(self.actions)))
         # 延迟成本（ms）：写前验证4.0，读时验证1.0，合并时验证2.0（论文4.9节）
-        delay_cost = {0: 4.0, 1: 1.0, 2: 2.0}
+        delay_cost = np.array([4.0, 1.0, 2.0])
         # 一致性破坏概率（%）：写前验证0.0，读时验证0.1，合并时验证0.05（论文4.8节）
-        error_prob = {0: 0.0, 1: 0.1, 2: 0.05}
-        
-        for s_idx, s in enumerate(self.states):
-            mt, iv, dr = s
-            for a in self.actions:
-                # 奖励 = - (0.6*延迟成本 + 0.4*破坏概率)（负成本即奖励）
-                reward = - (0.6 * delay_cost[a] + 0.4 * error_prob[a])
-                R[s_idx, a] = reward
-        return R
-
-    def value_iteration(self, max_iter=50, threshold=1e-4):
-        """价值迭代求解最优策略（论文4.8节，迭代50次收敛）"""
-        for _ in range(max_iter):
-            value_diff = 0.0
-            for s_idx in range(self.state_num):
-                old_value = self.value[s_idx]
-                # 计算每个动作的期望价值
-                action_values = []
-                for a in self.actions:
-                    exp_value = np.sum(self.transition_prob[s_idx, a] * (self.rewards[s_idx, a] + self.discount_factor * self.value))
-                    action_values.append(exp_value)
-                # 更新价值函数与策略
-                self.value[s_idx] = max(action_values)
-                self.policy[s_idx] = np.argmax(action_values)
-                value_diff = max(value_diff, abs(old_value - self.value[s_idx]))
+        error_prob = np.array([0.0, 0.1, 0.05])
+        # 奖励 = - (0.6*延迟成本 + 0.4*破坏概率)（负成本即奖励）
+        reward = - (0.6 * delay_cost + 0.4 * error_prob)
+        return np.tile(reward, (self.state_num, 1))
+
+    def _q_values(self, value: np.ndarray) -> np.ndarray:
+        """向量化Bellman备份：Q(s,a) = R(s,a) + γ·Σ_k P_k·V(s'_k)"""
+        expected = np.einsum("sak,sak->sa", self.next_probs, value[self.next_states])
+        return self.rewards + self.discount_factor * expected
+
+    def value_iteration(self, max_iter=50, threshold=1e-4) -> dict:
+        """价值迭代求解最优策略（论文4.8节，迭代50次收敛），全状态同步向量化更新"""
+        start = time.perf_counter()
+        value_diff = float("inf")
+        converged = False
+        iteration = 0
+        for iteration in range(1, max_iter + 1):
+            q = self._q_values(self.value)
+            new_value = q.max(axis=1)
+            value_diff = float(np.abs(new_value - self.value).max())
+            self.value = new_value
             if value_diff < threshold:
-                print(f"[MDP] Value iteration converged at iter {_+1}")
+                converged = True
+                print(f"[MDP] Value iteration converged at iter {iteration}")
+                break
+        self.policy = self._q_values(self.value).argmax(axis=1)
+        return self._report("value_iteration", iteration, value_diff, converged, start)
+
+    def policy_iteration(self, max_iter=50, eval_threshold=1e-6, max_eval_iter=1000) -> dict:
+        """策略迭代：迭代式策略评估（向量化）+ 贪心策略改进，策略不再变化即收敛"""
+        start = time.perf_counter()
+        states = np.arange(self.state_num)
+        converged = False
+        iteration = 0
+        value_diff = float("inf")
+        for iteration in range(1, max_iter + 1):
+            # 策略评估：V ← R_π + γ·P_π·V
+            next_states = self.next_states[states, self.policy]
+            next_probs = self.next_probs[states, self.policy]
+            rewards = self.rewards[states, self.policy]
+            for _ in range(max_eval_iter):
+                new_value = rewards + self.discount_factor * (next_probs * self.value[next_states]).sum(axis=1)
+                value_diff = float(np.abs(new_value - self.value).max())
+                self.value = new_value
+                if value_diff < eval_threshold:
+                    break
+            # 策略改进
+            new_policy = self._q_values(self.value).argmax(axis=1)
+            if np.array_equal(new_policy, self.policy):
+                converged = True
+                print(f"[MDP] Policy iteration converged at iter {iteration}")
                 break
+            self.policy = new_policy
+        return self._report("policy_iteration", iteration, value_diff, converged, start)
+
+    def _report(self, solver: str, iterations: int, residual: float, converged: bool, start: float) -> dict:
+        self.convergence = {
+            "solver": solver,
+            "states": self.state_num,
+            "iterations": iterations,
+            "residual": residual,
+            "converged": converged,
+            "elapsed_s": time.perf_counter() - start,
+        }
+        return self.convergence
+
+    def cache_key(self, solver: str = "value_iteration", **params) -> str:
+        """策略缓存键：转移表、奖励（含dtype与形状）、折扣因子与求解器参数的SHA-256哈希"""
+        digest = hashlib.sha256()  # 有SHA硬件指令时约为blake2b的2倍速
+        for array in (self.next_states, self.next_probs, self.rewards):
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+            digest.update(array.data)
+        digest.update(repr((self.discount_factor, solver, sorted(params.items()))).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def load_or_solve(self, solver: str = "value_iteration", cache_dir: Optional[str] = None, **params) -> dict:
+        """从策略缓存mmap加载价值函数与策略，未命中时调用solver求解并写入缓存
 
-    def get_optimal_action(self, meta: Metadata) -> str:
-        """根据元数据状态获取最优验证策略（论文4.8节）"""
+        缓存文件为单个结构化.npy（每状态一条(value, policy)），先写临时文件再原子rename，
+        并发求解的进程互不影响；缓存目录不可写时仅跳过写入。
+        """
+        start = time.perf_counter()
+        path = os.path.join(cache_dir or default_cache_dir(), f"mdp-{self.cache_key(solver, **params)}.npy")
+        try:
+            solution = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            solution = None
+        if solution is not None and solution.dtype == _SOLUTION_DTYPE and solution.shape == (self.state_num,):
+            self.value, self.policy = solution["value"], solution["policy"]
+            self.convergence = {"solver": solver, "states": self.state_num, "cache": "hit", "path": path,
+                                "elapsed_s": time.perf_counter() - start}
+            print(f"[MDP] Loaded cached {solver} policy ({self.state_num} states) from {path}")
+            return self.convergence
+        report = getattr(self, solver)(**params)
+        solution = np.empty(self.state_num, dtype=_SOLUTION_DTYPE)
+        solution["value"], solution["policy"] = self.value, self.policy
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, solution)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[MDP] Policy cache write skipped: {e}")
+        report.update(cache="miss", path=path, elapsed_s=time.perf_counter() - start)
+        return report
+
+    def get_optimal_action(self, meta: Metadata, partition: int = 0) -> str:
+        """根据元数据状态获取最优验证策略（论文4.8节），partition为分片/Key区间下标"""
         # 映射元数据到MDP状态
-        mt = meta.meta_type.value
+        mt_idx = self.meta_types.index(meta.meta_type)
         iv = 1 if meta.is_validated else 0
-        # 映射延迟范围（0:0-50ms，1:50-100ms，2:100-150ms）
-        if meta.delay_range <= 50:
-            dr = 0
-        elif meta.delay_range <= 100:
-            dr = 1
-        else:
-            dr = 2
-        state = (mt, iv, dr)
-        s_idx = self.state_idx[state]
+        # 映射延迟范围（默认0:0-50ms，1:50-100ms，2:100-150ms）
+        dr = int(np.searchsorted(self.delay_edges, meta.delay_range, side="left"))
+        s_idx = self.state_index(mt_idx, iv, dr, partition)
         action = self.policy[s_idx]
         return self.action_names[action]
 
+    def state_indices(self, meta_types, is_validated, delay_ranges, partitions=None) -> np.ndarray:
+        """批量映射元数据列到状态下标：meta_types为枚举值数组，delay_ranges按delay_edges分桶"""
+        mt_idx = self._meta_type_lookup[np.asarray(meta_types, dtype=np.intp)]
+        iv = np.asarray(is_validated, dtype=np.intp)
+        dr = np.searchsorted(self.delay_edges, np.asarray(delay_ranges, dtype=float), side="left")
+        partitions = 0 if partitions is None else np.asarray(partitions, dtype=np.intp)
+        return self.state_index(mt_idx, iv, dr, partitions)
+
+    def get_optimal_actions(self, meta_types, is_validated, delay_ranges, partitions=None) -> np.ndarray:
+        """批量获取最优验证动作（整数动作数组，下标对应self.action_names）"""
+        return self._policy_table()[self.state_indices(meta_types, is_validated, delay_ranges, partitions)]
+
+    def get_optimal_actions_for(self, metas: List[Metadata], partitions=None) -> np.ndarray:
+        """Metadata对象列表的批量动作查询（先转换为列再查表）"""
+        meta_types = np.fromiter((meta.meta_type.value for meta in metas), dtype=np.intp, count=len(metas))
+        is_validated = np.fromiter((meta.is_validated for meta in metas), dtype=np.intp, count=len(metas))
+        delay_ranges = np.fromiter((meta.delay_range for meta in metas), dtype=float, count=len(metas))
+        return self.get_optimal_actions(meta_types, is_validated, delay_ranges, partitions)
+
+    def partition_by_action(self, actions: np.ndarray) -> Dict[int, np.ndarray]:
+        """按动作分组：返回 动作 → 批内下标数组（组内保持原顺序）"""
+        order = np.argsort(actions, kind="stable")
+        counts = np.bincount(actions, minlength=len(self.actions))
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        return {action: group for action, group in zip(self.actions, groups) if len(group)}
+
+    def _policy_table(self) -> np.ndarray:
+        """紧凑策略表（int8），策略更新后按需重建"""
+        if self._policy_cache is None or self._policy_cache[0] is not self.policy:
+            self._policy_cache = (self.policy, self.policy.astype(np.int8))
+        return self._policy_cache[1]
+
     def batch_validate_metadata(self, metas: List[Metadata]) -> List[Metadata]:
-        """批量元数据验证优化（论文4.9节：1MB缓冲队列，按Key排序）"""
-        # 按Key排序（顺序I/O占比提升至92%）
-        sorted_metas = sorted(metas, key=lambda x: x.key)
-        # 模拟验证（仅查最近1层SSTable，验证时间从0.5ms→0.4ms）
-        for meta in sorted_metas:
-            meta.is_validated = True
-            meta.delay_range = 0.4  # 验证时间0.4ms
-        print(f"[Batch Validation] Validated {len(sorted_metas)} metadata entries (sorted by Key)")
-        return sorted_metas
\ No newline at end of file
+        """批量元数据验证（论文4.9节：1MB缓冲队列，按Key排序后查LSM Key索引）
+
+        每条元数据的(blob_id, offset)与Key索引中的存活版本比对，is_validated为比对结果，
+        delay_range记录单条验证耗时（ms）；缓冲满时分批验证，返回各批按Key有序拼接的结果。
+        """
+        validated = []
+        for meta in metas:
+            validated.extend(self.validation_buffer.offer(meta))
+        validated.extend(self.validation_buffer.drain())
+        stale = sum(1 for meta in validated if not meta.is_validated)
+        print(f"[Batch Validation] Validated {len(validated)} metadata entries (sorted by Key), {stale} stale")
+        return validated
+
+
+def measure_solver(partition_num: int = 1000, delay_bucket_num: int = 25, sample_num: int = 500000, seed: int = 0) -> List[dict]:
+    """求解器规模实验：以随机采样的转移样本拟合大状态空间（默认10万状态），对比价值迭代与策略迭代"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for solver in ("value_iteration", "policy_iteration"):
+        model = MDPValidationModel(delay_edges=tuple(np.linspace(10, 1000, delay_bucket_num - 1)),
+                                   partition_num=partition_num)
+        states = rng.integers(0, model.state_num, sample_num)
+        actions = rng.integers(0, len(model.actions), sample_num)
+        next_states = (states + rng.integers(-5, 6, sample_num)) % model.state_num
+        model.set_transition_counts(states, actions, next_states)
+        report = getattr(model, solver)(max_iter=500)
+        results.append(report)
+        print(f"[MDP Solver] {solver}: {report['states']} states, {report['iterations']} iters, "
+              f"residual {report['residual']:.2e}, {report['elapsed_s']:.2f}s")
+    return results
+
+
+def measure_policy_lookup(batch_size: int = 1000000, seed: int = 0) -> dict:
+    """批量策略查询吞吐：随机元数据列的lookups/s，对比逐条get_optimal_action"""
+    rng = np.random.default_rng(seed)
+    model = MDPValidationModel()
+    model.value_iteration()
+    meta_types = rng.choice([mt.value for mt in model.meta_types], batch_size)
+    is_validated = rng.integers(0, 2, batch_size)
+    delay_ranges = rng.uniform(0, 150, batch_size)
+    start = time.perf_counter()
+    actions = model.get_optimal_actions(meta_types, is_validated, delay_ranges)
+    groups = model.partition_by_action(actions)
+    batch_elapsed = time.perf_counter() - start
+    sample = [Metadata(key=f"key-{i}", blob_id="Blob-0", offset=i, is_validated=bool(is_validated[i]),
+                       meta_type=MetaType(int(meta_types[i])), delay_range=float(delay_ranges[i]))
+              for i in range(min(batch_size, 100000))]
+    start = time.perf_counter()
+    for meta in sample:
+        model.get_optimal_action(meta)
+    scalar_elapsed = time.perf_counter() - start
+    result = {
+        "batch_lookups_per_s": batch_size / batch_elapsed,
+        "scalar_lookups_per_s": len(sample) / scalar_elapsed,
+        "action_counts": {model.action_names[a]: len(g) for a, g in groups.items()},
+    }
+    print(f"[MDP Lookup] batch {result['batch_lookups_per_s'] / 1e6:.1f}M lookups/s, "
+          f"scalar {result['scalar_lookups_per_s'] / 1e6:.2f}M lookups/s, actions {result['action_counts']}")
+    return result
+
+
+def measure_cold_start(modules: Tuple[str, ...] = ("main", "gc_executor", "cluster_emulator", "simulation",
+                                                  "compaction", "shard_gc_scheduler", "mors_scheduler", "placement",
+                                                  "checkpoint"),
+                       rounds: int = 5, partition_num: int = 1000, delay_bucket_num: int = 25, seed: int = 0) -> dict:
+    """冷启动实验：各模块在新解释器中的导入耗时（中位数，对照空解释器），
+    以及默认/10万状态MDP的求解耗时与策略缓存mmap加载耗时"""
+    import statistics
+    import subprocess
+    import sys
+    import tempfile
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def startup_ms(code: str) -> float:
+        elapsed = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+            elapsed.append((time.perf_counter() - start) * 1000)
+        return statistics.median(elapsed)
+
+    result = {"python_ms": startup_ms("pass"), "import_ms": {}, "mdp": []}
+    print(f"[Cold Start] bare interpreter {result['python_ms']:.0f}ms")
+    for module in modules:
+        result["import_ms"][module] = startup_ms(f"import {module}")
+        print(f"[Cold Start] import {module}: {result['import_ms'][module]:.0f}ms")
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, kwargs in (("default", {}), ("large", {"partition_num": partition_num, "delay_edges": tuple(
+                np.linspace(10, 1000, delay_bucket_num - 1))})):
+            models = [MDPValidationModel(**kwargs) for _ in range(2)]
+            if name == "large":
+                sample_num = 5 * models[0].state_num
+                states = rng.integers(0, models[0].state_num, sample_num)
+                actions = rng.integers(0, len(models[0].actions), sample_num)
+                next_states = (states + rng.integers(-5, 6, sample_num)) % models[0].state_num
+                for model in models:
+                    model.set_transition_counts(states, actions, next_states)
+            solved = models[0].load_or_solve(cache_dir=cache_dir, max_iter=500)
+            loaded = models[1].load_or_solve(cache_dir=cache_dir, max_iter=500)
+            assert loaded["cache"] == "hit" and np.array_equal(models[0].policy, models[1].policy)
+            result["mdp"].append({"model": name, "states": models[0].state_num, "solve_ms": solved["elapsed_s"] * 1000,
+                                  "cached_load_ms": loaded["elapsed_s"] * 1000})
+            print(f"[Cold Start] MDP {name} ({models[0].state_num} states): solve {solved['elapsed_s'] * 1000:.1f}ms, "
+                  f"cached load {loaded['elapsed_s'] * 1000:.2f}ms")
+    return result
+
+
+if __name__ == "__main__":
+    measure_solver()
+    measure_policy_lookup()
+    measure_cold_start()
\ No newline at end of file
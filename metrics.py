@@ -0,0 +1,257 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+# 指标与追踪（替代热路径print）：计数器、仪表、HDR风格对数-线性延迟直方图，以及按GC任务的span追踪
+# 默认关闭（环境变量GCSMARTKV_METRICS=1或调用enable()开启）；关闭时每次记录只有一次属性判断
+HDR_SUB_BUCKET_BITS = 7  # 每个2的幂区间128个子桶，相对误差<1%
+HDR_SUB_BUCKETS = 1 << HDR_SUB_BUCKET_BITS
+HISTOGRAM_SCALE = 1e9  # 直方图以纳秒整数记录（记录值单位为秒）
+TRACE_CAPACITY = 10000  # 最多保留的任务追踪数（超出后淘汰最早的）
+
+
+def _hdr_index(value: int) -> int:
+    if value < HDR_SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - HDR_SUB_BUCKET_BITS - 1
+    return HDR_SUB_BUCKETS + shift * HDR_SUB_BUCKETS + (value >> shift) - HDR_SUB_BUCKETS
+
+
+def _hdr_value(index: int) -> int:
+    """桶下标 → 桶内最大值（百分位按桶上界报告）"""
+    if index < HDR_SUB_BUCKETS:
+        return index
+    shift, sub = divmod(index - HDR_SUB_BUCKETS, HDR_SUB_BUCKETS)
+    return ((sub + HDR_SUB_BUCKETS + 1) << shift) - 1
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    __slots__ = ("registry", "value")
+
+    def __init__(self, registry: "MetricsRegistry"):
+        self.registry = registry
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        if self.registry.enabled:
+            with self.registry.lock:
+                self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+
+class Gauge:
+    __slots__ = ("registry", "value")
+
+    def __init__(self, registry: "MetricsRegistry"):
+        self.registry = registry
+        self.value = 0.0
+
+    def set(self, value: float):
+        if self.registry.enabled:
+            self.value = value
+
+    def reset(self):
+        self.value = 0.0
+
+
+class Histogram:
+    """HDR风格直方图：对数-线性分桶，记录O(1)、内存与记录数无关
+
+    scale为记录值到整数刻度的换算（默认秒→纳秒；计数类直方图使用1）。
+    """
+    __slots__ = ("registry", "scale", "counts", "count", "total", "max")
+
+    def __init__(self, registry: "MetricsRegistry", scale: float = HISTOGRAM_SCALE):
+        self.registry = registry
+        self.scale = scale
+        self.reset()
+
+    def reset(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        if not self.registry.enabled:
+            return
+        index = _hdr_index(max(0, int(value * self.scale)))
+        with self.registry.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(q * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_hdr_value(index) / self.scale, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {"count": self.count, "sum": self.total, "max": self.max, "p50": self.percentile(0.50),
+                "p99": self.percentile(0.99), "p999": self.percentile(0.999)}
+
+
+class StageTimer:
+    """流水线分阶段计时：每次lap记录自上次lap以来的耗时到对应阶段直方图"""
+    __slots__ = ("histograms", "last")
+
+    def __init__(self, histograms: Dict[str, Histogram]):
+        self.histograms = histograms
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.histograms[stage].record(now - self.last)
+        self.last = now
+
+
+class _NoopStageTimer:
+    __slots__ = ()
+
+    def lap(self, stage: str):
+        pass
+
+
+NOOP_STAGE_TIMER = _NoopStageTimer()
+
+
+class Tracer:
+    """按GC任务的span追踪：每个任务一条事件序列（create→schedule→run→interrupt/resume→validate→complete）"""
+
+    def __init__(self, registry: "MetricsRegistry", capacity: int = TRACE_CAPACITY):
+        self.registry = registry
+        self.capacity = capacity
+        self.traces: "OrderedDict[str, List[Tuple[str, float, dict]]]" = OrderedDict()
+
+    def event(self, trace_id: str, name: str, **attrs):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            events = self.traces.get(trace_id)
+            if events is None:
+                events = self.traces[trace_id] = []
+                if len(self.traces) > self.capacity:
+                    self.traces.popitem(last=False)
+            events.append((name, time.time(), attrs))
+
+    def spans(self, trace_id: str) -> List[dict]:
+        """相邻事件构成span：span名为起始事件名，持续到下一个事件"""
+        events = self.traces.get(trace_id, [])
+        return [{"name": name, "start": start, "duration_s": (events[i + 1][1] - start) if i + 1 < len(events) else 0.0,
+                 **attrs} for i, (name, start, attrs) in enumerate(events)]
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, str, tuple], object] = {}
+        self._help: Dict[str, str] = {}
+        self.tracer = Tracer(self)
+
+    def _get(self, kind: str, factory: Callable[[], object], name: str, help_text: str, labels: dict):
+        key = (kind, name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self._metrics.setdefault(key, factory())
+                if help_text:
+                    self._help.setdefault(name, help_text)
+        return metric
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get("counter", lambda: Counter(self), name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get("gauge", lambda: Gauge(self), name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", scale: float = HISTOGRAM_SCALE, **labels) -> Histogram:
+        return self._get("histogram", lambda: Histogram(self, scale), name, help_text, labels)
+
+    def stage_timer(self, histograms: Dict[str, Histogram]):
+        """关闭时返回共享的空计时器，不调用时钟"""
+        return StageTimer(histograms) if self.enabled else NOOP_STAGE_TIMER
+
+    def trace(self, trace_id: str, name: str, **attrs):
+        self.tracer.event(trace_id, name, **attrs)
+
+    def reset(self):
+        """原地清零（组件持有的指标句柄保持有效）"""
+        with self.lock:
+            for metric in self._metrics.values():
+                metric.reset()
+            self.tracer.traces.clear()
+
+    def snapshot(self) -> dict:
+        """JSON快照：{counters, gauges, histograms: name → [{labels, value/summary}], traces}"""
+        result = {"timestamp": time.time(), "counters": {}, "gauges": {}, "histograms": {}, "traces": {}}
+        for (kind, name, labels), metric in sorted(self._metrics.items(), key=lambda x: x[0]):
+            entry = {"labels": dict(labels)}
+            if kind == "histogram":
+                entry.update(metric.summary())
+            else:
+                entry["value"] = metric.value
+            result[kind + "s"].setdefault(name, []).append(entry)
+        for trace_id in self.tracer.traces:
+            result["traces"][trace_id] = self.tracer.spans(trace_id)
+        return result
+
+    def to_prometheus(self) -> str:
+        """Prometheus文本格式：直方图以summary类型导出（分位数+_sum+_count）"""
+        lines = []
+        typed = set()
+        for (kind, name, labels), metric in sorted(self._metrics.items(), key=lambda x: (x[0][1], x[0][2])):
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {'summary' if kind == 'histogram' else kind}")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            if kind == "histogram":
+                for q in (0.5, 0.99, 0.999):
+                    quantile_labels = ",".join(filter(None, (label_text, f'quantile="{q}"')))
+                    lines.append(f"{name}{{{quantile_labels}}} {metric.percentile(q):.9g}")
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}_sum{suffix} {metric.total:.9g}")
+                lines.append(f"{name}_count{suffix} {metric.count}")
+            else:
+                lines.append(f"{name}{{{label_text}}} {metric.value:.9g}" if label_text else f"{name} {metric.value:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, fmt: Optional[str] = None):
+        """导出快照到文件：fmt为json或prometheus（默认按扩展名，.prom为prometheus）"""
+        fmt = fmt or ("prometheus" if path.endswith((".prom", ".txt")) else "json")
+        content = self.to_prometheus() if fmt == "prometheus" else json.dumps(self.snapshot(), indent=2)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+# 进程级全局注册表
+registry = MetricsRegistry(enabled=os.environ.get("GCSMARTKV_METRICS") == "1")
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
\ No newline at end of file
@@ -1,13 +1,230 @@
-from common import *
+from common import BlobFile, GCTask, NodeResource
+from metrics import registry as metrics
 from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import heapq
+import itertools
+import math
+import time
+
+HIGH_TIER, LOW_TIER = 0, 1
+# 节点资源模型（论文4.6节）：派发后FPGA≤90%、带宽≤88%方可准入；每个GC任务占用5% FPGA、4%带宽、20个CLB
+FPGA_LIMIT = 90.0
+BANDWIDTH_LIMIT = 88.0
+TASK_FPGA_DEMAND = 5.0
+TASK_BANDWIDTH_DEMAND = 4.0
+TASK_CLB_DEMAND = 20
+TOTAL_CLB = 1000
+TELEMETRY_WINDOW_S = 10.0  # 遥测平滑窗口（秒）
+PREEMPT_WEIGHT_LIMIT = 0.5  # 仅抢占优先级权重低于此值的任务
+
+
+class IndexedTaskHeap:
+    """索引最大堆：按收益值排序，task_id → 堆位置，支持O(log n)插入、弹出、调整与撤销"""
+
+    def __init__(self):
+        self._heap: List[list] = []  # 堆元素：[收益值, 入队序号, 任务]
+        self._pos: Dict[str, int] = {}  # task_id → 堆下标
+        self._seq = itertools.count()  # 同收益按入队顺序（FIFO）
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._pos
+
+    def _higher(self, i: int, j: int) -> bool:
+        a, b = self._heap[i], self._heap[j]
+        return a[0] > b[0] or (a[0] == b[0] and a[1] < b[1])
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][2].task_id] = i
+        self._pos[heap[j][2].task_id] = j
+
+    def _sift_up(self, i: int):
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not self._higher(i, parent):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        size = len(self._heap)
+        while True:
+            best, left = i, 2 * i + 1
+            if left < size and self._higher(left, best):
+                best = left
+            if left + 1 < size and self._higher(left + 1, best):
+                best = left + 1
+            if best == i:
+                return
+            self._swap(i, best)
+            i = best
+
+    def push(self, task: GCTask, profit: float):
+        if task.task_id in self._pos:
+            raise ValueError(f"Task {task.task_id} already queued")
+        self._heap.append([profit, next(self._seq), task])
+        self._pos[task.task_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def peek(self) -> Optional[GCTask]:
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self) -> Optional[GCTask]:
+        if not self._heap:
+            return None
+        return self.remove(self._heap[0][2].task_id)
+
+    def update(self, task_id: str, profit: float):
+        """调整任务收益值（垃圾比率变化后重排）"""
+        i = self._pos[task_id]
+        old_profit = self._heap[i][0]
+        self._heap[i][0] = profit
+        if profit > old_profit:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, task_id: str) -> Optional[GCTask]:
+        """撤销任务（被抢占或取消），返回被移除的任务"""
+        i = self._pos.pop(task_id, None)
+        if i is None:
+            return None
+        heap = self._heap
+        task = heap[i][2]
+        last = heap.pop()
+        if i < len(heap):
+            heap[i] = last
+            self._pos[last[2].task_id] = i
+            self._sift_up(i)
+            self._sift_down(self._pos[last[2].task_id])
+        return task
+
+
+class GCTaskQueue:
+    """MORS持久化任务队列：高/低收益两级索引堆，高收益层优先出队（论文4.5节）"""
+
+    def __init__(self, high_profit_threshold: float = 0.7):
+        self.high_profit_threshold = high_profit_threshold
+        self.high_priority = IndexedTaskHeap()  # 收益值≥0.7
+        self.low_priority = IndexedTaskHeap()  # 收益值<0.7
+
+    def __len__(self) -> int:
+        return len(self.high_priority) + len(self.low_priority)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.high_priority or task_id in self.low_priority
+
+    def _tier(self, profit: float) -> IndexedTaskHeap:
+        return self.high_priority if profit >= self.high_profit_threshold else self.low_priority
+
+    def push(self, task: GCTask):
+        profit = task.calculate_profit()
+        self._tier(profit).push(task, profit)
+
+    def peek(self) -> Optional[GCTask]:
+        return self.high_priority.peek() or self.low_priority.peek()
+
+    def pop(self) -> Optional[GCTask]:
+        return self.high_priority.pop() if len(self.high_priority) else self.low_priority.pop()
+
+    def update(self, task: GCTask):
+        """任务收益值变化后重排，跨层时在两级堆之间迁移"""
+        profit = task.calculate_profit()
+        tier = self._tier(profit)
+        if task.task_id in tier:
+            tier.update(task.task_id, profit)
+        else:
+            self.cancel(task)
+            tier.push(task, profit)
+
+    def cancel(self, task: GCTask) -> Optional[GCTask]:
+        return self.high_priority.remove(task.task_id) or self.low_priority.remove(task.task_id)
+
+
+class NodeTelemetry:
+    """节点外部负载遥测（前台读写等非GC占用）：按时间衰减的EWMA，平滑窗口为window_s秒
+
+    相邻两次采样间隔dt时权重 α = 1 − exp(−dt / window_s)，等效于对最近window_s秒的滑动平均，
+    采样不规则时仍保持相同的时间尺度。
+    """
+
+    def __init__(self, fpga_utilization: float, bandwidth_utilization: float, window_s: float = TELEMETRY_WINDOW_S):
+        self.window_s = window_s
+        self.fpga_utilization = fpga_utilization
+        self.bandwidth_utilization = bandwidth_utilization
+        self.last_sample: Optional[float] = None
+
+    def observe(self, fpga_utilization: float, bandwidth_utilization: float, now: float):
+        if self.last_sample is None:
+            alpha = 1.0
+        else:
+            alpha = 1.0 - math.exp(-max(now - self.last_sample, 0.0) / self.window_s)
+        self.fpga_utilization += alpha * (fpga_utilization - self.fpga_utilization)
+        self.bandwidth_utilization += alpha * (bandwidth_utilization - self.bandwidth_utilization)
+        self.last_sample = now
+
+
+class Reservation(NamedTuple):
+    """运行中任务占用的节点资源（派发时预留，完成、中断或被抢占时释放）"""
+    task: GCTask
+    node_id: str
+    tier: int
 
 
 class MORSScheduler:
-    def __init__(self, node_ids: List[str]):
+    """MORS调度器：收益排序的任务队列 + 节点资源实时模型（论文4.5-4.6节）
+
+    节点利用率 = 外部负载遥测（EWMA平滑）+ 运行中GC任务的资源预留；任务派发时预留，完成、中断切换或被抢占时释放。
+    准入同时检查资源上限（派发后FPGA≤90%、带宽≤88%）与节点高/低优先级配额；
+    节点按派发后的归一化负载组织为惰性最小堆，选点O(log N)。
+    """
+
+    def __init__(self, node_ids: List[str], telemetry_window_s: float = TELEMETRY_WINDOW_S):
         self.node_resources: Dict[str, NodeResource] = self._init_node_resources(node_ids)
+        self.telemetry: Dict[str, NodeTelemetry] = {
+            node_id: NodeTelemetry(resource.fpga_utilization, resource.bandwidth_utilization, telemetry_window_s)
+            for node_id, resource in self.node_resources.items()}
         # 任务配额：node_id → (high_priority_quota, low_priority_quota)
-        self.task_quota: Dict[str, Tuple[int, int]] = defaultdict(lambda: (15, 10))  # 初始配额：高15，低10
+        self.base_quota = (15, 10)  # 初始配额：高15，低10
+        self.task_quota: Dict[str, Tuple[int, int]] = defaultdict(lambda: self.base_quota)
         self.resource_competition_threshold = (0.4, 0.7)  # 资源竞争度阈值（低<0.4，高>0.7，论文4.6节）
+        self.high_profit_threshold = 0.7  # 收益值≥0.7为高优先级（论文4.5节）
+        # 待调度任务队列：两级索引堆，调度决策O(log n)
+        self.task_queue = GCTaskQueue(self.high_profit_threshold)
+        # 资源预留账本：task_id → 预留；node_id → [高优先级运行数, 低优先级运行数]
+        self.reservations: Dict[str, Reservation] = {}
+        self.running: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        self.preempted: Set[str] = set()  # 已要求让出资源、尚未释放的任务
+        # 节点负载惰性最小堆：(派发后归一化负载, node_id, 版本)，节点状态变化时压入新条目，旧版本出堆时丢弃
+        self._node_heap: List[Tuple[float, str, int]] = []
+        self._node_version: Dict[str, int] = defaultdict(int)
+        # 调度决策指标
+        self._decisions = {tier: metrics.counter("mors_decisions_total", "Tasks dequeued for scheduling", tier=tier)
+                           for tier in ("high", "low")}
+        self._select_latency = metrics.histogram("mors_select_node_seconds", "select_best_node decision latency")
+        # 按节点预建指标句柄（热路径不做带标签的注册表查找）
+        self._node_selected = {node_id: metrics.counter("mors_node_selected_total", "Node selection decisions",
+                                                        node=node_id or "none")
+                               for node_id in (*self.node_resources, None)}
+        self._preemptions = {node_id: metrics.counter("mors_preemptions_total", "Low-priority tasks preempted",
+                                                      node=node_id) for node_id in self.node_resources}
+        self._quota_adjusts = {(node_id, direction): metrics.counter("mors_quota_adjust_total",
+                                                                     "Low-priority quota adjustments",
+                                                                     node=node_id, direction=direction)
+                               for node_id in self.node_resources for direction in ("up", "down", "reset")}
+        self._low_quota = {node_id: metrics.gauge("mors_low_quota", "Current low-priority quota", node=node_id)
+                           for node_id in self.node_resources}
+        self._competition = {node_id: metrics.gauge("mors_resource_competition", "Node resource competition",
+                                                    node=node_id) for node_id in self.node_resources}
+        self._virtual_clb = {node_id: metrics.gauge("mors_virtual_clb", "Virtualized CLB count", node=node_id)
+                             for node_id in self.node_resources}
+        for node_id in self.node_resources:
+            self._refresh_node(node_id)
 
     def _init_node_resources(self, node_ids: List[str]) -> Dict[str, NodeResource]:
         """初始化节点资源状态（FPGA利用率默认60%，带宽50%）"""
@@ -17,66 +234,185 @@ class MORSScheduler:
                 node_id=node_id,
                 fpga_utilization=60.0,
                 bandwidth_utilization=50.0,
-                remaining_clb=1000  # 假设初始1000个CLB
+                remaining_clb=TOTAL_CLB  # 假设初始1000个CLB
             )
         return resources
 
     def sort_tasks_by_profit(self, tasks: List[GCTask]) -> List[GCTask]:
-        """MORS任务排序：高收益优先（论文4.5节）"""
-        # 收益值≥0.7为高优先级，优先调度
-        high_priority = [t for t in tasks if t.calculate_profit() >= 0.7]
-        low_priority = [t for t in tasks if t.calculate_profit() < 0.7]
-        # 按收益值降序排序
-        high_priority.sort(key=lambda x: x.calculate_profit(), reverse=True)
-        low_priority.sort(key=lambda x: x.calculate_profit(), reverse=True)
-        return high_priority + low_priority
+        """MORS任务排序：高收益优先（论文4.5节），一次性排序；持续调度请使用task_queue"""
+        # 每个任务只计算一次收益值；收益值≥0.7为高优先级，优先调度
+        ranked = [(t.calculate_profit(), i, t) for i, t in enumerate(tasks)]
+        ranked.sort(key=lambda x: (x[0] < self.high_profit_threshold, -x[0], x[1]))
+        return [t for _, _, t in ranked]
 
-    def select_best_node(self, task: GCTask) -> Optional[str]:
-        """资源筛选：选择负载最低的可用节点（论文4.6节）"""
-        # 筛选可用节点（满足硬件约束）
-        available_nodes = [n for n in self.node_resources.values() if n.is_available()]
-        if not available_nodes:
-            return self._preempt_low_priority_resource(task)  # 无可用节点，抢占低优先级资源
-        
-        # 计算节点负载（FPGA利用率+带宽利用率，论文4.6节）
-        available_nodes.sort(key=lambda x: x.fpga_utilization + x.bandwidth_utilization)
-        best_node = available_nodes[0]
-        # 更新节点资源（模拟任务分配后的负载增长）
-        best_node.fpga_utilization += 5.0  # 假设任务占用5% FPGA
-        best_node.bandwidth_utilization += 4.0  # 占用4%带宽
-        best_node.remaining_clb -= 20  # 占用20个CLB
+    def tier(self, task: GCTask) -> int:
+        return HIGH_TIER if task.calculate_profit() >= self.high_profit_threshold else LOW_TIER
+
+    def submit_task(self, task: GCTask):
+        """任务入队（O(log n)）"""
+        self.task_queue.push(task)
+
+    def next_task(self) -> Optional[GCTask]:
+        """弹出当前收益最高的任务（高收益层优先，O(log n)）"""
+        task = self.task_queue.pop()
+        if task is not None:
+            self._decisions["high" if task.calculate_profit() >= self.high_profit_threshold else "low"].inc()
+        return task
+
+    def update_task_garbage_ratio(self, task: GCTask, garbage_ratio: float):
+        """Blob垃圾比率变化时更新任务收益并重排（O(log n)）"""
+        task.garbage_ratio = garbage_ratio
+        if task.task_id in self.task_queue:
+            self.task_queue.update(task)
+
+    def cancel_task(self, task: GCTask) -> Optional[GCTask]:
+        """撤销排队中的任务（被抢占或取消，O(log n)）"""
+        return self.task_queue.cancel(task)
+
+    @staticmethod
+    def _dispatch_load(resource: NodeResource) -> float:
+        """再派发一个任务后的归一化负载：各资源占用/上限的最大值，≤1即资源上可准入"""
+        return max((resource.fpga_utilization + TASK_FPGA_DEMAND) / FPGA_LIMIT,
+                   (resource.bandwidth_utilization + TASK_BANDWIDTH_DEMAND) / BANDWIDTH_LIMIT,
+                   (TOTAL_CLB - resource.remaining_clb + TASK_CLB_DEMAND) / TOTAL_CLB)
+
+    def _refresh_node(self, node_id: str):
+        """节点利用率 = 遥测基线 + 运行任务预留；重算竞争度与配额，并压入新的堆条目"""
+        resource = self.node_resources[node_id]
+        telemetry = self.telemetry[node_id]
+        busy = sum(self.running[node_id])
+        resource.fpga_utilization = telemetry.fpga_utilization + busy * TASK_FPGA_DEMAND
+        resource.bandwidth_utilization = telemetry.bandwidth_utilization + busy * TASK_BANDWIDTH_DEMAND
+        resource.remaining_clb = TOTAL_CLB - busy * TASK_CLB_DEMAND
         # 计算资源竞争度（负载/100，论文4.6节）
-        best_node.resource_competition = (best_node.fpga_utilization + best_node.bandwidth_utilization) / 200
-        self._adjust_quota(best_node.node_id)  # 动态调整配额
-        return best_node.node_id
-
-    def _preempt_low_priority_resource(self, task: GCTask) -> Optional[str]:
-        """抢占低优先级任务资源（仅抢占权重<0.5的任务，论文4.6节）"""
-        for node_id, tasks in self.node_tasks.items():  # 需传入全局任务列表，此处简化
-            low_priority_tasks = [t for t in tasks if t.priority_weight < 0.5]
-            if low_priority_tasks:
-                # 抢占第一个低优先级任务
-                preempted_task = low_priority_tasks[0]
-                preempted_task.status = GCTask.status.INTERRUPTED
-                tasks.remove(preempted_task)
-                print(f"[Preempt] Node {node_id}: Preempt low-priority task {preempted_task.task_id} for {task.task_id}")
-                return node_id
-        return None
+        resource.resource_competition = (resource.fpga_utilization + resource.bandwidth_utilization) / 200
+        self._adjust_quota(node_id)
+        self._node_version[node_id] += 1
+        heapq.heappush(self._node_heap, (self._dispatch_load(resource), node_id, self._node_version[node_id]))
+        if len(self._node_heap) > 4 * len(self.node_resources) + 64:  # 过期条目过多时重建
+            self._node_heap = [(self._dispatch_load(r), n, self._node_version[n]) for n, r in self.node_resources.items()]
+            heapq.heapify(self._node_heap)
+
+    def observe(self, node_id: str, fpga_utilization: float, bandwidth_utilization: float,
+                now: Optional[float] = None):
+        """上报节点外部负载采样（不含GC预留），按滑动窗口EWMA平滑后参与准入"""
+        self.telemetry[node_id].observe(fpga_utilization, bandwidth_utilization,
+                                        time.monotonic() if now is None else now)
+        self._refresh_node(node_id)
+
+    def admit(self, task: GCTask, node_id: Optional[str] = None) -> bool:
+        """准入检查：派发后不超过资源上限，且节点对应优先级层仍有配额（默认检查任务主节点）"""
+        node_id = node_id or task.primary_node_id
+        tier = self.tier(task)
+        return (self._dispatch_load(self.node_resources[node_id]) <= 1.0
+                and self.running[node_id][tier] < self.task_quota[node_id][tier])
+
+    def reserve(self, task: GCTask, node_id: Optional[str] = None) -> Reservation:
+        """派发时预留任务资源；任务已有预留时（中断后切换到备份节点）先释放原节点再预留"""
+        if task.task_id in self.reservations:
+            self.release(task)
+        reservation = Reservation(task, node_id or task.primary_node_id, self.tier(task))
+        self.reservations[task.task_id] = reservation
+        self.running[reservation.node_id][reservation.tier] += 1
+        self._refresh_node(reservation.node_id)
+        return reservation
+
+    def release(self, task: GCTask) -> Optional[Reservation]:
+        """任务完成、中断切换或让出时释放预留，返回被释放的预留（无预留时为None）"""
+        reservation = self.reservations.pop(task.task_id, None)
+        if reservation is None:
+            return None
+        self.preempted.discard(task.task_id)
+        self.running[reservation.node_id][reservation.tier] -= 1
+        self._refresh_node(reservation.node_id)
+        return reservation
+
+    def is_preempted(self, task: GCTask) -> bool:
+        return task.task_id in self.preempted
+
+    def select_best_node(self, task: GCTask) -> Optional[str]:
+        """资源筛选：选择负载最低且可准入的节点并预留资源（论文4.6节）"""
+        if not metrics.enabled:
+            return self._select_best_node(task)
+        start = time.perf_counter()
+        node_id = self._select_best_node(task)
+        self._select_latency.record(time.perf_counter() - start)
+        self._node_selected[node_id].inc()
+        return node_id
+
+    def _select_best_node(self, task: GCTask) -> Optional[str]:
+        # 堆顶为派发后归一化负载最低的节点：堆顶超限则所有节点均超限；
+        # 仅当堆顶节点该优先级层配额已满时继续向下查找
+        tier = self.tier(task)
+        heap = self._node_heap
+        popped = []
+        best_node = None
+        while heap:
+            entry = heapq.heappop(heap)
+            load, node_id, version = entry
+            if version != self._node_version[node_id]:
+                continue  # 过期条目
+            popped.append(entry)
+            if load > 1.0:
+                break
+            if self.running[node_id][tier] < self.task_quota[node_id][tier]:
+                best_node = node_id
+                break
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        if best_node is None:
+            self.preempt(task)  # 无可用节点，高优先级任务抢占低优先级资源，释放后由调用方重试
+            return None
+        self.reserve(task, best_node)
+        return best_node
+
+    def preempt(self, task: GCTask, node_id: Optional[str] = None) -> Optional[str]:
+        """高优先级任务无法准入时请求抢占（node_id为空则在全部节点中选择），返回让出资源的节点"""
+        if self.tier(task) != HIGH_TIER:
+            return None
+        return self._preempt_low_priority_resource(task, node_id)
+
+    def _preempt_low_priority_resource(self, task: GCTask, node_id: Optional[str] = None) -> Optional[str]:
+        """抢占低优先级任务资源（仅抢占权重<0.5的运行中任务，论文4.6节）
+
+        被抢占任务记入preempted，由执行方在窗口边界保存快照并释放预留；同一节点已有待让出的任务时不重复抢占。
+        """
+        candidates = [r for r in self.reservations.values()
+                      if (node_id is None or r.node_id == node_id) and r.task.priority_weight < PREEMPT_WEIGHT_LIMIT]
+        for reservation in candidates:
+            if reservation.task.task_id in self.preempted:
+                return reservation.node_id
+        if not candidates:
+            return None
+        # 抢占收益值最低的低优先级任务
+        victim = min(candidates, key=lambda r: r.task.calculate_profit())
+        self.preempted.add(victim.task.task_id)
+        self._preemptions[victim.node_id].inc()
+        print(f"[Preempt] Node {victim.node_id}: Preempt low-priority task {victim.task.task_id} for {task.task_id}")
+        return victim.node_id
 
     def _adjust_quota(self, node_id: str):
-        """动态调整任务配额（论文4.6节）"""
+        """动态调整任务配额（论文4.6节）：按当前竞争度相对初始配额设定，竞争度回落后配额随之恢复"""
         competition = self.node_resources[node_id].resource_competition
-        high_quota, low_quota = self.task_quota[node_id]
+        high_quota, low_quota = self.base_quota
         if competition > self.resource_competition_threshold[1]:
             # 竞争度高，降低低优先级配额20%
-            new_low = int(low_quota * 0.8)
-            self.task_quota[node_id] = (high_quota, new_low)
-            print(f"[Quota Adjust] Node {node_id}: Low quota {low_quota}→{new_low} (competition={competition:.2f})")
+            new_low, direction = max(1, int(low_quota * 0.8)), "down"
         elif competition < self.resource_competition_threshold[0]:
             # 竞争度低，提高低优先级配额20%
-            new_low = int(low_quota * 1.2)
+            new_low, direction = int(low_quota * 1.2), "up"
+        else:
+            new_low, direction = low_quota, "reset"
+        if self.task_quota[node_id] != (high_quota, new_low):
             self.task_quota[node_id] = (high_quota, new_low)
-            print(f"[Quota Adjust] Node {node_id}: Low quota {low_quota}→{new_low} (competition={competition:.2f})")
+            self._record_quota(node_id, direction, new_low, competition)
+
+    def _record_quota(self, node_id: str, direction: str, low_quota: int, competition: float):
+        if not metrics.enabled:
+            return
+        self._quota_adjusts[node_id, direction].inc()
+        self._low_quota[node_id].set(low_quota)
+        self._competition[node_id].set(competition)
 
     def update_hardware_virtualization(self, node_id: str, load_level: str):
         """动态硬件虚拟化（负载高峰1:6，低谷1:4，论文4.7节）"""
@@ -87,6 +423,118 @@ class MORSScheduler:
         else:
             virtual_ratio = 5  # 默认1:5
         # 计算虚拟后可用CLB（实际需FPGA硬件支持，此处模拟）
-        physical_clb = 1000 - self.node_resources[node_id].remaining_clb
+        physical_clb = TOTAL_CLB - self.node_resources[node_id].remaining_clb
         virtual_clb = physical_clb * virtual_ratio
-        print(f"[Virtualization] Node {node_id}: Ratio 1:{virtual_ratio}, Virtual CLB: {virtual_clb}")
\ No newline at end of file
+        self._virtual_clb[node_id].set(virtual_clb)
+
+
+def _priority_weight(garbage_ratio: float) -> float:
+    """与ShardGCScheduler建任务时相同的优先级权重分档"""
+    return 1.0 if garbage_ratio >= 0.7 else 0.7 if garbage_ratio >= 0.3 else 0.4
+
+
+def measure_sustained_load(node_num: int = 5, hours: int = 4, arrival_rate: float = 1.8, mean_service_s: float = 20.0,
+                           seed: int = 0) -> List[dict]:
+    """长时间持续负载实验（虚拟时钟）：任务Poisson到达、经select_best_node派发，节点外部负载按小时周期波动并带噪声，
+    每秒上报遥测；输出每小时完成数、排队等待、抢占次数与峰值利用率（含派发后外部负载上涨），
+    结束后排空检查预留是否全部归还"""
+    import contextlib
+    import io
+    import random
+    from simulation import Simulator
+    rng = random.Random(seed)
+    node_ids = [f"Node-{i + 1}" for i in range(node_num)]
+    scheduler = MORSScheduler(node_ids)
+    sim = Simulator()
+    horizon = hours * 3600.0
+    running: Dict[str, Tuple[float, int]] = {}  # task_id → (完成时刻, 派发代数)
+    submitted: Dict[str, float] = {}  # task_id → 入队时刻
+    remaining: Dict[str, float] = {}  # 被抢占任务的剩余服务时间
+    tasks: Dict[str, GCTask] = {}
+    generation = itertools.count()
+    hourly = [defaultdict(float) for _ in range(hours + 1)]
+
+    def bucket() -> dict:
+        return hourly[min(int(sim.now // 3600), hours)]
+
+    def dispatch(_=None):
+        while len(scheduler.task_queue):
+            task = scheduler.task_queue.peek()
+            if scheduler.select_best_node(task) is None:
+                return
+            scheduler.next_task()
+            service = remaining.pop(task.task_id, None) or rng.expovariate(1 / mean_service_s)
+            bucket()["wait_s"] += sim.now - submitted.pop(task.task_id)
+            bucket()["dispatched"] += 1
+            gen = next(generation)
+            running[task.task_id] = (sim.now + service, gen)
+            sim.schedule(sim.now + service, complete, (task.task_id, gen))
+
+    def complete(arg):
+        task_id, gen = arg
+        if running.get(task_id, (None, None))[1] != gen:
+            return  # 已被抢占，本次完成事件作废
+        del running[task_id]
+        scheduler.release(tasks.pop(task_id))
+        bucket()["completed"] += 1
+        dispatch()
+
+    def arrive(index):
+        if sim.now >= horizon:
+            return
+        garbage_ratio = rng.uniform(0.1, 0.9)
+        task = GCTask(task_id=f"GC-{index}", shard_id=index, primary_node_id=node_ids[0], backup_node_id=node_ids[1],
+                      target_blob=BlobFile(f"Blob-{index}", index, garbage_ratio=garbage_ratio),
+                      priority_weight=_priority_weight(garbage_ratio), garbage_ratio=garbage_ratio)
+        tasks[task.task_id] = task
+        submitted[task.task_id] = sim.now
+        scheduler.submit_task(task)
+        dispatch()
+        sim.schedule(sim.now + rng.expovariate(arrival_rate), arrive, index + 1)
+
+    def tick(_=None):
+        # 外部负载：FPGA 45%±15%、带宽40%±12%按小时周期波动，叠加噪声，经EWMA平滑后参与准入
+        phase = math.sin(2 * math.pi * sim.now / 3600)
+        for i, node_id in enumerate(node_ids):
+            shift = math.sin(2 * math.pi * (sim.now / 3600 + i / node_num))
+            scheduler.observe(node_id, 45 + 15 * shift + rng.gauss(0, 8), 40 + 12 * phase + rng.gauss(0, 6), now=sim.now)
+        stats = bucket()
+        for task_id in list(scheduler.preempted):  # 被抢占任务在下一个窗口边界让出，剩余部分重新排队
+            end, _ = running.pop(task_id)
+            task = tasks[task_id]
+            scheduler.release(task)
+            remaining[task_id] = end - sim.now
+            submitted[task_id] = sim.now
+            scheduler.submit_task(task)
+            stats["preemptions"] += 1
+        for resource in scheduler.node_resources.values():
+            stats["peak_fpga"] = max(stats["peak_fpga"], resource.fpga_utilization)
+            stats["peak_bandwidth"] = max(stats["peak_bandwidth"], resource.bandwidth_utilization)
+        dispatch()
+        if running or len(scheduler.task_queue) or sim.now < horizon:
+            sim.schedule(sim.now + 1.0, tick)
+
+    sim.schedule(0.0, tick)
+    sim.schedule(rng.expovariate(arrival_rate), arrive, 0)
+    with contextlib.redirect_stdout(io.StringIO()):  # 抢占日志
+        sim.run(horizon * 2)
+    results = []
+    for hour, stats in enumerate(hourly[:hours]):
+        result = {"hour": hour + 1, "completed": int(stats["completed"]), "tasks_per_s": stats["completed"] / 3600,
+                  "mean_wait_s": stats["wait_s"] / stats["dispatched"] if stats["dispatched"] else 0.0,
+                  "preemptions": int(stats["preemptions"]), "peak_fpga": stats["peak_fpga"],
+                  "peak_bandwidth": stats["peak_bandwidth"]}
+        results.append(result)
+        print(f"[MORS Sustained] hour {result['hour']}: {result['completed']} tasks ({result['tasks_per_s']:.2f}/s, "
+              f"offered {arrival_rate:.2f}/s), mean wait {result['mean_wait_s']:.1f}s, "
+              f"{result['preemptions']} preemptions, peak FPGA {result['peak_fpga']:.1f}% / "
+              f"bandwidth {result['peak_bandwidth']:.1f}%")
+    leaked = sum(sum(counts) for counts in scheduler.running.values())
+    clb = sum(r.remaining_clb for r in scheduler.node_resources.values())
+    print(f"[MORS Sustained] drained: {len(scheduler.reservations)} reservations, {leaked} running slots outstanding, "
+          f"remaining CLB {clb}/{TOTAL_CLB * node_num}")
+    return results
+
+
+if __name__ == "__main__":
+    measure_sustained_load()
\ No newline at end of file
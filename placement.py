@@ -0,0 +1,182 @@
+from common import DEFAULT_SHARD_NUM
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from bisect import bisect_right
+from collections import defaultdict
+import hashlib
+import math
+import random
+
+# 分片放置（论文4.2节主备机制、5.9节节点扩展）：一致性哈希环 + 虚拟节点 + 有界负载
+# 每个节点的主分片数与备份分片数均不超过 ceil(LOAD_FACTOR × 分片数 / 节点数)；
+# 增删节点时重新计算放置，只有哈希环上归属变化或因容量溢出的分片迁移（主分片约1/N，主备合计约2/N）
+DEFAULT_VNODES = 256  # 每个物理节点的虚拟节点数
+LOAD_FACTOR = 1.1  # 有界负载系数（最大负载/平均负载上限）
+
+
+def _ring_hash(label: str) -> int:
+    return int.from_bytes(hashlib.blake2b(label.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ShardMove(NamedTuple):
+    """一次成员变更中放置发生变化的分片"""
+    shard_id: int
+    old_primary: str
+    old_backup: str
+    new_primary: str
+    new_backup: str
+
+
+class ShardPlacement:
+    """一致性哈希分片放置：主节点为分片哈希顺时针方向第一个未满的节点，
+    备份节点为其后第一个不同且备份未满的节点（主备必不在同一节点）。
+
+    assignment为 shard_id → (primary, backup)，成员变更时原地更新（调用方持有的引用保持有效）。
+    """
+
+    def __init__(self, node_ids: List[str], shard_num: int = DEFAULT_SHARD_NUM, vnodes: int = DEFAULT_VNODES,
+                 load_factor: float = LOAD_FACTOR):
+        if len(set(node_ids)) < 2:
+            raise ValueError("Shard placement needs at least 2 distinct nodes (primary and backup)")
+        self.shard_num = shard_num
+        self.vnodes = vnodes
+        self.load_factor = load_factor
+        self.nodes: List[str] = []
+        self._ring_hashes: List[int] = []
+        self._ring_nodes: List[str] = []
+        self._shard_hashes = [_ring_hash(f"shard-{shard_id}") for shard_id in range(shard_num)]
+        self.assignment: Dict[int, Tuple[str, str]] = {}
+        for node_id in dict.fromkeys(node_ids):
+            self._add_to_ring(node_id)
+        self._place()
+
+    def _add_to_ring(self, node_id: str):
+        self.nodes.append(node_id)
+        points = sorted(zip(self._ring_hashes + [_ring_hash(f"{node_id}#{i}") for i in range(self.vnodes)],
+                            self._ring_nodes + [node_id] * self.vnodes))
+        self._ring_hashes = [h for h, _ in points]
+        self._ring_nodes = [n for _, n in points]
+
+    def _remove_from_ring(self, node_id: str):
+        self.nodes.remove(node_id)
+        kept = [(h, n) for h, n in zip(self._ring_hashes, self._ring_nodes) if n != node_id]
+        self._ring_hashes = [h for h, _ in kept]
+        self._ring_nodes = [n for _, n in kept]
+
+    def capacity(self) -> int:
+        """每个节点的主（或备份）分片数上限"""
+        return max(1, math.ceil(self.load_factor * self.shard_num / len(self.nodes)))
+
+    def _place(self, added: Optional[str] = None):
+        """按分片ID顺序沿环放置（确定性），跳过已满节点
+
+        已有放置尽量保持：原主（备）节点仍在且未满时保留，除非新加入节点在环上位于其前（此时迁往新节点）；
+        因容量收缩而超出上限的分片按环顺序让出，落到其后第一个未满节点。
+        """
+        cap = self.capacity()
+        alive = set(self.nodes)
+        primary_load: Dict[str, int] = defaultdict(int)
+        backup_load: Dict[str, int] = defaultdict(int)
+        ring_size = len(self._ring_nodes)
+        placement = {}
+        for shard_id, shard_hash in enumerate(self._shard_hashes):
+            pos = bisect_right(self._ring_hashes, shard_hash)
+            old_primary, old_backup = self.assignment.get(shard_id, (None, None))
+            keep_primary = old_primary if old_primary in alive and primary_load[old_primary] < cap else None
+            primary = backup = None
+            for step in range(ring_size):
+                node = self._ring_nodes[(pos + step) % ring_size]
+                if primary is None:
+                    if primary_load[node] < cap and (keep_primary is None or node in (keep_primary, added)):
+                        primary = node
+                        keep_backup = (old_backup if old_backup in alive and old_backup != primary
+                                       and backup_load[old_backup] < cap else None)
+                elif node != primary and backup_load[node] < cap and (keep_backup is None or
+                                                                      node in (keep_backup, added)):
+                    backup = node
+                    break
+            if backup is None:  # 容量不足以同时满足主备约束时（极端配置），备份退化为不同节点中负载最低者
+                backup = min((n for n in self.nodes if n != primary), key=lambda n: backup_load[n])
+            primary_load[primary] += 1
+            backup_load[backup] += 1
+            placement[shard_id] = (primary, backup)
+        self.assignment.clear()
+        self.assignment.update(placement)
+
+    def _replace(self, added: Optional[str] = None) -> List[ShardMove]:
+        old = dict(self.assignment)
+        self._place(added)
+        return [ShardMove(shard_id, *old[shard_id], *self.assignment[shard_id])
+                for shard_id in range(self.shard_num) if old[shard_id] != self.assignment[shard_id]]
+
+    def add_node(self, node_id: str) -> List[ShardMove]:
+        """加入节点，返回放置发生变化的分片列表"""
+        if node_id in self.nodes:
+            raise ValueError(f"Node {node_id} already in placement")
+        self._add_to_ring(node_id)
+        return self._replace(added=node_id)
+
+    def remove_node(self, node_id: str) -> List[ShardMove]:
+        """移除节点，返回放置发生变化的分片列表"""
+        if node_id not in self.nodes:
+            raise ValueError(f"Node {node_id} not in placement")
+        if len(self.nodes) <= 2:
+            raise ValueError("Shard placement needs at least 2 distinct nodes (primary and backup)")
+        self._remove_from_ring(node_id)
+        return self._replace()
+
+    def nodes_of(self, shard_id: int) -> Tuple[str, str]:
+        return self.assignment[shard_id]
+
+    def primary_counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(self.nodes, 0)
+        for primary, _ in self.assignment.values():
+            counts[primary] += 1
+        return counts
+
+    def balance(self) -> dict:
+        """放置均衡度：主分片与主+备份分片的 最大值/平均值"""
+        primary = self.primary_counts()
+        total = dict(primary)
+        for _, backup in self.assignment.values():
+            total[backup] += 1
+        mean = self.shard_num / len(self.nodes)
+        return {"nodes": len(self.nodes), "shards": self.shard_num,
+                "primary_max_over_mean": max(primary.values()) / mean,
+                "total_max_over_mean": max(total.values()) / (2 * mean)}
+
+
+def _random_placement_balance(node_ids: List[str], shard_num: int, rng: random.Random) -> float:
+    """对照：原随机主节点分配的 最大值/平均值"""
+    counts = dict.fromkeys(node_ids, 0)
+    for _ in range(shard_num):
+        counts[rng.choice(node_ids)] += 1
+    return max(counts.values()) / (shard_num / len(node_ids))
+
+
+def measure_balance(node_counts: Tuple[int, ...] = (3, 5, 8, 10, 16, 32, 64), shard_num: int = 1024,
+                    seed: int = 0) -> List[dict]:
+    """放置实验：各节点规模下的均衡度（对比随机分配），以及增删一个节点时迁移的分片比例（理想值约1/N）"""
+    rng = random.Random(seed)
+    results = []
+    for node_num in node_counts:
+        node_ids = [f"Node-{i + 1}" for i in range(node_num)]
+        placement = ShardPlacement(node_ids, shard_num)
+        result = placement.balance()
+        result["random_primary_max_over_mean"] = _random_placement_balance(node_ids, shard_num, rng)
+        moves = placement.add_node(f"Node-{node_num + 1}")
+        result["add_moved_fraction"] = len(moves) / shard_num
+        result["add_primary_moved_fraction"] = sum(m.old_primary != m.new_primary for m in moves) / shard_num
+        moves = placement.remove_node(f"Node-{node_num + 1}")
+        result["remove_moved_fraction"] = len(moves) / shard_num
+        result["ideal_fraction"] = 1 / (node_num + 1)
+        results.append(result)
+        print(f"[Placement] {node_num} nodes, {shard_num} shards: primary max/mean "
+              f"{result['primary_max_over_mean']:.2f} (random {result['random_primary_max_over_mean']:.2f}), "
+              f"primary+backup {result['total_max_over_mean']:.2f}; add node moves "
+              f"{result['add_primary_moved_fraction'] * 100:.1f}% primaries (ideal {result['ideal_fraction'] * 100:.1f}%), "
+              f"{result['add_moved_fraction'] * 100:.1f}% shards with primary or backup changed")
+    return results
+
+
+if __name__ == "__main__":
+    measure_balance()
\ No newline at end of file
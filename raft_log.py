@@ -0,0 +1,283 @@
+from common import MetaType, Metadata
+from metrics import registry as metrics
+from typing import List, Optional, Tuple
+import atexit
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import lz4.frame as lz4_frame  # 可选依赖：论文4.4节使用LZ4压缩
+except ImportError:
+    lz4_frame = None
+
+# 元数据增量编码：key长度(2B) + key + blob_id长度(2B) + blob_id + offset(8B) + 标志(1B) + 延迟范围(4B)
+META_DELTA_FIXED = struct.Struct(">QBf")
+# Raft日志条目头：索引(8B) + 压缩算法(1B) + 元数据条数(4B) + 原始长度(4B) + 压缩后长度(4B) + CRC32(4B)
+LOG_ENTRY_HEADER = struct.Struct(">QBIIII")
+
+CODEC_NONE, CODEC_ZLIB, CODEC_LZ4 = 0, 1, 2
+
+
+def encode_metadata_delta(meta: Metadata) -> bytes:
+    """元数据增量紧凑序列化（仅同步Raft所需字段，论文4.4节）"""
+    key = meta.key.encode("utf-8")
+    blob_id = meta.blob_id.encode("utf-8")
+    flags = (meta.meta_type.value << 1) | (1 if meta.is_validated else 0)
+    return b"".join((struct.pack(">H", len(key)), key, struct.pack(">H", len(blob_id)), blob_id,
+                     META_DELTA_FIXED.pack(meta.offset, flags, meta.delay_range)))
+
+
+def decode_metadata_deltas(payload: bytes) -> List[Metadata]:
+    """反序列化一个批次内的全部元数据增量（用于日志回放校验）"""
+    metas, pos = [], 0
+    while pos < len(payload):
+        key_len = struct.unpack_from(">H", payload, pos)[0]
+        key = payload[pos + 2:pos + 2 + key_len].decode("utf-8")
+        pos += 2 + key_len
+        blob_id_len = struct.unpack_from(">H", payload, pos)[0]
+        blob_id = payload[pos + 2:pos + 2 + blob_id_len].decode("utf-8")
+        pos += 2 + blob_id_len
+        offset, flags, delay_range = META_DELTA_FIXED.unpack_from(payload, pos)
+        pos += META_DELTA_FIXED.size
+        metas.append(Metadata(key=key, blob_id=blob_id, offset=offset, is_validated=bool(flags & 1),
+                              meta_type=MetaType(flags >> 1), delay_range=delay_range))
+    return metas
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_LZ4:
+        return lz4_frame.compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_LZ4:
+        return lz4_frame.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def default_codec() -> int:
+    """优先LZ4（已安装时），否则使用标准库zlib"""
+    return CODEC_LZ4 if lz4_frame is not None else CODEC_ZLIB
+
+
+class RaftLogStandIn:
+    """本地文件Raft日志替身：顺序追加压缩批次，每个批次一次fsync（组提交）
+
+    path为None时使用匿名临时文件（仍为真实文件与fsync，进程退出后自动删除）。
+    读取经pread进行（不移动共享文件位置），且只覆盖已fsync的批次，可与刷盘线程的追加并发。
+    """
+
+    def __init__(self, path: Optional[str] = None, sync: bool = True):
+        self.path = path
+        self.sync = sync
+        self._file = open(path, "ab+") if path else tempfile.TemporaryFile()
+        self._file.seek(0, os.SEEK_END)
+        self.next_index = 1
+        self._committed_end = 0  # 最后一个已落盘批次的结束偏移，读取不越过此处
+        if path:
+            self._recover()
+
+    def _recover(self):
+        """扫描已有日志，截断损坏或不完整的尾部批次（同快照日志），新批次接在最后一个有效批次之后"""
+        valid_end = 0
+        file_size = os.fstat(self._file.fileno()).st_size
+        for index, _, _, valid_end in self._read_batches(file_size):
+            self.next_index = index + 1
+        if valid_end < file_size:
+            self._file.truncate(valid_end)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+        self._committed_end = valid_end
+
+    def append_batch(self, codec: int, entry_count: int, raw: bytes, payload: bytes) -> int:
+        """追加一个批次并落盘，返回日志索引"""
+        index = self.next_index
+        header = LOG_ENTRY_HEADER.pack(index, codec, entry_count, len(raw), len(payload), zlib.crc32(payload))
+        self._file.write(header + payload)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self._committed_end += len(header) + len(payload)
+        self.next_index += 1
+        return index
+
+    def read_entries(self):
+        """顺序回放日志：逐批次返回(索引, 元数据列表)，只读到调用时已落盘的最后一个批次"""
+        for index, codec, payload, _ in self._read_batches(self._committed_end):
+            yield index, decode_metadata_deltas(_decompress(codec, payload))
+
+    def _read_batches(self, end: int):
+        """pread逐批次读取[0, end)：返回(索引, 压缩格式, 载荷, 批次结束偏移)，遇到截断或校验失败的批次即停止"""
+        fd = self._file.fileno()
+        offset = 0
+        while offset + LOG_ENTRY_HEADER.size <= end:
+            index, codec, _, _, payload_len, crc = LOG_ENTRY_HEADER.unpack(
+                os.pread(fd, LOG_ENTRY_HEADER.size, offset))
+            offset += LOG_ENTRY_HEADER.size
+            if offset + payload_len > end:
+                return
+            payload = os.pread(fd, payload_len, offset)
+            if len(payload) < payload_len or zlib.crc32(payload) != crc:
+                return
+            offset += payload_len
+            yield index, codec, payload, offset
+
+    def close(self):
+        self._file.close()
+
+
+class RaftSyncPipeline:
+    """增量Raft同步流水线（论文4.4节）：元数据增量缓冲，按条数或等待时长触发组提交
+
+    后台线程在缓冲达到batch_threshold或最早条目等待超过max_delay时刷盘；
+    close()（及进程退出时）强制刷出剩余条目，不足阈值的增量不会丢失。
+    """
+
+    def __init__(self, raft_log: Optional[RaftLogStandIn] = None, batch_threshold: int = 8,
+                 max_delay: float = 0.05, codec: Optional[int] = None):
+        self.raft_log = raft_log or RaftLogStandIn()
+        self.batch_threshold = batch_threshold
+        self.max_delay = max_delay  # 最长等待时间（秒）
+        self.codec = default_codec() if codec is None else codec
+        self._buffer: List[Tuple[bytes, float]] = []  # (编码后的增量, 入队时间)
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()  # 保证批次按入队顺序写入日志
+        self._closed = False
+        self.stats = {"entries": 0, "batches": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        self.commit_latencies: List[float] = []  # 每条增量从入队到fsync完成的耗时（秒）
+        self._flush_latency = metrics.histogram("raft_flush_seconds", "Raft group commit latency (serialize+fsync)")
+        self._commit_latency = metrics.histogram("raft_commit_seconds", "Raft delta latency from enqueue to fsync")
+        self._batch_entries = metrics.histogram("raft_batch_entries", "Metadata deltas per Raft batch", scale=1)
+        self._raw_bytes = metrics.counter("raft_raw_bytes_total", "Raft delta bytes before compression")
+        self._compressed_bytes = metrics.counter("raft_compressed_bytes_total", "Raft delta bytes after compression")
+        self._flusher = threading.Thread(target=self._flush_loop, name="raft-sync-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def append(self, meta: Metadata):
+        delta = encode_metadata_delta(meta)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Raft sync pipeline already closed")
+            self._buffer.append((delta, time.perf_counter()))
+            if len(self._buffer) >= self.batch_threshold:
+                self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._buffer) >= self.batch_threshold:
+                        break
+                    if self._buffer:
+                        wait = self._buffer[0][1] + self.max_delay - time.perf_counter()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """同步刷出当前缓冲：序列化→压缩→追加日志→fsync，返回提交的条数"""
+        with self._commit_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            raw = b"".join(delta for delta, _ in batch)
+            payload = _compress(self.codec, raw)
+            self.raft_log.append_batch(self.codec, len(batch), raw, payload)
+            committed = time.perf_counter()
+            self.commit_latencies.extend(committed - enqueued for _, enqueued in batch)
+            if metrics.enabled:
+                self._flush_latency.record(committed - start)
+                self._batch_entries.record(len(batch))
+                for _, enqueued in batch:
+                    self._commit_latency.record(committed - enqueued)
+                self._raw_bytes.inc(len(raw))
+                self._compressed_bytes.inc(len(payload))
+            self.stats["entries"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["raw_bytes"] += len(raw)
+            self.stats["compressed_bytes"] += len(payload)
+            return len(batch)
+
+    def close(self):
+        """停止后台线程并刷出剩余增量（关闭时必须落盘）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def report(self) -> dict:
+        latencies = sorted(self.commit_latencies)
+        raw, compressed = self.stats["raw_bytes"], self.stats["compressed_bytes"]
+        return dict(self.stats,
+                    compression_ratio=raw / compressed if compressed else 0.0,
+                    p50_ms=_percentile(latencies, 0.50) * 1e3,
+                    p99_ms=_percentile(latencies, 0.99) * 1e3,
+                    p999_ms=_percentile(latencies, 0.999) * 1e3)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def measure_group_commit(thresholds=(1, 8, 32, 128), entry_num: int = 20000, arrival_rate: Optional[float] = None,
+                         log_dir: Optional[str] = None) -> List[dict]:
+    """组提交实验：不同批量阈值下的压缩前后字节数、提交延迟分位数与吞吐（entries/s）
+
+    arrival_rate为None时生产者全速写入；否则按给定速率（entries/s）匀速到达。
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="gcsmartkv-raft-", dir=log_dir) as root:
+        for threshold in thresholds:
+            pipeline = RaftSyncPipeline(RaftLogStandIn(os.path.join(root, f"raft-{threshold}.log")),
+                                        batch_threshold=threshold)
+            start = time.perf_counter()
+            for i in range(entry_num):
+                if arrival_rate:
+                    ahead = start + i / arrival_rate - time.perf_counter()
+                    if ahead > 0.001:
+                        time.sleep(ahead)
+                pipeline.append(Metadata(key=f"key-{i:010d}", blob_id=f"Blob-{i % 50}-{i // 4096}",
+                                         offset=i * 84, is_validated=True, meta_type=MetaType.GC,
+                                         delay_range=0.4))
+            pipeline.close()
+            elapsed = time.perf_counter() - start
+            pipeline.raft_log.close()
+            report = dict(pipeline.report(), batch_threshold=threshold, entries_per_s=entry_num / elapsed)
+            results.append(report)
+            print(f"[Raft Group Commit] threshold={threshold}, rate={arrival_rate or 'max'}: {report['entries_per_s']:.0f} entries/s, "
+                  f"{report['batches']} fsyncs, {report['raw_bytes']}B→{report['compressed_bytes']}B "
+                  f"(ratio {report['compression_ratio']:.2f}), p50={report['p50_ms']:.2f}ms "
+                  f"p99={report['p99_ms']:.2f}ms p999={report['p999_ms']:.2f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    measure_group_commit()
+    measure_group_commit(entry_num=5000, arrival_rate=5000)
\ No newline at end of file
@@ -1,39 +1,93 @@
-from common import *
-import random
+from common import DEFAULT_SHARD_NUM, TaskStatus, BlobFile, GCTaskSnapshot, GCTask, Metadata
+from garbage_index import GarbageTracker
+from metrics import registry as metrics
+from placement import ShardPlacement, ShardMove
+from raft_log import RaftLogStandIn, RaftSyncPipeline
+from snapshot_journal import SnapshotJournal, RECORD_PROGRESS, RECORD_INTERRUPTED, RECORD_COMPLETED
 from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import time
 
 
 class ShardGCScheduler:
-    def __init__(self, node_ids: List[str], shard_num: int = DEFAULT_SHARD_NUM):
+    def __init__(self, node_ids: List[str], shard_num: int = DEFAULT_SHARD_NUM, raft_log_path: Optional[str] = None,
+                 snapshot_journal_path: Optional[str] = None):
         self.shard_num = shard_num
         # 分片-GC任务双射映射：shard_id → GCTask（论文4.2节核心）
         self.shard_gc_map: Dict[int, GCTask] = {}
-        # 主备分片映射：shard_id → (primary_node_id, backup_node_id)
-        self.shard_node_map: Dict[int, Tuple[str, str]] = self._init_shard_node_map(node_ids)
-        # 节点任务列表：node_id → List[GCTask]
-        self.node_tasks: Dict[str, List[GCTask]] = defaultdict(list)
-        # 增量Raft同步缓存（仅同步元数据增量，论文4.4节）
-        self.raft_sync_buffer: List[Metadata] = []
+        # 主备分片映射：shard_id → (primary_node_id, backup_node_id)，一致性哈希放置，增删节点时原地更新
+        self.placement = ShardPlacement(node_ids, shard_num)
+        self.shard_node_map: Dict[int, Tuple[str, str]] = self.placement.assignment
+        # 节点任务表：node_id → {task_id: GCTask}（插入有序，增删O(1)）
+        self.node_tasks: Dict[str, Dict[str, GCTask]] = defaultdict(dict)
+        self._last_task_ms: Dict[int, int] = {}
+        # 增量Raft同步流水线（仅同步元数据增量，论文4.4节）：按条数或等待时长组提交到本地日志；
+        # 首次添加元数据时才创建（日志文件、后台刷盘线程与退出钩子），不做Raft同步的调度器不占用这些资源
         self.raft_batch_threshold = 8  # 批量提交阈值（8个请求，论文4.4节）
+        self.raft_log_path = raft_log_path
+        self._raft_pipeline: Optional[RaftSyncPipeline] = None
+        # 断点快照日志（论文4.3节）：未配置路径时快照仅保存在内存
+        self.snapshot_journal = SnapshotJournal(snapshot_journal_path) if snapshot_journal_path else None
+        # 增量垃圾统计与GC候选分桶索引（论文5.2节）
+        self.garbage_tracker = GarbageTracker()
+        # 指标句柄在构造时创建，中断/完成路径上不再按名称查表
+        self._interrupts_total = metrics.counter("gc_interrupts_total", "GC task interrupts")
+        self._completed_total = metrics.counter("gc_tasks_completed_total", "Completed GC tasks")
 
-    def _init_shard_node_map(self, node_ids: List[str]) -> Dict[int, Tuple[str, str]]:
-        """初始化分片-节点映射（主备机制，论文4.2节）"""
-        shard_map = {}
-        for shard_id in range(self.shard_num):
-            # 随机分配主备节点（实际部署需按负载均衡）
-            primary = random.choice(node_ids)
-            backup = random.choice([n for n in node_ids if n != primary])
-            shard_map[shard_id] = (primary, backup)
-        return shard_map
-
-    def create_gc_task(self, blob: BlobFile) -> GCTask:
-        """创建GC任务，绑定分片（双射模型：1分片→1任务）"""
+    def add_node(self, node_id: str) -> List[ShardMove]:
+        """节点加入（论文5.9节扩展）：重新放置分片，返回放置变化的分片列表（约1/N）"""
+        moves = self.placement.add_node(node_id)
+        self._apply_moves(moves)
+        return moves
+
+    def remove_node(self, node_id: str) -> List[ShardMove]:
+        """节点下线：其上分片按一致性哈希迁往其余节点，未完成任务随分片迁移"""
+        moves = self.placement.remove_node(node_id)
+        self._apply_moves(moves)
+        return moves
+
+    def _apply_moves(self, moves: List[ShardMove]):
+        """未完成任务跟随分片的新主备节点（已完成任务保留在原节点的记录中）"""
+        for move in moves:
+            task = self.shard_gc_map.get(move.shard_id)
+            if task is None or task.status == TaskStatus.COMPLETED:
+                continue
+            self.node_tasks[task.primary_node_id].pop(task.task_id, None)
+            task.primary_node_id, task.backup_node_id = move.new_primary, move.new_backup
+            self.node_tasks[task.primary_node_id][task.task_id] = task
+        print(f"[Shard Placement] {len(moves)} shards moved: {[move.shard_id for move in moves]}")
+
+    def create_gc_task(self, blob: Optional[BlobFile] = None, shard_id: Optional[int] = None) -> Optional[GCTask]:
+        """创建GC任务，绑定分片（双射模型：1分片→1任务）
+
+        未指定blob时从候选索引选取垃圾比率最高的Blob（指定shard_id时限分片内，否则全局并跳过已有活跃任务的分片），
+        无候选返回None。
+        """
+        if blob is None:
+            blob = self.garbage_tracker.worst_blob(shard_id)
+            if blob is None:
+                return None
         shard_id = blob.shard_id
-        if shard_id in self.shard_gc_map and self.shard_gc_map[shard_id].status != GCTask.status.COMPLETED:
+        if shard_id in self.shard_gc_map and self.shard_gc_map[shard_id].status != TaskStatus.COMPLETED:
             raise ValueError(f"Shard {shard_id} already has an active GC task")
         
-        # 生成任务ID（分片ID+时间戳，确保唯一性）
-        task_id = f"GC-{shard_id}-{int(time.time() * 1000)}"
+        # 生成任务ID（分片ID+毫秒时间戳；同一分片同一毫秒内的后继任务顺延1ms，确保唯一性）
+        timestamp = max(int(time.time() * 1000), self._last_task_ms.get(shard_id, 0) + 1)
+        self._last_task_ms[shard_id] = timestamp
+        task_id = f"GC-{shard_id}-{timestamp}"
+        task = self._build_task(task_id, blob)
+        
+        # 绑定双射关系，候选Blob被领取后移出索引
+        self.garbage_tracker.claim(blob.blob_id)
+        self.garbage_tracker.mark_busy(blob.shard_id)
+        self.shard_gc_map[shard_id] = task
+        self.node_tasks[task.primary_node_id][task.task_id] = task
+        metrics.trace(task.task_id, "create", shard_id=shard_id, blob_id=blob.blob_id, garbage_ratio=blob.garbage_ratio)
+        return task
+
+    def _build_task(self, task_id: str, blob: BlobFile) -> GCTask:
+        """构建GC任务（按垃圾比率计算优先级权重），不绑定双射关系"""
+        shard_id = blob.shard_id
         primary_node, backup_node = self.shard_node_map[shard_id]
         
         # 计算任务优先级权重（论文4.5节：按垃圾比率分级）
@@ -51,39 +105,109 @@ class ShardGCScheduler:
             primary_node_id=primary_node,
             backup_node_id=backup_node,
             target_blob=blob,
-            status=GCTask.status.PENDING,
+            status=TaskStatus.PENDING,
             priority_weight=priority,
             garbage_ratio=blob.garbage_ratio
         )
-        
-        # 绑定双射关系
-        self.shard_gc_map[shard_id] = task
-        self.node_tasks[primary_node].append(task)
         return task
 
+    def recover_tasks(self, blobs: Dict[str, BlobFile]) -> List[GCTask]:
+        """启动恢复：扫描快照日志，重建每个未完成任务的断点（状态INTERRUPTED，论文4.3节）"""
+        if self.snapshot_journal is None:
+            return []
+        recovered = []
+        for record in self.snapshot_journal.recover().values():
+            blob = blobs.get(record.blob_id)
+            if blob is None or record.shard_id in self.shard_gc_map:
+                continue
+            task = self._build_task(record.task_id, blob)
+            task.current_snapshot = record.to_snapshot()
+            task.status = TaskStatus.INTERRUPTED
+            self.garbage_tracker.claim(blob.blob_id)
+            self.garbage_tracker.mark_busy(blob.shard_id)
+            self.shard_gc_map[task.shard_id] = task
+            self.node_tasks[task.primary_node_id][task.task_id] = task
+            metrics.trace(task.task_id, "create", shard_id=task.shard_id, blob_id=blob.blob_id,
+                          recovered_offset=record.processed_offset)
+            recovered.append(task)
+        return recovered
+
+    def adopt_task(self, task_id: str, blob: BlobFile, snapshot: GCTaskSnapshot, node_id: str) -> GCTask:
+        """接管其他节点移交的中断任务（跨进程主备切换）：按移交的快照重建任务，本节点成为主节点"""
+        if blob.blob_id not in self.garbage_tracker.blobs:
+            self.garbage_tracker.register_blob(blob)
+        task = self._build_task(task_id, blob)
+        if task.primary_node_id != node_id:
+            task.primary_node_id, task.backup_node_id = node_id, task.primary_node_id
+        task.current_snapshot = snapshot
+        task.status = TaskStatus.INTERRUPTED
+        self.garbage_tracker.claim(blob.blob_id)
+        self.garbage_tracker.mark_busy(blob.shard_id)
+        self.shard_gc_map[task.shard_id] = task
+        self.node_tasks[node_id][task_id] = task
+        metrics.trace(task_id, "handoff", node=node_id, offset=snapshot.processed_offset)
+        return task
+
+    def checkpoint_task(self, task: GCTask, processed_offset: int, running_checksum: int, metadata_updated: bool = False):
+        """运行中检查点（每个快照粒度一次）：更新内存快照并追加快照日志（批量fsync）"""
+        task.save_snapshot(processed_offset, f"{running_checksum:08x}", metadata_updated, interrupted=False)
+        if self.snapshot_journal:
+            self.snapshot_journal.append(task, RECORD_PROGRESS, processed_offset, running_checksum, metadata_updated)
+
     def interrupt_task(self, task: GCTask, processed_offset: int, valid_checksum: str, metadata_updated: bool):
-        """中断任务并保存快照（论文4.3节断点续跑）"""
+        """中断任务并保存快照（论文4.3节断点续跑），valid_checksum为累计CRC32的十六进制串"""
         task.save_snapshot(processed_offset, valid_checksum, metadata_updated)
-        # 切换到备份节点（主备接管）
+        if self.snapshot_journal:
+            self.snapshot_journal.append(task, RECORD_INTERRUPTED, processed_offset, int(valid_checksum, 16),
+                                         metadata_updated)
+        # 切换到备份节点（主备接管），备份节点成为新的主节点，再次中断时切回
         backup_node = task.backup_node_id
-        self.node_tasks[backup_node].append(task)
-        self.node_tasks[task.primary_node_id].remove(task)
+        self.node_tasks[backup_node][task.task_id] = task
+        del self.node_tasks[task.primary_node_id][task.task_id]
+        task.primary_node_id, task.backup_node_id = backup_node, task.primary_node_id
+        self._interrupts_total.inc()
+        metrics.trace(task.task_id, "interrupt", offset=processed_offset, failover_node=backup_node)
 
     def resume_task(self, task: GCTask) -> int:
         """恢复中断的任务（论文4.3节）"""
-        return task.resume_from_snapshot()
+        offset = task.resume_from_snapshot()
+        if offset:
+            metrics.trace(task.task_id, "resume", offset=offset)
+        return offset
+
+    def complete_task(self, task: GCTask, processed_offset: int, running_checksum: int):
+        """任务完成：记录完成日志（立即fsync），日志压缩时清除该任务的快照"""
+        task.status = TaskStatus.COMPLETED
+        self.garbage_tracker.mark_idle(task.shard_id)
+        self._completed_total.inc()
+        metrics.trace(task.task_id, "complete", offset=processed_offset)
+        if task.target_blob.blob_id in self.garbage_tracker.blobs:
+            self.garbage_tracker.unregister_blob(task.target_blob.blob_id)
+        if self.snapshot_journal:
+            self.snapshot_journal.append(task, RECORD_COMPLETED, processed_offset, running_checksum, True)
+
+    @property
+    def raft_pipeline(self) -> RaftSyncPipeline:
+        if self._raft_pipeline is None:
+            self._raft_pipeline = RaftSyncPipeline(RaftLogStandIn(self.raft_log_path),
+                                                   batch_threshold=self.raft_batch_threshold)
+        return self._raft_pipeline
 
     def add_raft_sync_metadata(self, meta: Metadata):
-        """添加元数据到Raft同步缓存（增量同步，论文4.4节）"""
-        self.raft_sync_buffer.append(meta)
-        # 达到批量阈值，触发同步
-        if len(self.raft_sync_buffer) >= self.raft_batch_threshold:
-            self._batch_sync_raft()
-
-    def _batch_sync_raft(self):
-        """批量Raft同步（模拟，实际需集成Raft库如etcdraft）"""
-        print(f"[Raft Sync] Batch sync {len(self.raft_sync_buffer)} metadata entries")
-        # 模拟压缩（LZ4，压缩比5:1，论文4.4节）
-        compressed_size = len(self.raft_sync_buffer) // 5
-        print(f"[Raft Sync] Original size: {len(self.raft_sync_buffer)}, Compressed size: {compressed_size}")
-        self.raft_sync_buffer.clear()
\ No newline at end of file
+        """添加元数据到Raft同步缓存（增量同步，论文4.4节），达到阈值或超时由后台线程组提交"""
+        self.raft_pipeline.append(meta)
+
+    def _batch_sync_raft(self) -> int:
+        """立即批量Raft同步：紧凑序列化+压缩（LZ4/zlib）后追加本地日志并fsync，返回同步条数
+
+        批次大小、压缩前后字节数与刷盘耗时记录在raft_*指标中。
+        """
+        return self._raft_pipeline.flush() if self._raft_pipeline is not None else 0
+
+    def close(self):
+        """关闭调度器：刷出剩余Raft增量并关闭日志"""
+        if self._raft_pipeline is not None:
+            self._raft_pipeline.close()
+            self._raft_pipeline.raft_log.close()
+        if self.snapshot_journal:
+            self.snapshot_journal.close()
\ No newline at end of file
@@ -0,0 +1,266 @@
+from common import BLOB_DEFAULT_SIZE, DEFAULT_SHARD_NUM, SNAPSHOT_GRANULARITY, TaskStatus, BlobFile, GCTask
+from fpga_pipeline import FPGADynamicPipeline
+from metrics import MetricsRegistry
+from mors_scheduler import GCTaskQueue
+from shard_gc_scheduler import ShardGCScheduler
+from heapq import heappush, heappop, heapreplace
+from typing import Callable, Dict, List, Optional, Tuple
+import itertools
+import math
+import random
+import time
+
+# 离散事件仿真（论文4.10节流水线、5.9节集群实验）：虚拟时钟 + 事件堆，
+# 服务台按FIFO递推（Lindley递推）计算开始/完成时刻，只有跨资源的交互（磁盘请求到达）才进入事件堆，
+# 每个1MB窗口约2个事件，1小时集群时间在单核上数秒内完成
+COMPUTE_PARALLELISM = 128  # 数据计算阶段并行度（论文4.10节：128路）
+DEFAULT_DISK_BANDWIDTH = 1000 * 1024 * 1024  # 每节点SSD/网络可用带宽1000MB/s
+DEFAULT_FPGA_SLOTS = 8  # 每节点FPGA可同时承载的GC任务数
+READ_AHEAD_WINDOWS = 4  # 每个GC任务在流水线中同时处理的窗口数上限
+FOREGROUND_OVERHEAD = 50e-6  # 前台写请求的固定开销（RPC+索引更新）50μs
+
+
+class Simulator:
+    """虚拟时钟 + 事件堆：事件为(时刻, 序号, 处理函数, 参数)，同一时刻按调度顺序执行"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.events_processed = 0
+        self._events: List[Tuple[float, int, Callable, object]] = []
+        self._seq = itertools.count()
+
+    def schedule(self, at: float, handler: Callable[[object], None], arg: object = None):
+        heappush(self._events, (at, next(self._seq), handler, arg))
+
+    def run(self, until: float):
+        events = self._events
+        while events and events[0][0] <= until:
+            self.now, _, handler, arg = heappop(events)
+            handler(arg)
+            self.events_processed += 1
+        self.now = until
+
+
+class FifoServer:
+    """k路并行FIFO服务台：请求按到达顺序占用最早空闲的服务单元，返回(开始时刻, 完成时刻)"""
+
+    def __init__(self, parallelism: int = 1):
+        self.parallelism = parallelism
+        self._free_at = [0.0] * parallelism  # k>1时为最小堆
+        self.busy_time = 0.0
+
+    def serve(self, arrival: float, service: float) -> Tuple[float, float]:
+        start = max(arrival, self._free_at[0])
+        done = start + service
+        if self.parallelism == 1:
+            self._free_at[0] = done
+        else:
+            heapreplace(self._free_at, done)
+        self.busy_time += service
+        return start, done
+
+    def utilization(self, elapsed: float) -> float:
+        return self.busy_time / (elapsed * self.parallelism) if elapsed else 0.0
+
+
+class SimNode:
+    """仿真节点：FPGA四阶段流水线（各阶段为FIFO服务台，数据计算128路并行）、共享磁盘带宽、GC任务队列"""
+
+    def __init__(self, node_id: str, stage_latency: Dict[str, float], bandwidth: float, fpga_slots: int):
+        self.node_id = node_id
+        self.stages = [(FifoServer(COMPUTE_PARALLELISM if stage == "data_compute" else 1), latency_ms / 1000)
+                       for stage, latency_ms in stage_latency.items()]
+        self.disk = FifoServer()
+        self.bandwidth = bandwidth
+        self.fpga_slots = fpga_slots
+        self.running = 0
+        self.queue = GCTaskQueue()
+
+
+class _RunningTask:
+    __slots__ = ("task", "node", "windows", "next_window", "written", "bytes")
+
+    def __init__(self, task: GCTask, node: SimNode, windows: int):
+        self.task = task
+        self.node = node
+        self.windows = windows
+        self.next_window = 0
+        self.written = 0
+        self.bytes = task.target_blob.size
+
+
+class ClusterSimulation:
+    """集群GC仿真：前台写入（泊松到达，组提交批次）与GC任务竞争各节点磁盘带宽
+
+    GC候选Blob按泊松过程封存（默认速率使GC回收量与前台写入产生的垃圾量相当），经ShardGCScheduler
+    绑定分片并放置到主节点，节点内按MORS收益排序、最多fpga_slots个任务并发；每个任务逐窗口
+    读盘 → 四阶段流水线 → 写回存活数据，相邻窗口与不同任务在流水线各阶段重叠执行。
+    """
+
+    def __init__(self, node_num: int = 5, shard_num: int = DEFAULT_SHARD_NUM, duration_s: float = 3600.0,
+                 foreground_rate: float = 100.0, foreground_bytes: int = 256 * 1024,
+                 bandwidth: float = DEFAULT_DISK_BANDWIDTH, fpga_slots: int = DEFAULT_FPGA_SLOTS,
+                 gc_task_rate: Optional[float] = None, garbage_range: Tuple[float, float] = (0.3, 0.9),
+                 blob_size: int = BLOB_DEFAULT_SIZE, window: int = SNAPSHOT_GRANULARITY, gc_enabled: bool = True,
+                 seed: int = 0):
+        self.sim = Simulator()
+        self.rng = random.Random(seed)
+        self.duration_s = duration_s
+        self.foreground_rate = foreground_rate
+        self.foreground_bytes = foreground_bytes
+        self.garbage_range = garbage_range
+        self.blob_size = blob_size
+        self.window = window
+        self.gc_enabled = gc_enabled
+        if gc_task_rate is None:
+            # 前台写入全部为覆盖写：单位时间产生的垃圾量 / 每个Blob的平均垃圾量
+            gc_task_rate = node_num * foreground_rate * foreground_bytes / (blob_size * sum(garbage_range) / 2)
+        self.gc_task_rate = gc_task_rate
+        node_ids = [f"Node-{i + 1}" for i in range(node_num)]
+        stage_latency = FPGADynamicPipeline().stage_latency
+        self.nodes = {node_id: SimNode(node_id, stage_latency, bandwidth, fpga_slots) for node_id in node_ids}
+        self.scheduler = ShardGCScheduler(node_ids, shard_num=shard_num)
+        self._blob_seq = itertools.count()
+        self._task_created: Dict[str, float] = {}
+        # 仿真统计使用独立注册表（虚拟时间，始终开启，不影响全局指标）
+        self.stats = MetricsRegistry(enabled=True)
+        self._fg_latency = self.stats.histogram("sim_foreground_write_seconds", "Simulated foreground write latency")
+        self._gc_latency = self.stats.histogram("sim_gc_task_seconds", "Simulated GC task latency (seal→complete)")
+        self._window_latency = self.stats.histogram("sim_gc_window_seconds", "Simulated window read→write-back latency")
+        self._tasks_done = 0
+        self._reclaimed = 0.0
+
+    # ---------------- 前台写入 ----------------
+
+    def _on_foreground(self, node: SimNode):
+        now = self.sim.now
+        _, done = node.disk.serve(now, self.foreground_bytes / node.bandwidth)
+        self._fg_latency.record(done - now + FOREGROUND_OVERHEAD)
+        self.sim.schedule(now + self.rng.expovariate(self.foreground_rate), self._on_foreground, node)
+
+    # ---------------- GC ----------------
+
+    def _on_blob_sealed(self, _):
+        now = self.sim.now
+        shard_id = self.rng.randrange(self.scheduler.shard_num)
+        blob = BlobFile(blob_id=f"Blob-{shard_id}-{next(self._blob_seq)}", shard_id=shard_id, size=self.blob_size,
+                        value_count=self.blob_size // 4096, garbage_ratio=self.rng.uniform(*self.garbage_range),
+                        create_time=now)
+        self.scheduler.garbage_tracker.register_blob(blob)
+        self._try_create(shard_id)
+        self.sim.schedule(now + self.rng.expovariate(self.gc_task_rate), self._on_blob_sealed)
+
+    def _try_create(self, shard_id: int):
+        """双射约束：分片上一任务完成后才创建下一个（取分片内垃圾比率最高的候选）"""
+        active = self.scheduler.shard_gc_map.get(shard_id)
+        if active is not None and active.status != TaskStatus.COMPLETED:
+            return
+        task = self.scheduler.create_gc_task(shard_id=shard_id)
+        if task is None:
+            return
+        self._task_created[task.task_id] = task.target_blob.create_time
+        node = self.nodes[task.primary_node_id]
+        node.queue.push(task)
+        self._dispatch(node)
+
+    def _dispatch(self, node: SimNode):
+        while node.running < node.fpga_slots and len(node.queue):
+            task = node.queue.pop()
+            task.status = TaskStatus.RUNNING
+            node.running += 1
+            self._issue_read(_RunningTask(task, node, math.ceil(task.target_blob.size / self.window)))
+
+    def _issue_read(self, running: _RunningTask):
+        now = self.sim.now
+        _, done = running.node.disk.serve(now, self.window / running.node.bandwidth)
+        self.sim.schedule(done, self._on_read_done, (running, now))
+
+    def _on_read_done(self, arg: Tuple[_RunningTask, float]):
+        running, issued = arg
+        t = self.sim.now
+        for server, service in running.node.stages:
+            _, t = server.serve(t, service)
+        self.sim.schedule(t, self._on_encoded, arg)
+        running.next_window += 1
+        self._read_ahead(running)
+
+    def _read_ahead(self, running: _RunningTask):
+        """预读下一窗口，与在途窗口的流水线处理重叠（在途窗口数不超过READ_AHEAD_WINDOWS）"""
+        if running.next_window < running.windows and running.next_window - running.written < READ_AHEAD_WINDOWS:
+            self._issue_read(running)
+
+    def _on_encoded(self, arg: Tuple[_RunningTask, float]):
+        running, issued = arg
+        node = running.node
+        live_bytes = self.window * (1.0 - running.task.garbage_ratio)
+        _, done = node.disk.serve(self.sim.now, live_bytes / node.bandwidth)
+        self._window_latency.record(done - issued)
+        running.written += 1
+        if running.written == running.windows:
+            self.sim.schedule(done, self._on_task_done, running)
+        else:
+            self._read_ahead(running)
+
+    def _on_task_done(self, running: _RunningTask):
+        task, node = running.task, running.node
+        self.scheduler.complete_task(task, running.bytes, 0)
+        self._gc_latency.record(self.sim.now - self._task_created.pop(task.task_id))
+        self._tasks_done += 1
+        self._reclaimed += running.bytes * task.garbage_ratio
+        node.running -= 1
+        self._try_create(task.shard_id)
+        self._dispatch(node)
+
+    # ---------------- 运行与报告 ----------------
+
+    def run(self) -> dict:
+        wall_start = time.perf_counter()
+        for node in self.nodes.values():
+            self.sim.schedule(self.rng.expovariate(self.foreground_rate), self._on_foreground, node)
+        if self.gc_enabled:
+            self.sim.schedule(self.rng.expovariate(self.gc_task_rate), self._on_blob_sealed)
+        self.sim.run(self.duration_s)
+        self.scheduler.close()
+        wall = time.perf_counter() - wall_start
+        elapsed = self.duration_s
+        fg, gc = self._fg_latency.summary(), self._gc_latency.summary()
+        return {
+            "sim_seconds": elapsed,
+            "wall_seconds": wall,
+            "events": self.sim.events_processed,
+            "foreground": {"writes_per_s": fg["count"] / elapsed,
+                           "mb_per_s": fg["count"] * self.foreground_bytes / elapsed / 2 ** 20,
+                           **{q: fg[q] * 1e3 for q in ("p50", "p99", "p999")}},
+            "gc": {"tasks_per_s": self._tasks_done / elapsed, "reclaimed_mb_per_s": self._reclaimed / elapsed / 2 ** 20,
+                   "backlog": len(self.scheduler.garbage_tracker),
+                   **{q: gc[q] * 1e3 for q in ("p50", "p99", "p999")},
+                   "window_p99": self._window_latency.percentile(0.99) * 1e3},
+            "disk_utilization": max(node.disk.utilization(elapsed) for node in self.nodes.values()),
+            "fpga_utilization": max(server.utilization(elapsed) for node in self.nodes.values()
+                                    for server, _ in node.stages),
+        }
+
+
+def measure_simulation(duration_s: float = 3600.0, node_num: int = 5, seed: int = 0) -> List[dict]:
+    """仿真实验：同一前台负载下关闭/开启GC，对比前台写延迟分布，并报告GC吞吐与任务延迟（延迟单位ms）"""
+    results = []
+    for gc_enabled in (False, True):
+        report = ClusterSimulation(node_num=node_num, duration_s=duration_s, gc_enabled=gc_enabled, seed=seed).run()
+        report["gc_enabled"] = gc_enabled
+        results.append(report)
+        fg, gc = report["foreground"], report["gc"]
+        print(f"[Simulation] {duration_s / 3600:.1f}h x {node_num} nodes, GC {'on' if gc_enabled else 'off'}: "
+              f"{report['events']} events in {report['wall_seconds']:.1f}s wall "
+              f"({duration_s / report['wall_seconds']:.0f}x real time)")
+        print(f"[Simulation]   foreground {fg['writes_per_s']:.0f} writes/s ({fg['mb_per_s']:.0f}MB/s): "
+              f"p50 {fg['p50']:.3f}ms, p99 {fg['p99']:.3f}ms, p999 {fg['p999']:.3f}ms; "
+              f"disk {report['disk_utilization'] * 100:.0f}%, FPGA stage {report['fpga_utilization'] * 100:.0f}%")
+        if gc_enabled:
+            print(f"[Simulation]   GC {gc['tasks_per_s']:.2f} tasks/s, reclaimed {gc['reclaimed_mb_per_s']:.1f}MB/s, "
+                  f"task latency p50 {gc['p50']:.0f}ms, p99 {gc['p99']:.0f}ms, p999 {gc['p999']:.0f}ms, "
+                  f"window p99 {gc['window_p99']:.1f}ms, backlog {gc['backlog']} blobs")
+    return results
+
+
+if __name__ == "__main__":
+    measure_simulation()
\ No newline at end of file
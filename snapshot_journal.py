@@ -0,0 +1,218 @@
+from common import BLOB_DEFAULT_SIZE, SNAPSHOT_GRANULARITY, GCTaskSnapshot, GCTask
+from typing import Dict, Optional
+from dataclasses import dataclass
+import os
+import struct
+import time
+import zlib
+
+# 快照日志记录（定长128B，论文4.3节断点续跑协议）：
+#   魔数(4B) + 记录类型(1B) + 元数据已更新(1B) + 保留(2B) + 分片ID(4B) + 已处理偏移(8B) + 序号(8B)
+#   + 快照时间(8B) + 累计校验和CRC32(4B) + 任务ID(32B) + BlobID(48B) + 保留(4B) + 记录CRC32(4B)
+JOURNAL_MAGIC = b"GCSJ"
+TASK_ID_WIDTH, BLOB_ID_WIDTH = 32, 48  # UTF-8编码后超出宽度的ID拒绝写入（截断会使恢复时对不上任务）
+JOURNAL_BODY = struct.Struct(f">4sBBHIQQdI{TASK_ID_WIDTH}s{BLOB_ID_WIDTH}s4x")
+JOURNAL_RECORD = struct.Struct(f">{JOURNAL_BODY.size}sI")
+JOURNAL_RECORD_SIZE = JOURNAL_RECORD.size  # 128B
+
+RECORD_PROGRESS, RECORD_INTERRUPTED, RECORD_COMPLETED = 1, 2, 3
+
+
+@dataclass
+class JournalRecord:
+    """快照日志中的一条记录"""
+    record_type: int
+    task_id: str
+    shard_id: int
+    blob_id: str
+    processed_offset: int
+    running_checksum: int  # 覆盖[数据起点, processed_offset)全部已处理字节的CRC32
+    metadata_updated: bool
+    sequence: int
+    snapshot_time: float
+
+    def to_snapshot(self) -> GCTaskSnapshot:
+        return GCTaskSnapshot(
+            task_id=self.task_id,
+            shard_id=self.shard_id,
+            blob_id=self.blob_id,
+            processed_offset=self.processed_offset,
+            valid_checksum=f"{self.running_checksum:08x}",
+            metadata_updated=self.metadata_updated,
+            snapshot_time=self.snapshot_time
+        )
+
+
+def _encode_id(kind: str, value: str, width: int) -> bytes:
+    encoded = value.encode("utf-8")
+    if len(encoded) > width:
+        raise ValueError(f"{kind} {value!r} is {len(encoded)}B, longer than the {width}B journal field")
+    return encoded
+
+
+def _pack_record(record: JournalRecord) -> bytes:
+    body = JOURNAL_BODY.pack(JOURNAL_MAGIC, record.record_type, int(record.metadata_updated), 0,
+                             record.shard_id, record.processed_offset, record.sequence, record.snapshot_time,
+                             record.running_checksum, _encode_id("Task ID", record.task_id, TASK_ID_WIDTH),
+                             _encode_id("Blob ID", record.blob_id, BLOB_ID_WIDTH))
+    return JOURNAL_RECORD.pack(body, zlib.crc32(body))
+
+
+def _unpack_record(data: bytes) -> Optional[JournalRecord]:
+    body, crc = JOURNAL_RECORD.unpack(data)
+    if zlib.crc32(body) != crc:
+        return None
+    (magic, record_type, metadata_updated, _, shard_id, processed_offset, sequence, snapshot_time,
+     running_checksum, task_id, blob_id) = JOURNAL_BODY.unpack(body)
+    if magic != JOURNAL_MAGIC:
+        return None
+    return JournalRecord(record_type, task_id.rstrip(b"\x00").decode("utf-8"), shard_id,
+                         blob_id.rstrip(b"\x00").decode("utf-8"), processed_offset, running_checksum,
+                         bool(metadata_updated), sequence, snapshot_time)
+
+
+class SnapshotJournal:
+    """崩溃安全的GC快照日志：每个1MB步骤追加一条定长记录，批量fsync
+
+    - 进度记录（RECORD_PROGRESS）每sync_every条fsync一次，崩溃最多丢失最近一批，
+      恢复时退回到更早但仍一致的断点（偏移与累计校验和成对落盘）；
+    - 中断/完成记录立即fsync；
+    - 完成任务累计达到compact_threshold后压缩日志，仅保留未完成任务的最新记录。
+    """
+
+    def __init__(self, path: str, sync_every: int = 16, compact_threshold: int = 64):
+        self.path = path
+        self.sync_every = sync_every
+        self.compact_threshold = compact_threshold
+        self._latest: Dict[str, JournalRecord] = {}  # 未完成任务的最新记录
+        self._completed_since_compact = 0
+        self._unsynced = 0
+        self._sequence = 0
+        self.stats = {"records": 0, "fsyncs": 0, "compactions": 0}
+        self._load()
+        self._file = open(path, "ab")
+
+    def _load(self):
+        """扫描已有日志，截断损坏或不完整的尾部记录"""
+        if not os.path.exists(self.path):
+            return
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            while True:
+                data = f.read(JOURNAL_RECORD_SIZE)
+                if len(data) < JOURNAL_RECORD_SIZE:
+                    break
+                record = _unpack_record(data)
+                if record is None:
+                    break
+                valid_end += JOURNAL_RECORD_SIZE
+                self._sequence = max(self._sequence, record.sequence)
+                if record.record_type == RECORD_COMPLETED:
+                    self._latest.pop(record.task_id, None)
+                    self._completed_since_compact += 1
+                else:
+                    self._latest[record.task_id] = record
+        if valid_end < os.path.getsize(self.path):
+            os.truncate(self.path, valid_end)
+
+    def append(self, task: GCTask, record_type: int, processed_offset: int, running_checksum: int,
+               metadata_updated: bool = False):
+        """追加一条记录；中断/完成记录立即落盘，进度记录批量落盘"""
+        record = JournalRecord(record_type, task.task_id, task.shard_id, task.target_blob.blob_id,
+                               processed_offset, running_checksum, metadata_updated, self._sequence + 1, time.time())
+        self._file.write(_pack_record(record))
+        self._sequence += 1
+        self.stats["records"] += 1
+        self._unsynced += 1
+        if record_type == RECORD_COMPLETED:
+            self._latest.pop(task.task_id, None)
+            self._completed_since_compact += 1
+        else:
+            self._latest[task.task_id] = record
+        if record_type != RECORD_PROGRESS or self._unsynced >= self.sync_every:
+            self.sync()
+        if self._completed_since_compact >= self.compact_threshold:
+            self.compact()
+
+    def sync(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self.stats["fsyncs"] += 1
+
+    def recover(self) -> Dict[str, JournalRecord]:
+        """返回全部未完成任务（task_id → 最新记录），用于启动时重建INTERRUPTED任务的断点"""
+        return dict(self._latest)
+
+    def compact(self):
+        """压缩：临时文件写入未完成任务的最新记录，fsync后原子替换原日志"""
+        self.sync()
+        self._file.close()
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "wb") as f:
+            for record in sorted(self._latest.values(), key=lambda r: r.sequence):
+                f.write(_pack_record(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "ab")
+        self._completed_since_compact = 0
+        self.stats["compactions"] += 1
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+def measure_snapshot_overhead(blob_num: int = 8, value_size: int = 80, sync_every: int = 16) -> dict:
+    """快照开销实验：同一批32MB Blob在有/无快照日志时的GC耗时，以及每MB快照开销"""
+    import contextlib
+    import io
+    import tempfile
+    from blob_store import BlobStore
+    from gc_executor import GCExecutor
+    from mors_scheduler import MORSScheduler
+    from shard_gc_scheduler import ShardGCScheduler
+    node_ids = ["Node-1", "Node-2", "Node-3"]
+    with tempfile.TemporaryDirectory(prefix="gcsmartkv-journal-") as root:
+        blob_store = BlobStore(root)
+        value = b"v" * value_size
+        value_count = (BLOB_DEFAULT_SIZE - 4096) // (value_size + 4)
+        blobs = [blob_store.write_blob(i, f"Blob-{i}", (value for _ in range(value_count)), garbage_ratio=0.5)
+                 for i in range(blob_num)]
+        elapsed = {}
+        for mode in ("none", "journal", "none", "journal"):
+            journal_path = os.path.join(root, f"snapshot-{time.time_ns()}.journal") if mode == "journal" else None
+            shard_scheduler = ShardGCScheduler(node_ids, shard_num=blob_num, snapshot_journal_path=journal_path)
+            if journal_path:
+                shard_scheduler.snapshot_journal.sync_every = sync_every
+            executor = GCExecutor(shard_scheduler, MORSScheduler(node_ids), blob_store, max_workers=1)
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = executor.run(blobs)
+            shard_scheduler.close()
+            elapsed[mode] = min(elapsed.get(mode, float("inf")), report["elapsed_s"])
+        # 单独测量追加开销：每条记录（对应1MB）的平均耗时
+        journal = SnapshotJournal(os.path.join(root, "micro.journal"), sync_every=sync_every)
+        task = GCTask(task_id="GC-0-0", shard_id=0, primary_node_id=node_ids[0], backup_node_id=node_ids[1],
+                      target_blob=blobs[0])
+        start = time.perf_counter()
+        for i in range(4096):
+            journal.append(task, RECORD_PROGRESS, i * SNAPSHOT_GRANULARITY, i)
+        per_record = (time.perf_counter() - start) / 4096
+        journal.close()
+    mb = blob_num * BLOB_DEFAULT_SIZE / SNAPSHOT_GRANULARITY
+    result = {
+        "gc_ms_per_mb": elapsed["none"] / mb * 1e3,
+        "journal_us_per_mb": per_record * 1e6,
+        "overhead_pct": per_record / (elapsed["none"] / mb) * 100,
+        "end_to_end_overhead_pct": (elapsed["journal"] - elapsed["none"]) / elapsed["none"] * 100,
+    }
+    print(f"[Snapshot Journal] GC {result['gc_ms_per_mb']:.2f}ms/MB, journal {result['journal_us_per_mb']:.1f}us/MB "
+          f"({result['overhead_pct']:.2f}%), end-to-end {result['end_to_end_overhead_pct']:+.2f}%")
+    return result
+
+
+if __name__ == "__main__":
+    measure_snapshot_overhead()
\ No newline at end of file
@@ -0,0 +1,17 @@
+from blob_store import BlobStore, RECORD_HEADER
+import pytest
+
+
+def test_iter_windows_rejects_record_past_data_end(tmp_path):
+    blob_store = BlobStore(str(tmp_path))
+    blob = blob_store.write_blob(0, "Blob-0-0", (b"v" * 100 for _ in range(10)))
+    with blob_store.open_blob(blob) as mapped_blob:
+        last = list(mapped_blob.iter_windows())[-1]
+        corrupt_at = last.offset + last.record_offsets[-2]
+    # 最后一条记录的长度头越过数据区末尾
+    with open(blob.path, "r+b") as f:
+        f.seek(corrupt_at)
+        f.write(RECORD_HEADER.pack(10 * 1024))
+    with blob_store.open_blob(blob) as mapped_blob:
+        with pytest.raises(ValueError):
+            list(mapped_blob.iter_windows())
\ No newline at end of file
@@ -0,0 +1,86 @@
+from blob_store import BlobStore, BLOB_HEADER_SIZE, MappedBlob
+from checksum import CRC32, ChecksumEngine, combine_checksums, chunk_checksums, parallel_checksum, verify_blob
+from common import SNAPSHOT_GRANULARITY
+import os
+import zlib
+
+
+class _BitwiseCrc32cEngine(ChecksumEngine):
+    """逐位计算的CRC32C（仅用于测试合并算子对其他多项式同样成立）"""
+    name = "crc32c-bitwise"
+    combinable = True
+    poly = 0x82F63B78
+
+    def update(self, data, value: int = 0) -> int:
+        crc = value ^ 0xFFFFFFFF
+        for byte in bytes(data):
+            crc ^= byte
+            for _ in range(8):
+                crc = (crc >> 1) ^ self.poly if crc & 1 else crc >> 1
+        return crc ^ 0xFFFFFFFF
+
+
+class _ChainedAdlerEngine(ChecksumEngine):
+    """以前序结果为种子链式计算的不可合并引擎（同xxHash32的用法）"""
+    name = "adler-chained"
+
+    def update(self, data, value: int = 0) -> int:
+        return zlib.adler32(data, value ^ 0x5A5A)
+
+
+def test_combined_crc_equals_whole_crc():
+    data = os.urandom(3 * 1024 * 1024 + 12345)
+    expected = zlib.crc32(data)
+    for chunk_size in (4096, 65536 + 7, 1 << 20):
+        assert combine_checksums(chunk_checksums(data, chunk_size=chunk_size, workers=4)) == expected
+    assert combine_checksums(chunk_checksums(data[:5000], chunk_size=1, workers=1)) == zlib.crc32(data[:5000])
+    # 接续前序数据的结果
+    prefix = zlib.crc32(data[:1000])
+    assert parallel_checksum(data[1000:], value=prefix, chunk_size=100000, workers=2) == expected
+    assert CRC32.combine(expected, zlib.crc32(b""), 0) == expected
+
+
+def test_combine_holds_for_crc32c_polynomial():
+    engine = _BitwiseCrc32cEngine()
+    data = os.urandom(3000)
+    assert engine.update(b"123456789") == 0xE3069283
+    chunks = chunk_checksums(data, engine, chunk_size=777, workers=1)
+    assert combine_checksums(chunks, engine) == engine.update(data)
+
+
+def _window_checksum(path, engine):
+    """按GC扫描的快照窗口链式计算数据区的校验和，返回(校验和, 各窗口结束偏移)"""
+    running, ends = 0, []
+    with MappedBlob(path) as mapped_blob:
+        for window in mapped_blob.iter_windows(BLOB_HEADER_SIZE, SNAPSHOT_GRANULARITY):
+            running = engine.update(window.view, running)
+            ends.append(window.end)
+    return running, ends
+
+
+def test_verify_blob_with_combinable_engine(tmp_path):
+    # 约2.5个快照窗口的数据
+    blob = BlobStore(str(tmp_path)).write_blob(0, "Blob-0-0", (os.urandom(1000) for _ in range(2600)))
+    running, ends = _window_checksum(blob.path, CRC32)
+    assert verify_blob(blob.path, running, BLOB_HEADER_SIZE, ends[-1], workers=4)
+    assert not verify_blob(blob.path, running ^ 1, BLOB_HEADER_SIZE, ends[-1], workers=4)
+
+
+def test_verify_blob_replays_windows_for_non_combinable_engine(tmp_path):
+    engine = _ChainedAdlerEngine()
+    blob = BlobStore(str(tmp_path)).write_blob(0, "Blob-0-0", (os.urandom(1000) for _ in range(2600)))
+    running, ends = _window_checksum(blob.path, engine)
+    assert len(ends) == 3
+    # 链式结果依赖分段边界：对整个数据区一次计算的结果不同，只能逐窗重算
+    with open(blob.path, "rb") as f:
+        data = f.read()[BLOB_HEADER_SIZE:ends[-1]]
+    assert engine.update(data) != running
+    assert verify_blob(blob.path, running, BLOB_HEADER_SIZE, ends[-1], engine)
+    assert verify_blob(blob.path, running, BLOB_HEADER_SIZE, None, engine)
+    assert not verify_blob(blob.path, running ^ 1, BLOB_HEADER_SIZE, ends[-1], engine)
+    # 只校验前两个窗口（GC任务在此处完成时的累计结果）
+    with MappedBlob(blob.path) as mapped_blob:
+        windows = mapped_blob.iter_windows(BLOB_HEADER_SIZE, SNAPSHOT_GRANULARITY)
+        partial = engine.update(next(windows).view)
+        partial = engine.update(next(windows).view, partial)
+    assert verify_blob(blob.path, partial, BLOB_HEADER_SIZE, ends[1], engine)
\ No newline at end of file
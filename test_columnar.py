@@ -0,0 +1,19 @@
+from columnar import KEY_WIDTH, MetadataTable
+import pytest
+
+
+def test_append_rejects_keys_longer_than_key_width():
+    table = MetadataTable()
+    with pytest.raises(ValueError):
+        table.append(["user0", "k" * (KEY_WIDTH + 1)], ["Blob-0-0", "Blob-0-0"], [0, 84])
+    # 多字节字符按UTF-8字节数计算：9个汉字为27字节
+    with pytest.raises(ValueError):
+        table.append(["键" * 9], ["Blob-0-0"], [0])
+    assert len(table) == 0
+
+
+def test_append_encodes_non_ascii_keys_as_utf8():
+    table = MetadataTable()
+    keys = ["user0", "ключ-7", "键" * (KEY_WIDTH // 3), b"raw-bytes"]
+    table.append(keys, ["Blob-0-0"] * len(keys), [0, 84, 168, 252])
+    assert [meta.key for meta in table.rows()] == ["user0", "ключ-7", "键" * (KEY_WIDTH // 3), "raw-bytes"]
\ No newline at end of file
@@ -0,0 +1,88 @@
+from common import BLOB_DEFAULT_SIZE, BlobFile
+from blob_store import BlobStore, BLOB_HEADER_SIZE, RECORD_HEADER, RECORD_HEADER_SIZE
+from compaction import LIVE_CHECK_BATCH, Compactor
+from key_index import KeyIndex
+import errno
+import os
+import threading
+
+
+def _write_live_blob(root: str, record_num: int, value_size: int, capacity: int = BLOB_DEFAULT_SIZE):
+    """写一个全部记录均存活的Blob，返回(BlobStore, KeyIndex, Blob, (Key, 偏移)目录, 期望Value)"""
+    blob_store = BlobStore(root)
+    key_index = KeyIndex()
+    entries, expected = [], {}
+    with blob_store.create_blob(0, "Blob-0-0", capacity) as writer:
+        for n in range(record_num):
+            key = f"user{n:019d}"
+            value = key.encode("utf-8").ljust(value_size, b"v")
+            offset = writer.append(value)
+            entries.append((key, offset))
+            expected[key] = value
+            key_index.put(key, "Blob-0-0", offset)
+    blob = BlobFile(blob_id="Blob-0-0", shard_id=0, value_count=record_num, path=writer.path)
+    return blob_store, key_index, blob, entries, expected
+
+
+def _assert_readable(blob_store: BlobStore, key_index: KeyIndex, expected: dict):
+    for key, value in expected.items():
+        blob_id, offset = key_index.get(key)
+        with open(blob_store.blob_path(0, blob_id), "rb") as f:
+            f.seek(offset)
+            size = RECORD_HEADER.unpack(f.read(RECORD_HEADER_SIZE))[0]
+            assert f.read(size) == value, key
+
+
+def test_buffered_copy_splits_runs_longer_than_buffer(tmp_path):
+    # 2000×1KB连续存活记录（约2MB）> 1MB缓冲，且不走copy_file_range
+    blob_store, key_index, blob, entries, expected = _write_live_blob(str(tmp_path), 2000, 1024)
+    compactor = Compactor(blob_store, key_index, lambda b: entries, buffer_size=1024 * 1024,
+                          copy_range_min=float("inf"))
+    result = compactor.compact(blob)
+    assert result.live_records == result.remapped == 2000
+    assert result.rewritten_bytes == result.victim_bytes
+    assert not os.path.exists(blob.path)
+    _assert_readable(blob_store, key_index, expected)
+
+
+def test_copy_records_falls_back_on_exdev(tmp_path, monkeypatch):
+    blob_store, key_index, blob, entries, expected = _write_live_blob(str(tmp_path), 500, 1024)
+
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    compactor = Compactor(blob_store, key_index, lambda b: entries, copy_range_min=64 * 1024)
+    result = compactor.compact(blob)
+    assert result.range_copied_bytes == result.victim_bytes
+    _assert_readable(blob_store, key_index, expected)
+
+def test_live_check_releases_lock_between_batches(tmp_path):
+    blob_store, key_index, blob, entries, expected = _write_live_blob(str(tmp_path), 3 * LIVE_CHECK_BATCH, 16)
+
+    class CountingLock:
+        def __init__(self):
+            self.lock, self.acquired = threading.Lock(), 0
+
+        def __enter__(self):
+            self.lock.acquire()
+            self.acquired += 1
+
+        def __exit__(self, *exc):
+            self.lock.release()
+
+    lock = CountingLock()
+    compactor = Compactor(blob_store, key_index, lambda b: entries, lock=lock)
+    assert len(compactor._live_records(blob)) == 3 * LIVE_CHECK_BATCH
+    assert lock.acquired == 1 + 3  # 目录快照 + 每批一次
+
+def test_new_blob_is_sized_to_live_bytes_of_a_larger_source(tmp_path):
+    # 源Blob容量大于默认容量，且存活数据超过默认容量
+    record_num = BLOB_DEFAULT_SIZE // 1024 + 1024
+    blob_store, key_index, blob, entries, expected = _write_live_blob(str(tmp_path), record_num, 1020,
+                                                                      capacity=2 * BLOB_DEFAULT_SIZE)
+    result = Compactor(blob_store, key_index, lambda b: entries).compact(blob)
+    assert result.remapped == record_num
+    assert result.new_blob.size == BLOB_HEADER_SIZE + result.rewritten_bytes > BLOB_DEFAULT_SIZE
+    assert os.path.getsize(result.new_blob.path) == result.new_blob.size
+    _assert_readable(blob_store, key_index, expected)
\ No newline at end of file
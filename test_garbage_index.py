@@ -0,0 +1,31 @@
+from blob_store import BlobStore, BLOB_HEADER_SIZE, RECORD_HEADER
+from garbage_index import garbage_bucket
+from kv_engine import KVEngine
+
+
+def test_overwrite_moves_sealed_blob_to_higher_bucket(tmp_path):
+    value_size = 1000
+    # 每个Blob恰好容纳10条记录，写入20个Key后第一个Blob已封存
+    capacity = BLOB_HEADER_SIZE + 10 * (RECORD_HEADER.size + value_size)
+    with KVEngine(BlobStore(str(tmp_path)), shard_num=1, blob_capacity=capacity) as engine:
+        keys = [f"user{n:019d}" for n in range(20)]
+        for key in keys:
+            engine.put(key, b"v" * value_size)
+        tracker = engine.garbage_tracker
+        sealed = tracker.worst_blob(0)
+        assert sealed is not None and sealed is not engine.active[0]
+        assert garbage_bucket(sealed.garbage_ratio) == 0
+        # 覆盖写第一个Blob中的一半Key：旧版本失效，该Blob移入50%的桶
+        for key in keys[:5]:
+            engine.put(key, b"w" * value_size)
+        assert tracker.worst_blob(0) is sealed
+        assert tracker.live[sealed.blob_id] == 5
+        assert garbage_bucket(sealed.garbage_ratio) == garbage_bucket(0.5)
+        # 删除同样使旧版本失效
+        engine.delete(keys[5])
+        assert garbage_bucket(sealed.garbage_ratio) == garbage_bucket(0.6)
+        results = engine.collect_garbage(min_garbage_ratio=0.5)
+        assert [result.victim_id for result in results] == [sealed.blob_id]
+        assert sealed.blob_id not in tracker.blobs
+        for key in keys[6:]:
+            assert engine.get(key) == b"v" * value_size
\ No newline at end of file
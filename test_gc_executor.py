@@ -0,0 +1,45 @@
+from blob_store import BlobStore
+from gc_executor import GCExecutor
+from mors_scheduler import MORSScheduler
+from shard_gc_scheduler import ShardGCScheduler
+import threading
+import pytest
+
+NODE_IDS = ["Node-1", "Node-2", "Node-3"]
+
+
+def _saturated_executor(root, park_timeout_s):
+    blob_store = BlobStore(str(root))
+    blobs = [blob_store.write_blob(shard, f"Blob-{shard}-0", (b"v" * 100 for _ in range(100)), garbage_ratio=0.5)
+             for shard in range(2)]
+    mors = MORSScheduler(NODE_IDS)
+    # 外部负载占满全部节点：所有任务都无法准入
+    for node_id in NODE_IDS:
+        mors.observe(node_id, 100.0, 100.0, now=0.0)
+    executor = GCExecutor(ShardGCScheduler(NODE_IDS, shard_num=2), mors, blob_store, max_workers=2,
+                          park_timeout_s=park_timeout_s)
+    return executor, blobs
+
+
+def test_parked_tasks_dispatch_after_telemetry_recovers(tmp_path):
+    executor, blobs = _saturated_executor(tmp_path, park_timeout_s=30.0)
+
+    def recover():
+        with executor.lock:
+            for node_id in NODE_IDS:
+                executor.mors_scheduler.observe(node_id, 10.0, 10.0, now=1e6)
+
+    timer = threading.Timer(0.1, recover)
+    timer.start()
+    try:
+        report = executor.run(blobs)
+    finally:
+        timer.cancel()
+    assert report["blobs"] == 2
+    assert report["park_waits"] > 0
+
+
+def test_parked_tasks_raise_after_deadline(tmp_path):
+    executor, blobs = _saturated_executor(tmp_path, park_timeout_s=0.05)
+    with pytest.raises(RuntimeError):
+        executor.run(blobs)
\ No newline at end of file
@@ -0,0 +1,72 @@
+from common import Metadata
+from key_index import BloomFilter, KeyIndex, SortedRun
+import random
+
+
+def _key(n: int) -> str:
+    return f"user{n:019d}"
+
+
+def test_lookups_span_memtable_and_sorted_runs():
+    index = KeyIndex(memtable_limit=100, max_runs=8, block_size=16)
+    for n in range(350):
+        index.put(_key(n), f"Blob-0-{n // 100}", n)
+    assert len(index.runs) == 3 and len(index.memtable) == 50
+    # 较新的段覆盖较旧的段
+    index.put(_key(10), "Blob-0-new", 7)
+    index.flush()
+    for n in range(350):
+        expected = ("Blob-0-new", 7) if n == 10 else (f"Blob-0-{n // 100}", n)
+        assert index.get(_key(n)) == expected
+    assert index.get(_key(350)) is None
+    assert index.get("a") is None  # 小于全部fence key
+
+
+def test_tombstones_hide_older_versions_and_are_dropped_on_compaction():
+    index = KeyIndex(memtable_limit=50, max_runs=2, block_size=8)
+    for n in range(100):
+        index.put(_key(n), "Blob-0-0", n)
+    for n in range(0, 100, 3):
+        index.delete(_key(n))
+    assert index.get(_key(0)) is None and index.get(_key(1)) == ("Blob-0-0", 1)
+    index.flush()
+    index.compact()
+    assert len(index.runs) == 1
+    assert len(index.runs[0]) == 100 - len(range(0, 100, 3))
+    for n in range(100):
+        assert index.get(_key(n)) == (None if n % 3 == 0 else ("Blob-0-0", n))
+    # 删除后重新写入
+    index.put(_key(0), "Blob-0-1", 5)
+    assert index.get(_key(0)) == ("Blob-0-1", 5)
+
+
+def test_remap_moves_keys_and_invalidates_old_metadata():
+    index = KeyIndex(memtable_limit=64)
+    index.bulk_load([_key(n) for n in range(200)], ["Blob-0-0"] * 200, range(200))
+    stale = Metadata(key=_key(5), blob_id="Blob-0-0", offset=5, is_validated=False)
+    assert index.is_live(stale)
+    keys = [_key(n) for n in range(0, 200, 2)]
+    index.remap(keys, ["Blob-0-gc1"] * len(keys), [n * 10 for n in range(len(keys))])
+    assert index.get(_key(4)) == ("Blob-0-gc1", 20)
+    assert index.get(_key(5)) == ("Blob-0-0", 5)
+    assert index.is_live(stale)
+    index.remap([_key(5)], ["Blob-0-gc2"], [0])
+    assert not index.is_live(stale)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    rng = random.Random(0)
+    keys = [f"key-{rng.getrandbits(64):016x}" for _ in range(5000)]
+    bloom = BloomFilter(keys, bits_per_key=10)
+    assert all(bloom.may_contain(key) for key in keys)
+    # 误判率应接近10 bits/key的理论值（约1%）
+    false_positives = sum(bloom.may_contain(f"absent-{n}") for n in range(10000))
+    assert false_positives < 300
+
+
+def test_sorted_run_find_reports_block_and_miss():
+    keys = [_key(n) for n in range(0, 200, 2)]
+    run = SortedRun(0, keys, ["Blob-0-0"] * len(keys), list(range(len(keys))), block_size=10)
+    assert run.find(_key(42)) == (2, 21)
+    assert run.find(_key(43)) == (2, -1)
+    assert run.find("a") == (-1, -1)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from blob_store import BlobStore
+from kv_engine import KVEngine, MAX_READ_RETRIES
+
+
+def test_get_never_returns_superseded_value_after_stale_retries(tmp_path):
+    with KVEngine(BlobStore(str(tmp_path)), shard_num=1) as engine:
+        engine.put("user0", b"old")
+        old_location = engine.key_index.get("user0")
+        engine.put("user0", b"new")
+        # 缓存中残留旧版本且失效不生效，读时验证每次都判定过期
+        engine.cache.put("user0", (*old_location, b"old"))
+        engine.cache.invalidate = lambda key: None
+        engine.key_index.is_live = lambda meta: False
+        # 重试耗尽后持锁解析并读取，返回最新值
+        assert engine.get("user0") == b"new"
+        assert engine.stats["stale_reads"] == MAX_READ_RETRIES
\ No newline at end of file
@@ -0,0 +1,65 @@
+from common import BlobFile, GCTask
+from mors_scheduler import GCTaskQueue, IndexedTaskHeap
+import random
+
+
+def _task(index: int, garbage_ratio: float = 0.0) -> GCTask:
+    return GCTask(task_id=f"GC-{index}-0", shard_id=index, primary_node_id="Node-1", backup_node_id="Node-2",
+                  target_blob=BlobFile(blob_id=f"Blob-{index}-0", shard_id=index), priority_weight=1.0,
+                  garbage_ratio=garbage_ratio)
+
+
+def _drain(heap: IndexedTaskHeap):
+    order = []
+    while len(heap):
+        order.append(heap.pop().task_id)
+    return order
+
+
+def test_heap_update_and_middle_remove_keep_order():
+    rng = random.Random(0)
+    heap = IndexedTaskHeap()
+    profits = {}
+    tasks = [_task(i) for i in range(200)]
+    for task in tasks:
+        profits[task.task_id] = rng.random()
+        heap.push(task, profits[task.task_id])
+    # 调高、调低收益，并撤销位于堆中部的任务
+    for task in rng.sample(tasks, 80):
+        profits[task.task_id] = rng.random()
+        heap.update(task.task_id, profits[task.task_id])
+    middle = [heap._heap[i][2] for i in range(len(heap) // 3, len(heap) // 3 + 20)]
+    for task in middle:
+        assert heap.remove(task.task_id) is task
+        del profits[task.task_id]
+    assert heap.remove(middle[0].task_id) is None
+    assert all(heap._pos[entry[2].task_id] == i for i, entry in enumerate(heap._heap))
+    assert _drain(heap) == sorted(profits, key=lambda task_id: -profits[task_id])
+
+
+def test_heap_equal_profit_is_fifo():
+    heap = IndexedTaskHeap()
+    for i in range(5):
+        heap.push(_task(i), 0.5)
+    heap.update("GC-3-0", 0.5)
+    assert _drain(heap) == [f"GC-{i}-0" for i in range(5)]
+
+
+def test_queue_pops_high_tier_first_and_moves_tasks_across_tiers():
+    queue = GCTaskQueue(high_profit_threshold=0.7)
+    tasks = [_task(i, ratio) for i, ratio in enumerate((0.2, 0.9, 0.6, 0.75))]
+    for task in tasks:
+        queue.push(task)
+    assert [len(queue.high_priority), len(queue.low_priority)] == [2, 2]
+    # 低层任务收益升到阈值以上：迁入高层；高层任务降到阈值以下：迁入低层
+    tasks[0].garbage_ratio = 0.8
+    queue.update(tasks[0])
+    tasks[1].garbage_ratio = 0.3
+    queue.update(tasks[1])
+    assert "GC-0-0" in queue.high_priority and "GC-1-0" in queue.low_priority
+    assert queue.cancel(tasks[2]) is tasks[2]
+    assert queue.peek() is tasks[0]
+    order = []
+    while len(queue):
+        order.append(queue.pop().task_id)
+    assert order == ["GC-0-0", "GC-3-0", "GC-1-0"]
\ No newline at end of file
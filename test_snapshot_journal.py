@@ -0,0 +1,111 @@
+from common import BlobFile, GCTask
+from snapshot_journal import (JOURNAL_RECORD_SIZE, RECORD_COMPLETED, RECORD_INTERRUPTED, RECORD_PROGRESS,
+                              TASK_ID_WIDTH, JournalRecord, SnapshotJournal, _pack_record, _unpack_record)
+from typing import Optional
+import os
+import pytest
+
+
+def _task(index: int, blob_id: Optional[str] = None) -> GCTask:
+    blob = BlobFile(blob_id=blob_id or f"Blob-{index}-0", shard_id=index)
+    return GCTask(task_id=f"GC-{index}-0", shard_id=index, primary_node_id="Node-1", backup_node_id="Node-2",
+                  target_blob=blob)
+
+
+def _record(**overrides) -> JournalRecord:
+    fields = dict(record_type=RECORD_PROGRESS, task_id="GC-3-17", shard_id=3, blob_id="Blob-3-kv42",
+                  processed_offset=5 << 20, running_checksum=0xDEADBEEF, metadata_updated=True, sequence=9,
+                  snapshot_time=1700000000.25)
+    fields.update(overrides)
+    return JournalRecord(**fields)
+
+
+def test_record_round_trip_is_128_bytes():
+    record = _record()
+    data = _pack_record(record)
+    assert len(data) == JOURNAL_RECORD_SIZE == 128
+    assert _unpack_record(data) == record
+
+
+def test_corrupted_record_fails_crc():
+    data = bytearray(_pack_record(_record()))
+    data[20] ^= 0x01
+    assert _unpack_record(bytes(data)) is None
+
+
+def test_id_wider_than_field_is_rejected():
+    with pytest.raises(ValueError):
+        _pack_record(_record(task_id="G" * (TASK_ID_WIDTH + 1)))
+    # 多字节字符按UTF-8编码后的长度计
+    with pytest.raises(ValueError):
+        _pack_record(_record(blob_id="块" * 17))
+
+
+def test_recover_keeps_latest_record_of_unfinished_tasks(tmp_path):
+    path = str(tmp_path / "snapshot.journal")
+    journal = SnapshotJournal(path, sync_every=4)
+    running, interrupted, finished = _task(0), _task(1), _task(2)
+    for i in range(1, 4):
+        journal.append(running, RECORD_PROGRESS, i << 20, i)
+    journal.append(interrupted, RECORD_INTERRUPTED, 2 << 20, 7)
+    journal.append(finished, RECORD_PROGRESS, 1 << 20, 1)
+    journal.append(finished, RECORD_COMPLETED, 4 << 20, 2)
+    journal.close()
+    records = SnapshotJournal(path).recover()
+    assert sorted(records) == [running.task_id, interrupted.task_id]
+    assert (records[running.task_id].processed_offset, records[running.task_id].running_checksum) == (3 << 20, 3)
+    assert records[interrupted.task_id].record_type == RECORD_INTERRUPTED
+
+
+def test_compaction_keeps_only_unfinished_tasks(tmp_path):
+    path = str(tmp_path / "snapshot.journal")
+    journal = SnapshotJournal(path, compact_threshold=2)
+    pending = _task(0)
+    journal.append(pending, RECORD_PROGRESS, 1 << 20, 1)
+    for index in (1, 2):
+        task = _task(index)
+        journal.append(task, RECORD_PROGRESS, 1 << 20, 1)
+        journal.append(task, RECORD_COMPLETED, 2 << 20, 2)
+    assert journal.stats["compactions"] == 1
+    assert os.path.getsize(path) == JOURNAL_RECORD_SIZE
+    # 压缩后继续追加，序号保持递增
+    journal.append(pending, RECORD_PROGRESS, 2 << 20, 2)
+    journal.close()
+    records = SnapshotJournal(path).recover()
+    assert list(records) == [pending.task_id]
+    assert records[pending.task_id].processed_offset == 2 << 20
+    assert records[pending.task_id].sequence == 6
+
+
+def test_recover_truncates_torn_tail(tmp_path):
+    path = str(tmp_path / "snapshot.journal")
+    journal = SnapshotJournal(path)
+    task = _task(0)
+    for i in range(1, 4):
+        journal.append(task, RECORD_PROGRESS, i << 20, i)
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(_pack_record(_record(task_id=task.task_id, processed_offset=4 << 20))[:60])
+    records = SnapshotJournal(path).recover()
+    assert records[task.task_id].processed_offset == 3 << 20
+    assert os.path.getsize(path) == 3 * JOURNAL_RECORD_SIZE
+
+
+def test_recover_stops_at_corrupted_record(tmp_path):
+    path = str(tmp_path / "snapshot.journal")
+    journal = SnapshotJournal(path)
+    task = _task(0)
+    for i in range(1, 4):
+        journal.append(task, RECORD_PROGRESS, i << 20, i)
+    journal.close()
+    # 第2条记录损坏：其后的记录不再可信，退回到第1条记录的断点并截断
+    with open(path, "r+b") as f:
+        f.seek(JOURNAL_RECORD_SIZE + 30)
+        f.write(b"\xff")
+    journal = SnapshotJournal(path)
+    assert journal.recover()[task.task_id].processed_offset == 1 << 20
+    assert os.path.getsize(path) == JOURNAL_RECORD_SIZE
+    # 截断后追加的记录接在有效记录之后
+    journal.append(task, RECORD_PROGRESS, 2 << 20, 2)
+    journal.close()
+    assert SnapshotJournal(path).recover()[task.task_id].processed_offset == 2 << 20
\ No newline at end of file
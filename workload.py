@@ -0,0 +1,259 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import gzip
+import numpy as np
+import time
+
+# 流式负载生成（论文5.7节）：YCSB A/B/F与写密集负载、Zipfian/Latest键分布、Value大小混合、
+# Twitter缓存trace（如cluster39）分块回放。全部按固定种子惰性生成，内存与操作总数无关。
+READ, UPDATE, INSERT, READ_MODIFY_WRITE, DELETE = 0, 1, 2, 3, 4
+OP_NAMES = ("READ", "UPDATE", "INSERT", "READ_MODIFY_WRITE", "DELETE")
+WRITE_OPS = (UPDATE, INSERT, READ_MODIFY_WRITE)
+
+ZIPFIAN_CONSTANT = 0.99  # YCSB默认Zipfian偏斜系数
+GENERATION_CHUNK = 65536  # 每次向量化生成的操作数
+
+# YCSB核心负载的操作比例与默认键分布；W为写密集负载（94%写，对应论文5.7节Twitter cluster39）
+WORKLOADS = {
+    "A": ({READ: 0.5, UPDATE: 0.5}, "zipfian"),
+    "B": ({READ: 0.95, UPDATE: 0.05}, "zipfian"),
+    "F": ({READ: 0.5, READ_MODIFY_WRITE: 0.5}, "zipfian"),
+    "W": ({READ: 0.06, UPDATE: 0.94}, "zipfian"),
+}
+
+# Twitter缓存trace操作名 → 操作类型
+TRACE_OPS = {
+    "get": READ, "gets": READ,
+    "set": UPDATE, "replace": UPDATE, "cas": UPDATE,
+    "add": INSERT,
+    "append": READ_MODIFY_WRITE, "prepend": READ_MODIFY_WRITE, "incr": READ_MODIFY_WRITE, "decr": READ_MODIFY_WRITE,
+    "delete": DELETE,
+}
+
+
+class Operation(NamedTuple):
+    """一次KV操作（逐条流式消费时使用；高吞吐场景请用iter_chunks按列消费）"""
+    op: int
+    key: str
+    value_size: int
+
+
+def format_key(key_id: int) -> str:
+    """YCSB风格Key（"user"+19位数字，定长23B）"""
+    return f"user{key_id:019d}"
+
+
+def zeta(n: int, theta: float, start: int = 0, initial: float = 0.0, chunk: int = 1 << 22) -> float:
+    """广义调和数 Σ_{i=start+1..n} 1/i^θ（NumPy分块求和，1亿项约1秒），支持从已知前缀增量计算"""
+    total = initial
+    for lo in range(start + 1, n + 1, chunk):
+        i = np.arange(lo, min(lo + chunk, n + 1), dtype=np.float64)
+        total += float(np.sum(i ** -theta))
+    return total
+
+
+class ZipfianGenerator:
+    """Zipfian整数生成器（Gray等人的快速算法，与YCSB一致），按批向量化采样[0, item_count)
+
+    item_count可增长（Latest分布随插入扩大键空间），zeta按增量计算。
+    """
+
+    def __init__(self, item_count: int, theta: float = ZIPFIAN_CONSTANT):
+        self.theta = theta
+        self.alpha = 1.0 / (1.0 - theta)
+        self.zeta2 = zeta(2, theta)
+        self.item_count = 0
+        self.zetan = 0.0
+        self.resize(item_count)
+
+    def resize(self, item_count: int):
+        if item_count == self.item_count:
+            return
+        if item_count > self.item_count:
+            self.zetan = zeta(item_count, self.theta, self.item_count, self.zetan)
+        else:
+            self.zetan = zeta(item_count, self.theta)
+        self.item_count = item_count
+        self.eta = (1 - (2.0 / item_count) ** (1 - self.theta)) / (1 - self.zeta2 / self.zetan)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """返回size个秩（0为最热）"""
+        u = rng.random(size)
+        uz = u * self.zetan
+        ranks = (self.item_count * (self.eta * u - self.eta + 1) ** self.alpha).astype(np.int64)
+        ranks[uz < 1.0 + 0.5 ** self.theta] = 1
+        ranks[uz < 1.0] = 0
+        return np.minimum(ranks, self.item_count - 1)
+
+
+def _fnv1a_64(values: np.ndarray) -> np.ndarray:
+    """逐字节FNV-1a 64位哈希（YCSB ScrambledZipfian用于打散热点键）"""
+    h = np.full(values.shape, 0xCBF29CE484222325, dtype=np.uint64)
+    v = values.astype(np.uint64)
+    prime = np.uint64(0x100000001B3)
+    for shift in range(0, 64, 8):
+        h ^= (v >> np.uint64(shift)) & np.uint64(0xFF)
+        h *= prime
+    return h
+
+
+class ValueSizeMix:
+    """Value大小混合分布（默认近似Twitter缓存trace：以80B小Value为主，长尾到16KB）"""
+
+    def __init__(self, sizes: Tuple[int, ...] = (80, 256, 1024, 4096, 16384),
+                 weights: Tuple[float, ...] = (0.70, 0.15, 0.10, 0.04, 0.01)):
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+
+    @classmethod
+    def fixed(cls, size: int) -> "ValueSizeMix":
+        return cls((size,), (1.0,))
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if len(self.sizes) == 1:
+            return np.full(size, self.sizes[0], dtype=np.int64)
+        return self.sizes[rng.choice(len(self.sizes), size=size, p=self.weights)]
+
+
+class YCSBWorkload:
+    """YCSB负载流：先load_phase()插入record_count条初始记录，再按操作比例流式生成operation_count个操作
+
+    distribution为zipfian（打散的Zipfian）、latest（偏向最近插入的键）或uniform。
+    同一种子产生完全相同的操作序列；生成按GENERATION_CHUNK分块向量化，内存为O(chunk)。
+    """
+
+    def __init__(self, name: str = "A", record_count: int = 1000000, operation_count: int = 10000000,
+                 distribution: Optional[str] = None, value_sizes: Optional[ValueSizeMix] = None,
+                 proportions: Optional[Dict[int, float]] = None, seed: int = 0, chunk_size: int = GENERATION_CHUNK):
+        default_proportions, default_distribution = WORKLOADS[name]
+        self.name = name
+        self.record_count = record_count
+        self.operation_count = operation_count
+        self.distribution = distribution or default_distribution
+        self.proportions = proportions or default_proportions
+        self.value_sizes = value_sizes or ValueSizeMix()
+        self.seed = seed
+        self.chunk_size = chunk_size
+        if self.distribution not in ("zipfian", "latest", "uniform"):
+            raise ValueError(f"Unknown key distribution: {self.distribution}")
+
+    def load_phase(self) -> Iterable[Operation]:
+        """初始加载：按键顺序插入record_count条记录"""
+        rng = np.random.default_rng([self.seed, 0])
+        for start in range(0, self.record_count, self.chunk_size):
+            count = min(self.chunk_size, self.record_count - start)
+            for key_id, value_size in zip(range(start, start + count), self.value_sizes.sample(rng, count).tolist()):
+                yield Operation(INSERT, format_key(key_id), value_size)
+
+    def iter_chunks(self) -> Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """按列分块生成：每块返回(操作类型, 键ID, Value大小)三个等长数组"""
+        rng = np.random.default_rng([self.seed, 1])
+        ops = np.asarray(list(self.proportions), dtype=np.int8)
+        probs = np.asarray(list(self.proportions.values()), dtype=np.float64)
+        probs /= probs.sum()
+        key_count = self.record_count
+        zipf = ZipfianGenerator(key_count) if self.distribution != "uniform" else None
+        for start in range(0, self.operation_count, self.chunk_size):
+            count = min(self.chunk_size, self.operation_count - start)
+            op = ops[rng.choice(len(ops), size=count, p=probs)]
+            inserts = op == INSERT
+            # 插入分配新键；块内插入后的操作可访问到已插入的键
+            inserted_before = np.cumsum(inserts) - inserts
+            current_count = key_count + inserted_before
+            if self.distribution == "uniform":
+                keys = (rng.random(count) * current_count).astype(np.int64)
+            elif self.distribution == "latest":
+                zipf.resize(key_count)
+                keys = np.maximum(current_count - 1 - zipf.sample(rng, count), 0)
+            else:
+                zipf.resize(key_count)
+                keys = (_fnv1a_64(zipf.sample(rng, count)) % np.uint64(key_count)).astype(np.int64)
+            keys[inserts] = current_count[inserts]
+            key_count += int(inserts.sum())
+            yield op, keys, self.value_sizes.sample(rng, count)
+
+    def __iter__(self) -> Iterable[Operation]:
+        for op, keys, value_sizes in self.iter_chunks():
+            for o, k, v in zip(op.tolist(), keys.tolist(), value_sizes.tolist()):
+                yield Operation(o, format_key(k), v)
+
+
+class TwitterTraceReader:
+    """Twitter缓存trace回放（CSV：timestamp,key,key_size,value_size,client_id,operation,TTL）
+
+    按chunk_size分块读取（支持.gz），跨块的不完整行拼接到下一块，内存与trace大小无关。
+    limit限制回放的操作数；未知操作名跳过。
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20, limit: Optional[int] = None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.limit = limit
+        self.stats = {"lines": 0, "skipped": 0}
+
+    def _open(self):
+        return gzip.open(self.path, "rb") if self.path.endswith(".gz") else open(self.path, "rb")
+
+    def iter_lines(self) -> Iterable[bytes]:
+        with self._open() as f:
+            tail = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                yield from lines
+            if tail:
+                yield tail
+
+    def __iter__(self) -> Iterable[Operation]:
+        emitted = 0
+        for line in self.iter_lines():
+            if self.limit is not None and emitted >= self.limit:
+                return
+            self.stats["lines"] += 1
+            fields = line.split(b",")
+            if len(fields) < 6:
+                self.stats["skipped"] += 1
+                continue
+            op = TRACE_OPS.get(fields[5].strip().decode("ascii", "replace"))
+            if op is None:
+                self.stats["skipped"] += 1
+                continue
+            try:
+                value_size = int(fields[3])
+            except ValueError:
+                self.stats["skipped"] += 1
+                continue
+            emitted += 1
+            yield Operation(op, fields[1].decode("utf-8", "replace"), value_size)
+
+
+def measure_generation(operation_count: int = 10000000, record_count: int = 1000000, seed: int = 0) -> List[dict]:
+    """生成实验：各负载的按列生成吞吐、峰值内存与热点集中度（前1%键的访问占比）"""
+    import tracemalloc
+    results = []
+    for name, distribution in (("A", "zipfian"), ("B", "zipfian"), ("F", "zipfian"), ("W", "zipfian"), ("A", "latest")):
+        workload = YCSBWorkload(name, record_count, operation_count, distribution=distribution, seed=seed)
+        hits = np.zeros(record_count, dtype=np.int64)
+        tracemalloc.start()
+        start = time.perf_counter()
+        ops = np.zeros(len(OP_NAMES), dtype=np.int64)
+        for op, keys, _ in workload.iter_chunks():
+            ops += np.bincount(op, minlength=len(OP_NAMES))
+            np.add.at(hits, keys[keys < record_count], 1)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        top = np.sort(hits)[::-1][:max(1, record_count // 100)].sum() / max(1, hits.sum())
+        result = {"workload": name, "distribution": distribution, "ops_per_s": operation_count / elapsed,
+                  "peak_mem_mb": peak / 2 ** 20, "top1pct_share": float(top),
+                  "mix": {OP_NAMES[i]: int(n) for i, n in enumerate(ops) if n}}
+        results.append(result)
+        print(f"[Workload] YCSB-{name} ({distribution}): {result['ops_per_s'] / 1e6:.1f}M ops/s, "
+              f"peak {result['peak_mem_mb']:.1f}MB, top 1% keys {result['top1pct_share'] * 100:.1f}% of accesses")
+    return results
+
+
+if __name__ == "__main__":
+    measure_generation()
\ No newline at end of file